@@ -0,0 +1,209 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+from fastapi.responses import JSONResponse
+
+import config
+
+# ----------------------------------------------------
+# ADMISSION CONTROL: LIEBER SCHNELL NEIN ALS LANGSAM KAPUTT
+# ----------------------------------------------------
+#ohne begrenzung nimmt die app jeden request an: die sync routen stapeln sich im threadpool, die schreibenden warten
+#alle auf die eine sqlite schreibsperre (busy_timeout), die lesenden auf einen platz im pool. die latenz steigt auf
+#sekunden und am ende kommt "database is locked" oder ein pool timeout, nachdem der client schon ewig gewartet hat.
+#
+#jetzt hat jede routen-gruppe ein tor (Gate): höchstens `limit` requests gleichzeitig drin, höchstens `queue` warten
+#davor, jeder höchstens `timeout_ms` lang. wer keinen platz mehr in der warteschlange bekommt kriegt sofort 429, wer
+#zu lange gewartet hat 503, beide mit Retry-After (geschätzt aus der durchschnittlichen dauer in der gruppe).
+#ein request der drin ist hat also höchstens timeout_ms gewartet und konkurriert nur mit `limit` anderen, damit
+#bleibt das p99 auch bei überlast begrenzt.
+#
+#gruppen (erste passende regel aus ROUTE_GROUPS): export und import extra, weil sie lange laufen und sonst die plätze
+#der normalen routen belegen, sonst GET/HEAD -> read, alles andere -> write. /metrics und die docs laufen immer durch,
+#gerade bei überlast will man sehen was los ist.
+#
+#einstellen mit ADMISSION_LIMITS="read=32:128,write=4:64" (gruppe=limit:queue oder gruppe=limit:queue:timeout_ms),
+#nicht genannte gruppen behalten ihren standard. die limits gelten pro worker (serve.py). alle gruppen zusammen
+#sollten unter den 40 threads des threadpools bleiben, sonst wartet man dort noch einmal ohne grenze.
+#läuft komplett im event loop, braucht also keine locks
+
+DEFAULT_LIMITS = "read=24:128,write=4:64,export=2:4,import=2:4"
+
+#(methoden, pfad-anfang, gruppe). None als gruppe heißt: nie begrenzen
+ROUTE_GROUPS = [
+    (None, "/metrics", None),
+    (None, "/docs", None),
+    (None, "/redoc", None),
+    (None, "/openapi.json", None),
+    (("GET", "HEAD"), "/export", "export"),
+    (("POST",), "/posts/posts/import", "import"),
+    (("GET", "HEAD", "OPTIONS"), "", "read"),
+    (None, "", "write"),
+]
+
+
+def parse_limits(spec: str, default_timeout_ms: float) -> dict:
+    #"read=32:128,write=4:64:500" -> {"read": (32, 128, 1000.0), "write": (4, 64, 500.0)}
+    limits = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            group, values = part.split("=")
+            numbers = values.split(":")
+            limit, queue = int(numbers[0]), int(numbers[1])
+            timeout_ms = float(numbers[2]) if len(numbers) > 2 else default_timeout_ms
+        except (ValueError, IndexError):
+            raise ValueError(f"ADMISSION_LIMITS: '{part}' verstehe ich nicht, erwartet gruppe=limit:queue[:timeout_ms]")
+        if limit < 1 or queue < 0:
+            raise ValueError(f"ADMISSION_LIMITS: '{part}' braucht limit >= 1 und queue >= 0")
+        limits[group.strip()] = (limit, queue, timeout_ms)
+    return limits
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Gate:
+    def __init__(self, name: str, limit: int, queue: int, timeout_ms: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout_ms / 1000
+        self.active = 0
+        self._waiters = deque() #asyncio futures, wer vorne steht kommt als nächstes dran
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+        self.avg_seconds = 0.05 #gleitender durchschnitt wie lange ein request drin bleibt (für Retry-After)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        #so lange bis die warteschlange vor einem ungefähr abgearbeitet ist, ganze sekunden und mindestens 1
+        return max(1, math.ceil((self.queued + 1) / self.limit * self.avg_seconds))
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.queue:
+            self.rejected["queue_full"] += 1
+            raise Rejected("queue_full", self.retry_after())
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout) #release() gibt den platz direkt an uns weiter
+        except asyncio.TimeoutError:
+            self._remove(waiter)
+            if waiter.done() and not waiter.cancelled():
+                #ab 3.12: der platz kam genau mit dem timeout. dann sind wir drin, sonst wäre er für immer weg
+                self.admitted += 1
+                return
+            self.rejected["queue_timeout"] += 1
+            raise Rejected("queue_timeout", self.retry_after())
+        except asyncio.CancelledError:
+            #client weg: hatten wir den platz schon bekommen, geben wir ihn weiter
+            self._remove(waiter)
+            if waiter.done() and not waiter.cancelled():
+                self.release(0.0)
+            raise
+        self.admitted += 1
+
+    def _remove(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, seconds: float):
+        self.avg_seconds += (seconds - self.avg_seconds) * 0.1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None) #der platz geht direkt weiter, active bleibt gleich
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    def __init__(self, limits: dict):
+        self.gates = {group: Gate(group, *values) for group, values in limits.items()}
+
+    def gate_for(self, method: str, path: str):
+        for methods, prefix, group in ROUTE_GROUPS:
+            if (methods is None or method in methods) and path.startswith(prefix):
+                return self.gates.get(group) if group is not None else None
+        return None
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "limit": gate.limit, "queue": gate.queue, "active": gate.active, "queued": gate.queued,
+                "admitted": gate.admitted, "rejected": dict(gate.rejected),
+            }
+            for name, gate in self.gates.items()
+        }
+
+
+def _load_limits() -> dict:
+    limits = parse_limits(DEFAULT_LIMITS, config.ADMISSION_QUEUE_TIMEOUT_MS)
+    limits.update(parse_limits(config.ADMISSION_LIMITS, config.ADMISSION_QUEUE_TIMEOUT_MS))
+    return limits
+
+
+controller = AdmissionController(_load_limits()) if config.ADMISSION_CONTROL else None
+
+
+# ----------------------------------------------------
+# MIDDLEWARE
+# ----------------------------------------------------
+_STATUS = {"queue_full": 429, "queue_timeout": 503}
+_DETAIL = {
+    "queue_full": "Zu viele gleichzeitige Anfragen, bitte nach Retry-After Sekunden nochmal versuchen.",
+    "queue_timeout": "Server ausgelastet, bitte nach Retry-After Sekunden nochmal versuchen.",
+}
+
+
+class AdmissionMiddleware:
+    #reine ASGI middleware, der platz wird erst freigegeben wenn die antwort komplett raus ist (auch beim streaming export)
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        gate = self.controller.gate_for(scope["method"], scope["path"])
+        if gate is None:
+            return await self.app(scope, receive, send)
+
+        try:
+            await gate.acquire()
+        except Rejected as rejected:
+            response = JSONResponse(
+                {"detail": _DETAIL[rejected.reason], "group": gate.name},
+                status_code=_STATUS[rejected.reason],
+                headers={"Retry-After": str(rejected.retry_after)},
+            )
+            return await response(scope, receive, send)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - start)
+
+
+def is_lock_error(exc) -> bool:
+    #"database is locked": busy_timeout ist abgelaufen, die schreibsperre war die ganze zeit belegt
+    message = str(getattr(exc, "orig", exc))
+    return "database is locked" in message or "database is busy" in message
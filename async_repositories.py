@@ -0,0 +1,248 @@
+import asyncio
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+
+from cache import user_key, post_key, snapshot_user, user_size, post_size
+from models import PostModel, User, Post
+from versioning import VersionMismatch
+from metrics import metrics
+from repositories import _insert_user, _update_user, _delete_user, _insert_post, _update_post, _delete_post
+from repositories import USERS_BULK_INSERT, _split_duplicate_emails, _bulk_user_rows, _assign_bulk_ids
+from repositories import POSTS_BULK_INSERT, _bulk_post_rows, _to_user, _to_post
+from repositories import (_users_page_stmt, _user_detail_stmt, _existing_user_ids_stmt, _user_version_stmt,
+                          _post_load_options, _posts_page_stmt, _post_version_stmt, _users_with_posts_stmt)
+import purge
+
+# ----------------------------------------------------
+# ASYNC REPOSITORIES
+# ----------------------------------------------------
+#gleiche schnittstelle wie UserRepository/PostRepository in repositories.py, nur jede methode ist async
+#und arbeitet mit einer AsyncSession. die statements (lesen und bulk) und die schreib-operationen kommen alle aus
+#repositories.py, hier steht nur das await drumherum. die schreib-operationen laufen über session.run_sync
+
+
+async def _run_write(session: AsyncSession, writer, op, *args):
+    if writer is not None: #group commit: auf den schreib-thread warten ohne die event loop zu blockieren
+        return await asyncio.wrap_future(writer.submit(op, *args))
+    start = time.perf_counter()
+    try:
+        result = await session.run_sync(op, *args)
+        await session.commit()
+        return result
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        metrics.observe_write(time.perf_counter() - start)
+
+
+class AsyncUserRepository:
+    def __init__(self, db: AsyncSession, writer=None, cache=None):
+        self.session = db
+        self.writer = writer
+        self.cache = cache
+
+    async def close(self):
+        await self.session.close()
+
+    # CRUD: CREATE (POST)
+    async def save_user(self, user_obj: User):
+        try:
+            user_obj.id = await _run_write(self.session, self.writer, _insert_user, user_obj.name, user_obj.email, user_obj.id)
+            return user_obj
+        except IntegrityError: #wenn Email nicht Unique ist
+            return None
+        except SQLAlchemyError:
+            return None
+
+    # CRUD: CREATE (VIELE AUF EINMAL), siehe UserRepository.save_users_bulk
+    async def save_users_bulk(self, user_objs: list, chunk_size: int = 500):
+        created = []
+        pending, conflicts = _split_duplicate_emails(user_objs)
+
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            try:
+                result = await self.session.execute(USERS_BULK_INSERT, _bulk_user_rows(chunk))
+                rows = result.all()
+                await self.session.commit()
+            except SQLAlchemyError:
+                await self.session.rollback()
+                raise
+            _assign_bulk_ids(chunk, rows, created, conflicts)
+
+        conflicts.sort()
+        return created, conflicts
+
+    # CRUD: READ (ALLE MIT FILTER)
+    async def get_all_users(self, name_filter=None, limit: int = None, after_id: int = None, fields=None):
+        db_users = (await self.session.execute(_users_page_stmt(name_filter, limit, after_id, fields))).scalars().all()
+        if fields is not None:
+            return db_users #nicht geladene spalten darf hier niemand anfassen (async kann nicht nachladen)
+        return [_to_user(db_user) for db_user in db_users]
+
+    # CRUD: READ (EINZELN)
+    async def get_user_by_id(self, user_id: int, fields=None):
+        if self.cache is not None:
+            cached = self.cache.get(user_key(user_id))
+            if cached is not None:
+                return cached
+            token = self.cache.begin_load()
+        if fields is not None: #siehe UserRepository.get_user_by_id
+            return (await self.session.execute(_user_detail_stmt(user_id, fields))).scalars().first()
+        db_user = (await self.session.execute(_user_detail_stmt(user_id))).unique().scalars().first()
+        if self.cache is None or db_user is None:
+            return db_user
+        user = snapshot_user(db_user)
+        self.cache.put(user_key(user_id), user, user_size(user), token=token)
+        return user
+
+    # READ: welche dieser ids gibt es wirklich?
+    async def get_existing_user_ids(self, user_ids) -> set:
+        if not user_ids:
+            return set()
+        return set((await self.session.execute(_existing_user_ids_stmt(user_ids))).scalars())
+
+    # CRUD: UPDATE (PUT)
+    async def update_user(self, user_obj, expected_versions=None):
+        try:
+            new_version = await _run_write(
+                self.session, self.writer, _update_user, user_obj.id, user_obj.name, user_obj.email, expected_versions
+            )
+        except IntegrityError:
+            return None
+        except VersionMismatch:
+            raise
+        except SQLAlchemyError:
+            return None
+        if new_version is None:
+            return None
+        if self.cache is not None:
+            self.cache.invalidate(user_key(user_obj.id))
+        user_obj.version = new_version
+        return user_obj
+
+    async def get_user_version(self, user_id: int):
+        if self.cache is not None:
+            cached = self.cache.get(user_key(user_id))
+            if cached is not None:
+                return cached.version
+        return (await self.session.execute(_user_version_stmt(user_id))).scalar()
+
+    async def user_exists(self, user_id: int) -> bool:
+        return await self.get_user_version(user_id) is not None
+
+    # CRUD: DELETE
+    async def delete_user(self, user_id):
+        result = await _run_write(self.session, self.writer, _delete_user, user_id)
+        if result is None:
+            return None
+        if self.cache is not None:
+            self.cache.invalidate(user_key(user_id), tags=[user_key(user_id)])
+        if result["status"] != "done":
+            purge.wake()
+        return result
+
+    async def get_purge_status(self, user_id: int):
+        return await self.session.run_sync(lambda session: purge.read_status(session.connection(), user_id))
+
+
+class AsyncPostRepository:
+    def __init__(self, db: AsyncSession, writer=None, cache=None):
+        self.session = db
+        self.writer = writer
+        self.cache = cache
+
+    async def close(self):
+        await self.session.close()
+
+    # CRUD: CREATE (POST)
+    async def save_post(self, post_obj: Post):
+        try:
+            post_obj.id = await _run_write(
+                self.session, self.writer, _insert_post, post_obj.title, post_obj.content, post_obj.user_id, post_obj.id
+            )
+            if self.cache is not None:
+                self.cache.invalidate(user_key(post_obj.user_id))
+            return post_obj
+        except IntegrityError:
+            return None
+        except Exception:
+            return None
+
+    # CRUD: CREATE (VIELE AUF EINMAL)
+    async def save_posts_bulk(self, post_objs: list) -> int:
+        if not post_objs:
+            return 0
+        try:
+            await self.session.execute(POSTS_BULK_INSERT, _bulk_post_rows(post_objs))
+            await self.session.commit()
+        except SQLAlchemyError:
+            await self.session.rollback()
+            raise
+        if self.cache is not None:
+            self.cache.invalidate(*{user_key(p.user_id) for p in post_objs})
+        return len(post_objs)
+
+    # CRUD: READ (EINZELN)
+    async def get_post_by_id(self, post_id: int, fields=None):
+        if self.cache is not None:
+            cached = self.cache.get(post_key(post_id))
+            if cached is not None:
+                return cached
+            token = self.cache.begin_load()
+        db_post = await self.session.get(PostModel, post_id, options=_post_load_options(fields))
+        if fields is not None or db_post is None:
+            return db_post
+        post = _to_post(db_post, with_version=True)
+        if self.cache is not None:
+            self.cache.put(post_key(post_id), post, post_size(post), tags=[user_key(post.user_id)], token=token)
+        return post
+
+    # CRUD: READ (ALLE POSTS EINES USERS)
+    async def get_posts_by_user_id(self, user_id: int, limit: int = None, after_id: int = None, fields=None):
+        posts = (await self.session.execute(_posts_page_stmt(user_id, limit, after_id, fields))).scalars().all()
+        if fields is not None:
+            return posts
+        return [_to_post(p) for p in posts]
+
+    # CRUD: UPDATE (PUT)
+    async def update_post(self, post_obj: Post, expected_versions=None):
+        try:
+            result = await _run_write(
+                self.session, self.writer, _update_post, post_obj.id, post_obj.title, post_obj.content, expected_versions
+            )
+        except VersionMismatch:
+            raise
+        except Exception:
+            return None
+        if result is None:
+            return None
+        author_id, post_obj.version = result
+        if self.cache is not None:
+            self.cache.invalidate(post_key(post_obj.id), user_key(author_id))
+        return post_obj
+
+    async def get_post_version(self, post_id: int):
+        if self.cache is not None:
+            cached = self.cache.get(post_key(post_id))
+            if cached is not None:
+                return cached.version
+        return (await self.session.execute(_post_version_stmt(post_id))).scalar()
+
+    # CRUD: DELETE
+    async def delete_post(self, post_id: int):
+        try:
+            author_id = await _run_write(self.session, self.writer, _delete_post, post_id)
+        except Exception:
+            return False
+        if author_id is None:
+            return False
+        if self.cache is not None:
+            self.cache.invalidate(post_key(post_id), user_key(author_id))
+        return True
+
+    async def get_all_users_with_posts(self):
+        return (await self.session.execute(_users_with_posts_stmt())).scalars().all() #siehe UserRepository.get_all_users_with_posts
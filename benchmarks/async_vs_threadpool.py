@@ -0,0 +1,96 @@
+"""
+Vergleicht den sync-stack (def-routen im threadpool) mit dem async-stack (async def + AsyncSession)
+bei steigender anzahl gleichzeitiger requests.
+
+    python benchmarks/async_vs_threadpool.py --requests 2000 --concurrency 1 10 50 200
+
+Läuft komplett in-process (httpx + ASGITransport) in einem temp ordner, die echte userdaten.db wird nicht angefasst.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp()) #DATABASE_URL ist relativ, also landet die db im temp ordner
+
+import httpx
+from fastapi import FastAPI
+
+from datenbase import engine, SessionLocal
+import migrations
+from repositories import UserRepository
+from models import User, Post
+import routers.users as users_sync
+import routers.users_async as users_async
+
+
+def build_app(router) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+def seed(n_users: int, posts_per_user: int):
+    migrations.upgrade(engine)
+    session = SessionLocal()
+    repo = UserRepository(session)
+    repo.save_users_bulk([User(name=f"User {i}", email=f"user{i}@example.com") for i in range(n_users)])
+    from repositories import PostRepository
+    PostRepository(session).save_posts_bulk([
+        Post(title=f"Titel {j}", content="Inhalt " * 20, user_id=u)
+        for u in range(1, n_users + 1) for j in range(posts_per_user)
+    ])
+    session.close()
+
+
+async def run(app, n_requests: int, concurrency: int, n_users: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        counter = iter(range(n_requests))
+
+        async def worker():
+            for i in counter:
+                r = await client.get(f"/users/users/{i % n_users + 1}")
+                assert r.status_code == 200, r.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return n_requests / (time.perf_counter() - start)
+
+
+async def bench_all(args):
+    apps = {"sync (threadpool)": build_app(users_sync.router), "async": build_app(users_async.router)}
+
+    print(f"GET /users/users/{{id}}, {args.requests} requests, {args.users} users mit je {args.posts_per_user} posts")
+    print(f"{'concurrency':>12} " + " ".join(f"{name:>20}" for name in apps))
+    for concurrency in args.concurrency:
+        cells = []
+        for app in apps.values():
+            try:
+                rps = await run(app, args.requests, concurrency, args.users)
+                cells.append(f"{rps:>16.0f} r/s")
+            except Exception as exc:
+                #beim sync stack warten irgendwann alle threads auf eine pool-verbindung, und die threads die sie
+                #zurückgeben würden (get_db aufräumen) bekommen keinen platz mehr -> QueuePool TimeoutError
+                cells.append(f"{type(exc).__name__:>20}")
+        print(f"{concurrency:>12} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts-per-user", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200])
+    args = parser.parse_args()
+
+    seed(args.users, args.posts_per_user)
+    asyncio.run(bench_all(args)) #eine event loop für alles, die async engine hängt ihre verbindungen an die loop
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Vergleicht POST /users/users (ein user pro request und transaktion) mit POST /users/users/bulk, einmal nur das
+repository und einmal über HTTP mit validierung und antwort.
+
+    python benchmarks/bulk_users.py --users 3000 --single 300
+
+Läuft komplett in-process (TestClient) in einem temp ordner, die echte userdaten.db wird nicht angefasst.
+
+Das ziel aus user-003 war 50x, erreicht wird es nicht ganz. Auf dem entwicklungsrechner (wal profil, 3000 users):
+repository etwa 30-45x, HTTP etwa 20-35x. Woran es hängt:
+  - HTTP: beide wege prüfen jede email mit EmailStr (email_validator, ~100 µs pro adresse). Beim einzelnen POST geht das
+    im request-overhead unter, beim bulk ist es der größte teil der zeit pro zeile (zeile "davon EmailStr").
+  - repository: pro zeile bleiben der unique index auf email und der trigram index der namenssuche (users_fts, user-008),
+    ohne die triggers ist das INSERT etwa ein drittel schneller. das ORM ist aus dem weg (Core INSERT mit dicts).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp()) #DATABASE_URL ist relativ, also landet die db im temp ordner
+os.environ.setdefault("ADMISSION_CONTROL", "0") #sonst misst man die warteschlange mit
+
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+import main
+from datenbase import SessionLocal
+from models import User
+from repositories import UserRepository
+from schemas import UserCreate
+
+
+def per_row(fn, rows: int) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) / rows * 1_000_000
+
+
+def repository(n_single: int, n_bulk: int):
+    session = SessionLocal()
+    repo = UserRepository(session)
+    single = per_row(lambda: [repo.save_user(User(name=f"Repo {i}", email=f"repo{i}@example.com")) for i in range(n_single)],
+                     n_single)
+    users = [User(name=f"Repo Bulk {i}", email=f"repobulk{i}@example.com") for i in range(n_bulk)]
+    bulk = per_row(lambda: repo.save_users_bulk(users), n_bulk)
+    session.close()
+    return single, bulk
+
+
+def http(client, n_single: int, n_bulk: int):
+    single = per_row(lambda: [client.post("/users/users", json={"name": f"Einzel {i}", "email": f"einzel{i}@example.com"})
+                              for i in range(n_single)], n_single)
+    body = [{"name": f"Bulk {i}", "email": f"bulk{i}@example.com"} for i in range(n_bulk)]
+    bulk = per_row(lambda: client.post("/users/users/bulk", json=body).raise_for_status(), n_bulk)
+    emails = [{"name": f"Check {i}", "email": f"check{i}@example.com"} for i in range(n_bulk)]
+    validation = per_row(lambda: TypeAdapter(List[UserCreate]).validate_python(emails), n_bulk)
+    return single, bulk, validation
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=3000, help="zeilen für den bulk weg")
+    parser.add_argument("--single", type=int, default=300, help="einzelne POSTs (reicht für den durchschnitt)")
+    args = parser.parse_args()
+
+    with TestClient(main.app) as client:
+        #aufwärmen: beim ersten mal werden die statements kompiliert, das soll nicht mitzählen
+        client.post("/users/users", json={"name": "Warm", "email": "warm@example.com"})
+        client.post("/users/users/bulk", json=[{"name": "Warm Bulk", "email": "warmbulk@example.com"}])
+        repo_single, repo_bulk = repository(args.single, args.users)
+        http_single, http_bulk, validation = http(client, args.single, args.users)
+
+    print(f"{'':<28} {'einzeln':>10} {'bulk':>10}")
+    print(f"{'repository (µs pro user)':<28} {repo_single:10.1f} {repo_bulk:10.1f}   x{repo_single / repo_bulk:6.1f}")
+    print(f"{'HTTP (µs pro user)':<28} {http_single:10.1f} {http_bulk:10.1f}   x{http_single / http_bulk:6.1f}")
+    print(f"{'  davon EmailStr':<28} {validation:10.1f} {validation:10.1f}")
+
+
+if __name__ == "__main__":
+    main_()
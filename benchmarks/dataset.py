@@ -0,0 +1,98 @@
+"""
+Synthetische test-daten für die benchmarks: N user und M posts, die posts sind schief verteilt
+(wenige user haben sehr viele posts, die meisten nur ein paar, wie im echten leben).
+
+    python benchmarks/dataset.py --users 1000000 --posts 10000000 --out bench.db
+
+Gleicher --seed = gleiche daten, so sind zwei benchmark läufe vergleichbar.
+Die echte userdaten.db wird nicht angefasst, --out muss eine neue datei sein.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine
+
+import migrations
+
+FIRST_NAMES = ["Anna", "Bernd", "Carla", "David", "Emma", "Felix", "Greta", "Hannes", "Ida", "Jonas",
+               "Klara", "Lukas", "Mia", "Noah", "Olga", "Paul", "Quirin", "Rosa", "Simon", "Tina"]
+LAST_NAMES = ["Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker",
+              "Schulz", "Hoffmann", "Koch", "Richter", "Klein", "Wolf", "Neumann", "Schwarz"]
+WORDS = ["datenbank", "sqlite", "python", "fastapi", "index", "abfrage", "tabelle", "schlüssel", "cache",
+         "server", "lernen", "deutsch", "übung", "grammatik", "wort", "satz", "beispiel", "frage", "antwort"]
+
+CHUNK = 50000
+
+
+def author_of(rng: random.Random, n_users: int, skew: float) -> int:
+    #random() ** skew drückt die werte richtung 0, also bekommen die kleinen user ids die meisten posts
+    #skew=1 ist gleichverteilt, bei skew=3 hat das erste prozent der user etwa ein fünftel aller posts
+    return int(n_users * rng.random() ** skew) + 1
+
+
+def _user_rows(rng: random.Random, start: int, stop: int):
+    for i in range(start, stop):
+        yield (i, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}", f"user{i}@example.com")
+
+
+def _post_rows(rng: random.Random, start: int, stop: int, n_users: int, skew: float):
+    for i in range(start, stop):
+        title = " ".join(rng.choices(WORDS, k=3)).capitalize() + f" {i}"
+        content = " ".join(rng.choices(WORDS, k=rng.randint(10, 60)))
+        yield (i, title, content, author_of(rng, n_users, skew))
+
+
+def generate(path: str, n_users: int, n_posts: int, skew: float = 3.0, seed: int = 42, verbose: bool = True):
+    #1. nur die erste migration (leere tabellen), noch OHNE triggers (FTS, versionen) und indizes - die würden jedes insert bremsen
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine, target=1)
+
+    #2. direkt über sqlite3 mit executemany in großen transaktionen, ohne ORM und ohne sync auf die platte
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    start = time.perf_counter()
+    for table, total, sql, rows in [
+        ("users", n_users, "INSERT INTO users (id, name, email) VALUES (?, ?, ?)",
+         lambda a, b: _user_rows(rng, a, b)),
+        ("posts", n_posts, "INSERT INTO posts (id, title, content, user_id) VALUES (?, ?, ?, ?)",
+         lambda a, b: _post_rows(rng, a, b, n_users, skew)),
+    ]:
+        for first in range(1, total + 1, CHUNK):
+            with conn:
+                conn.executemany(sql, rows(first, min(first + CHUNK, total + 1)))
+        if verbose:
+            print(f"{table}: {total} zeilen nach {time.perf_counter() - start:.1f}s")
+    conn.close()
+
+    #3. jetzt erst die restlichen migrationen: triggers, indizes und die FTS tabellen (füllen sich in einem rutsch mit 'rebuild')
+    migrations.upgrade(engine)
+    engine.dispose()
+    if verbose:
+        print(f"fertig nach {time.perf_counter() - start:.1f}s: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--skew", type=float, default=3.0, help="1 = gleichverteilt, größer = schiefer")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    if os.path.exists(args.out):
+        parser.error(f"{args.out} gibt es schon")
+    generate(args.out, args.users, args.posts, args.skew, args.seed)
+
+
+if __name__ == "__main__":
+    main()
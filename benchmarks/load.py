@@ -0,0 +1,289 @@
+"""
+Last-test für alle routen aus routers/users.py und routers/posts.py: durchsatz und p50/p95/p99 pro endpunkt,
+in-process (httpx + ASGITransport, ohne netzwerk) und/oder über einen echten uvicorn server.
+
+    python benchmarks/load.py --users 100000 --posts 1000000 --requests 500 --concurrency 10
+    python benchmarks/load.py --transport uvicorn --save-baseline benchmarks/baseline.json
+    python benchmarks/load.py --baseline benchmarks/baseline.json     # exit code 1 bei einer regression
+
+Die daten kommen aus benchmarks/dataset.py (gleicher --seed = gleiche daten und gleiche request-folge).
+Jeder transport bekommt eine frische kopie der db in einem temp ordner, die echte userdaten.db wird nicht angefasst.
+Die app läuft mit den einstellungen aus der umgebung (USE_ASYNC_DB, GROUP_COMMIT, CACHE_ENABLED ...).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+#vor jedem import aus dem projekt: SQLAlchemy macht den relativen pfad aus DATABASE_URL schon beim anlegen der engine
+#absolut, die in-process app benutzt also die userdaten.db in diesem ordner
+START_DIR = os.getcwd() #pfade auf der kommandozeile sind relativ zu hier
+WORK_DIR = tempfile.mkdtemp(prefix="bench-")
+os.chdir(WORK_DIR)
+
+import httpx
+
+from dataset import author_of, generate
+
+DB_FILE = "userdaten.db" #so heißt die db relativ zum arbeitsordner (datenbase.DATABASE_URL)
+
+
+# ----------------------------------------------------
+# SZENARIEN: ein eintrag pro endpunkt
+# ----------------------------------------------------
+#jedes szenario baut aus der laufenden nummer i und dem zufallsgenerator einen request
+#die schreibenden laufen nach den lesenden und die deletes ganz am schluss, jeder delete trifft eine andere id
+
+class Scenario:
+    def __init__(self, name, build, ok=(200,)):
+        self.name = name
+        self.build = build #(i, rng) -> (method, url, httpx kwargs)
+        self.ok = ok
+
+
+def scenarios(n_users: int, n_posts: int, skew: float, n_requests: int) -> list:
+    def any_user(rng):
+        return rng.randint(1, n_users)
+
+    def hot_user(rng):
+        return author_of(rng, n_users, skew) #die user mit vielen posts werden auch öfter angefragt
+
+    def any_post(rng):
+        return rng.randint(1, n_posts)
+
+    csv_body = "title,content,user_id\n" + "".join(f"Import {j},Inhalt {j},{j % n_users + 1}\n" for j in range(100))
+    return [
+        Scenario("GET /users/", lambda i, rng: ("GET", "/users/", {})),
+        Scenario("GET /users/users", lambda i, rng: ("GET", "/users/users", {"params": {"limit": 100}})),
+        Scenario("GET /users/users?name=", lambda i, rng: (
+            "GET", "/users/users", {"params": {"name": rng.choice(["Anna", "Müller", "Weber", "Klein"]), "limit": 100}})),
+        Scenario("GET /users/users/{id}", lambda i, rng: ("GET", f"/users/users/{any_user(rng)}", {})),
+        Scenario("GET /users/users/{id} (hot)", lambda i, rng: ("GET", f"/users/users/{hot_user(rng)}", {})),
+        Scenario("GET /posts/posts/{id}", lambda i, rng: ("GET", f"/posts/posts/{any_post(rng)}", {})),
+        Scenario("GET /posts/users/{id}/posts", lambda i, rng: ("GET", f"/posts/users/{hot_user(rng)}/posts", {})),
+        Scenario("POST /users/users", lambda i, rng: (
+            "POST", "/users/users", {"json": {"name": f"Bench {i}", "email": f"bench{i}@example.org"}})),
+        Scenario("POST /users/users/bulk", lambda i, rng: (
+            "POST", "/users/users/bulk",
+            {"json": [{"name": f"Bulk {i} {j}", "email": f"bulk{i}.{j}@example.org"} for j in range(100)]})),
+        Scenario("POST /posts/posts", lambda i, rng: (
+            "POST", "/posts/posts", {"json": {"title": f"Bench {i}", "content": "Inhalt " * 20, "user_id": any_user(rng)}})),
+        Scenario("POST /posts/posts/import", lambda i, rng: (
+            "POST", "/posts/posts/import", {"files": {"file": ("posts.csv", csv_body.encode())}}), ok=(202,)),
+        Scenario("PUT /users/users/{id}", lambda i, rng: (
+            "PUT", f"/users/users/{i + 1}", {"json": {"id": i + 1, "name": f"Neu {i}", "email": f"user{i + 1}@example.com"}})),
+        Scenario("PUT /posts/posts/{id}", lambda i, rng: (
+            "PUT", f"/posts/posts/{i + 1}", {"json": {"id": i + 1, "title": f"Neu {i}", "content": "neu", "user_id": 1}})),
+        #deletes von hinten, damit sie die ids der PUTs (von vorne) nicht treffen
+        Scenario("DELETE /posts/posts/{id}", lambda i, rng: ("DELETE", f"/posts/posts/{n_posts - i}", {}), ok=(204,)),
+        Scenario("DELETE /users/users/{id}", lambda i, rng: ("DELETE", f"/users/users/{n_users - i}", {})),
+    ]
+
+
+# ----------------------------------------------------
+# MESSEN
+# ----------------------------------------------------
+def percentile(sorted_values: list, p: float) -> float:
+    #nearest-rank: der kleinste wert unter dem mindestens p prozent der messungen liegen
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, n_requests: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(f"{seed}:{scenario.name}") #jedes szenario hat seine eigene feste request-folge
+    requests = [scenario.build(i, rng) for i in range(n_requests)]
+    latencies = []
+    errors = 0
+    counter = iter(requests)
+
+    async def worker():
+        nonlocal errors
+        for method, url, kwargs in counter:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in scenario.ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": n_requests,
+        "errors": errors,
+        "rps": round(n_requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run_all(client: httpx.AsyncClient, args) -> dict:
+    results = {}
+    for scenario in scenarios(args.users, args.posts, args.skew, args.requests):
+        results[scenario.name] = await run_scenario(client, scenario, args.requests, args.concurrency, args.seed)
+        print_row(scenario.name, results[scenario.name])
+    return results
+
+
+# ----------------------------------------------------
+# TRANSPORTE
+# ----------------------------------------------------
+def fresh_copy(template: str, run_dir: str = None) -> str:
+    run_dir = run_dir or tempfile.mkdtemp(prefix="bench-")
+    shutil.copy(template, os.path.join(run_dir, DB_FILE))
+    return run_dir
+
+
+def bench_inprocess(template: str, args) -> dict:
+    fresh_copy(template, WORK_DIR)
+    import main #erst jetzt importieren, main legt beim import tabellen/indizes an
+    from write_queue import writer
+
+    async def go():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await run_all(client, args)
+
+    try:
+        return asyncio.run(go()) #eine event loop für alles, die async engine hängt ihre verbindungen an die loop
+    finally:
+        writer.stop()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_uvicorn(template: str, args) -> dict:
+    run_dir = fresh_copy(template)
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=run_dir, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True: #warten bis der server antwortet
+            try:
+                httpx.get(base_url + "/", timeout=1)
+                break
+            except httpx.TransportError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn ist nicht gestartet")
+                time.sleep(0.2)
+
+        async def go():
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+                return await run_all(client, args)
+
+        return asyncio.run(go())
+    finally:
+        server.terminate()
+        server.wait()
+
+
+# ----------------------------------------------------
+# AUSGABE UND BASELINE
+# ----------------------------------------------------
+def print_header(transport: str):
+    print(f"\n[{transport}]")
+    print(f"{'endpunkt':<32} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'fehler':>7}")
+
+
+def print_row(name: str, r: dict):
+    print(f"{name:<32} {r['rps']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['errors']:>7}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    #regression: p95 um mehr als tolerance langsamer oder durchsatz um mehr als tolerance kleiner als in der baseline
+    #verglichen wird nur was es in beiden gibt (gleicher transport, gleicher endpunkt)
+    regressions = []
+    for transport, endpoints in results.items():
+        for name, now in endpoints.items():
+            before = baseline.get("results", {}).get(transport, {}).get(name)
+            if before is None:
+                continue
+            if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{transport} {name}: p95 {before['p95_ms']:.2f} -> {now['p95_ms']:.2f} ms")
+            if now["rps"] < before["rps"] * (1 - tolerance):
+                regressions.append(f"{transport} {name}: {before['rps']:.1f} -> {now['rps']:.1f} req/s")
+            if now["errors"] > before["errors"]:
+                regressions.append(f"{transport} {name}: {before['errors']} -> {now['errors']} fehler")
+    return regressions
+
+
+def _user_path(path: str) -> str:
+    return os.path.join(START_DIR, path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--skew", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dataset", type=_user_path, help="schon erzeugte db aus benchmarks/dataset.py (gleiche --users/--posts/--skew angeben)")
+    parser.add_argument("--requests", type=int, default=200, help="requests pro endpunkt")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--transport", choices=["inprocess", "uvicorn", "both"], default="both")
+    parser.add_argument("--baseline", type=_user_path, help="baseline json zum vergleichen")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="erlaubte abweichung zur baseline (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", type=_user_path, help="ergebnis als neue baseline speichern")
+    args = parser.parse_args()
+    if args.requests > min(args.users, args.posts) // 2:
+        parser.error("--requests muss kleiner als die hälfte von --users und --posts sein (PUT von vorne, DELETE von hinten)")
+
+    template = args.dataset
+    if template is None:
+        template = os.path.join(tempfile.mkdtemp(prefix="bench-data-"), DB_FILE) #nicht im WORK_DIR, dort landet die kopie
+        generate(template, args.users, args.posts, args.skew, args.seed)
+
+    results = {}
+    #uvicorn zuerst: der in-process lauf importiert main in diesem prozess, danach hängen engine und writer daran
+    for transport, bench in [("uvicorn", bench_uvicorn), ("inprocess", bench_inprocess)]:
+        if args.transport in (transport, "both"):
+            print_header(transport)
+            results[transport] = bench(template, args)
+
+    meta = {key: getattr(args, key) for key in ("users", "posts", "skew", "seed", "requests", "concurrency")}
+    meta["env"] = {key: os.environ[key] for key in sorted(os.environ) if key in (
+        "USE_ASYNC_DB", "DB_PROFILE", "GROUP_COMMIT", "CACHE_ENABLED", "FAST_RESPONSES", "METRICS_ENABLED")}
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"\nbaseline gespeichert: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if {k: v for k, v in baseline.get("meta", {}).items() if k != "env"} != {k: v for k, v in meta.items() if k != "env"}:
+            print("\nACHTUNG: baseline wurde mit anderen parametern gemessen, der vergleich hinkt")
+        regressions = compare(results, baseline, args.tolerance)
+        print(f"\n{len(regressions)} regressionen gegenüber {args.baseline}")
+        for line in regressions:
+            print("  " + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Misst was die MetricsMiddleware (metrics.py) pro request kostet: eine leere ASGI app einmal direkt und einmal durch
+die middleware aufrufen, die differenz ist der overhead. Dazu: was kostet ein statement wenn der handle_error listener
+für die sperren dranhängt, und zum vergleich ein leerer before/after_cursor_execute listener (deshalb misst metrics.py
+nicht pro statement).
+
+    python benchmarks/metrics_overhead.py --requests 200000 --rounds 5
+
+Kein server, kein netzwerk, die echte userdaten.db wird nicht angefasst (sqlite in-memory).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine, event, text
+
+import metrics
+from metrics import MetricsMiddleware
+
+
+class _Route:
+    path = "/users/users/{user_id}"
+
+
+async def empty_app(scope, receive, send):
+    scope["route"] = _Route #so wie es das FastAPI routing macht
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def per_request_seconds(app, n: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/users/users/1"}
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / n
+
+
+def per_statement_seconds(engine, n: int) -> float:
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        for _ in range(n):
+            conn.execute(text("SELECT 1")).scalar()
+        return (time.perf_counter() - start) / n
+
+
+def best_of(rounds: int, fn, *args) -> float:
+    #kleinster wert aus mehreren runden, so stört ein zufällig langsamer durchlauf (gc, andere prozesse) nicht
+    return min(fn(*args) for _ in range(rounds))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--statements", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    bare = best_of(args.rounds, lambda: asyncio.run(per_request_seconds(empty_app, args.requests)))
+    wrapped = best_of(args.rounds, lambda: asyncio.run(per_request_seconds(MetricsMiddleware(empty_app), args.requests)))
+    print(f"request ohne middleware   {bare * 1e6:7.2f} µs")
+    print(f"request mit middleware    {wrapped * 1e6:7.2f} µs   overhead {(wrapped - bare) * 1e6:5.2f} µs")
+
+    plain_engine, watched_engine, cursor_engine = create_engine("sqlite://"), create_engine("sqlite://"), create_engine("sqlite://")
+    metrics.watch_sqlite_locks(watched_engine) #in der app hängt es an der Engine klasse, hier nur an einer engine zum vergleich
+    event.listen(cursor_engine, "before_cursor_execute", lambda *a: None)
+    event.listen(cursor_engine, "after_cursor_execute", lambda *a: None)
+    plain = best_of(args.rounds, per_statement_seconds, plain_engine, args.statements)
+    watched = best_of(args.rounds, per_statement_seconds, watched_engine, args.statements)
+    cursor_events = best_of(args.rounds, per_statement_seconds, cursor_engine, args.statements)
+    print(f"statement ohne events     {plain * 1e6:7.2f} µs")
+    print(f"statement mit handle_error{watched * 1e6:7.2f} µs   overhead {(watched - plain) * 1e6:5.2f} µs")
+    print(f"statement mit cursor events {cursor_events * 1e6:5.2f} µs   overhead {(cursor_events - plain) * 1e6:5.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
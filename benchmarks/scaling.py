@@ -0,0 +1,187 @@
+"""
+Lese-durchsatz mit 1, 2, 4 ... workern (serve.py) auf DERSELBEN sqlite datei. Im WAL modus blockieren sich leser
+nicht, der durchsatz sollte also fast linear mit der zahl der kerne wachsen, bis die kerne (oder der client) voll sind.
+
+    python benchmarks/scaling.py --workers 1,2,4,8 --duration 10 --clients 4
+
+Pro worker-zahl: frische kopie der db, serve.py starten, --clients prozesse feuern --duration sekunden lang
+GET /users/users/{id}, GET /posts/posts/{id} und GET /posts/users/{id}/posts (ids wie in load.py schief verteilt).
+Ausgabe: req/s, p50/p99 und die effizienz (req/s pro worker im vergleich zu 1 worker, 100% = perfekt linear).
+
+Der client läuft auf der gleichen maschine und braucht selber cpu. Für saubere zahlen den client auf eigene kerne
+legen (taskset) oder mehr kerne haben als --workers + --clients. Mehr worker als kerne bringen nichts.
+Cache ist in allen läufen aus (serve.py macht das bei >1 worker sowieso), gemessen wird wirklich sqlite + app.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dataset import author_of, generate
+
+DB_FILE = "userdaten.db" #so heißt die db relativ zum arbeitsordner (datenbase.DATABASE_URL)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    #nearest-rank wie in load.py
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+# ----------------------------------------------------
+# CLIENT
+# ----------------------------------------------------
+#ein minimaler HTTP/1.1 client mit keep-alive. httpx braucht pro request mehr cpu als die app selber, mit httpx würde
+#man also den client messen und nicht die worker
+
+async def _connection(port: int, paths, deadline: float, latencies: list, errors: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            path = next(paths)
+            start = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line[:15].lower() == b"content-length:":
+                    length = int(line[15:])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if not head.startswith(b"HTTP/1.1 200"):
+                errors.append(head.split(b"\r\n", 1)[0])
+    finally:
+        writer.close()
+
+
+def _paths(seed: int, n_users: int, n_posts: int, skew: float):
+    rng = random.Random(seed)
+    while True:
+        yield f"/users/users/{author_of(rng, n_users, skew)}"
+        yield f"/posts/posts/{rng.randint(1, n_posts)}"
+        yield f"/posts/users/{author_of(rng, n_users, skew)}/posts"
+
+
+def _client(job) -> tuple:
+    #läuft in einem eigenen prozess, gibt (latenzen, fehler) zurück
+    port, index, args, start_at = job
+    paths = _paths(args.seed * 1000 + index, args.users, args.posts, args.skew)
+    latencies, errors = [], []
+
+    async def go():
+        await asyncio.sleep(max(0.0, start_at - time.time())) #alle clients fangen gleichzeitig an
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(*(_connection(port, paths, deadline, latencies, errors) for _ in range(args.concurrency)))
+
+    asyncio.run(go())
+    return latencies, len(errors)
+
+
+# ----------------------------------------------------
+# SERVER
+# ----------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(port: int, server: subprocess.Popen):
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as sock:
+                sock.sendall(b"GET /users/users/1 HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+                if sock.recv(12).startswith(b"HTTP/1.1"):
+                    return
+        except OSError:
+            pass
+        if server.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("serve.py ist nicht gestartet")
+        time.sleep(0.2)
+
+
+def measure(template: str, workers: int, args) -> dict:
+    run_dir = tempfile.mkdtemp(prefix="bench-scaling-")
+    shutil.copy(template, os.path.join(run_dir, DB_FILE))
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""), CACHE_ENABLED="0")
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "serve.py"), "--workers", str(workers), "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=run_dir, env=env,
+    )
+    try:
+        _wait_until_up(port, server)
+        start_at = time.time() + 0.5
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            results = pool.map(_client, [(port, i, args, start_at) for i in range(args.clients)])
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    latencies = sorted(value for result in results for value in result[0])
+    return {
+        "rps": len(latencies) / args.duration,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": sum(result[1] for result in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--skew", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dataset", help="schon erzeugte db aus benchmarks/dataset.py (gleiche --users/--posts/--skew angeben)")
+    parser.add_argument("--workers", default=None, help="komma-liste, standard: 1, 2, 4 ... bis zur zahl der kerne")
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="client prozesse")
+    parser.add_argument("--concurrency", type=int, default=16, help="offene verbindungen pro client prozess")
+    parser.add_argument("--duration", type=float, default=10.0, help="sekunden pro messung")
+    args = parser.parse_args()
+
+    if args.workers:
+        worker_counts = [int(n) for n in args.workers.split(",")]
+    else:
+        cores = os.cpu_count() or 1
+        worker_counts = [n for n in (1, 2, 4, 8, 16, 32, 64) if n < cores] + [cores]
+
+    template, data_dir = args.dataset, None
+    if template is None:
+        data_dir = tempfile.mkdtemp(prefix="bench-data-")
+        template = os.path.join(data_dir, DB_FILE)
+        generate(template, args.users, args.posts, args.skew, args.seed)
+
+    print(f"\n{os.cpu_count()} kerne, {args.clients} client prozesse x {args.concurrency} verbindungen, {args.duration:g}s pro lauf")
+    print(f"{'worker':>6} {'req/s':>10} {'speedup':>8} {'effizienz':>10} {'p50 ms':>8} {'p99 ms':>8} {'fehler':>7}")
+    single = None
+    try:
+        for workers in worker_counts:
+            r = measure(template, workers, args)
+            if single is None:
+                single = r["rps"] / workers
+            speedup = r["rps"] / single
+            print(f"{workers:>6} {r['rps']:>10.1f} {speedup:>7.2f}x {speedup / workers:>9.0%} "
+                  f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>7}")
+    finally:
+        if data_dir is not None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
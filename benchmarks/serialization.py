@@ -0,0 +1,84 @@
+"""
+Misst wie lange es dauert eine liste mit N usern als json antwort zu bauen:
+der normale weg (UserPage validieren + jsonable_encoder + json.dumps) gegen den schnellen weg aus fast_json.py.
+
+    python benchmarks/serialization.py --users 10000 --repeat 10
+
+Braucht keine datenbank, die User logik objekte werden direkt im speicher gebaut.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import fast_json
+from fast_json import FastJSONResponse, user_page_response, user_item
+from models import User
+from schemas import UserPage
+
+
+def make_users(n: int) -> list:
+    return [User(name=f"User {i}", email=f"user{i}@example.com", user_id=i) for i in range(1, n + 1)]
+
+
+def fastapi_default(users):
+    #so macht es FastAPI mit response_model=UserPage: validieren, in python typen umwandeln, json.dumps
+    page = UserPage.model_validate({"items": users, "next_cursor": None}, from_attributes=True)
+    return JSONResponse(jsonable_encoder(page)).body
+
+
+def validate_orjson(users):
+    #nur die antwort-klasse tauschen, die validierung bleibt
+    page = UserPage.model_validate({"items": users, "next_cursor": None}, from_attributes=True)
+    return FastJSONResponse(page.model_dump(mode="json")).body
+
+
+def dicts_orjson(users):
+    return FastJSONResponse({"items": [user_item(u) for u in users], "next_cursor": None}).body
+
+
+def type_adapter(users):
+    return user_page_response(users, None).body
+
+
+def measure(fn, users, repeat: int) -> float:
+    fn(users) #aufwärmen
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(users)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    users = make_users(args.users)
+    #alle wege müssen das gleiche json liefern, sonst ist der vergleich sinnlos
+    reference = json.loads(fastapi_default(users))
+    candidates = [
+        ("response_model + json (FastAPI standard)", fastapi_default),
+        ("response_model + orjson", validate_orjson),
+        ("dicts + orjson", dicts_orjson),
+        ("dicts + TypeAdapter.dump_json (FAST_RESPONSES)", type_adapter),
+    ]
+    print(f"{args.users} user, orjson {'installiert' if fast_json.orjson else 'NICHT installiert'}")
+    baseline = None
+    for label, fn in candidates:
+        assert json.loads(fn(users)) == reference, label
+        ms = measure(fn, users, args.repeat)
+        baseline = baseline or ms
+        print(f"{label:<50} {ms:9.1f} ms   x{baseline / ms:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from models import User, Post
+
+# ----------------------------------------------------
+# READ-THROUGH CACHE FÜR USER UND POSTS
+# ----------------------------------------------------
+#der traffic geht fast nur auf wenige "heiße" user/posts, die müssen nicht bei jedem GET aus sqlite kommen
+#LRU: das am längsten nicht benutzte fliegt zuerst raus, sobald zu viele einträge oder zu viele bytes drin sind
+#TTL: nach X sekunden gilt ein eintrag als abgelaufen, auch wenn niemand ihn invalidiert hat
+#
+#im cache liegen KEINE ORM objekte (die hängen an einer session), sondern kopien als User/Post logik objekte
+#tags: ein post hängt am tag ("user", user_id), so kann delete_user auch alle posts dieses users rauswerfen
+#
+#der cache lebt im prozess: mit mehreren workern (serve.py) sieht ein worker die invalidierungen der anderen nicht und
+#liefert bis zu CACHE_TTL sekunden alte daten. serve.py schaltet ihn deshalb bei mehr als einem worker ab, außer
+#CACHE_ENABLED ist ausdrücklich gesetzt (dann mit kleinem CACHE_TTL)
+#
+#wettlauf lesen/schreiben: ein GET liest aus der db, währenddessen ändert ein PUT die zeile und invalidiert. käme der
+#gelesene wert danach in den cache, läge dort bis zum TTL der alte stand. darum merkt sich invalidate pro key und pro
+#tag den stand einer uhr (_clock), begin_load gibt den stand vor dem lesen, und put verwirft den wert nur wenn SEIN key
+#oder einer SEINER tags seitdem invalidiert wurde. invalidierungen anderer einträge stören das laden nicht mehr
+#(vorher eine einzige generation für alles: unter schreiblast kam kaum noch etwas in den cache).
+#gemerkt werden höchstens MAX_TRACKED_INVALIDATIONS keys/tags, was rausfällt hebt _floor an: ein laden das vor diesem
+#stand angefangen hat wird sicherheitshalber verworfen
+
+MAX_TRACKED_INVALIDATIONS = 10000
+
+
+class EntityCache:
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict() #key -> (value, größe, ablaufzeit, tags)
+        self._tags = {} #tag -> set(keys)
+        self._bytes = 0
+        self._clock = 0 #zählt jede invalidierung, siehe begin_load/put
+        self._invalidated = OrderedDict() #key oder tag -> _clock bei seiner letzten invalidierung (älteste zuerst)
+        self._floor = 0 #wer vor diesem stand angefangen hat zu laden, kommt nicht mehr in den cache
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # --- lesen ---
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key) #gerade benutzt -> ans ende der LRU reihenfolge
+            self.hits += 1
+            return entry[0]
+
+    # --- schreiben ---
+
+    def begin_load(self) -> int:
+        #vor dem lesen aus der db merken; wird währenddessen dieser key oder einer seiner tags invalidiert, ist der
+        #geladene wert evtl. schon alt
+        return self._clock
+
+    def _stale(self, token: int, key, tags) -> bool:
+        if token < self._floor:
+            return True
+        return any(self._invalidated.get(name, -1) > token for name in (key, *tags))
+
+    def put(self, key, value, size: int, tags=(), token: int = None):
+        with self._lock:
+            if token is not None and self._stale(token, key, tags):
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl, tuple(tags))
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, *keys, tags=()):
+        with self._lock:
+            self._clock += 1
+            for name in (*keys, *tags):
+                self._invalidated[name] = self._clock
+                self._invalidated.move_to_end(name)
+            while len(self._invalidated) > MAX_TRACKED_INVALIDATIONS:
+                _, stamp = self._invalidated.popitem(last=False)
+                self._floor = stamp
+            for tag in tags:
+                keys += tuple(self._tags.get(tag, ()))
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._clock += 1
+            self._floor = self._clock #alles was gerade lädt ist von vor dem leeren
+            self._invalidated.clear()
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def after_fork(self):
+        #der lock könnte im moment vom fork von einem thread gehalten worden sein, den es im worker nicht mehr gibt
+        self._lock = threading.Lock()
+        self.clear()
+
+    def _remove(self, key):
+        value, size, _, tags = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# ----------------------------------------------------
+# KOPIEN DER ORM OBJEKTE
+# ----------------------------------------------------
+
+def user_key(user_id: int):
+    return ("user", user_id)
+
+
+def post_key(post_id: int):
+    return ("post", post_id)
+
+
+def snapshot_user(db_user) -> User:
+    user = User(name=db_user.name, email=db_user.email, user_id=db_user.id, version=db_user.version)
+    user.posts = [
+        Post(title=p.title, content=p.content, user_id=p.user_id, post_id=p.id, version=p.version) for p in db_user.posts
+    ]
+    return user
+
+
+def user_size(user: User) -> int:
+    #grob geschätzte bytes, reicht um große user (viele/lange posts) früher rauszuwerfen
+    return 100 + len(user.name) + len(user.email) + sum(post_size(p) for p in user.posts)
+
+
+def post_size(post: Post) -> int:
+    return 100 + len(post.title) + len(post.content)
+
+
+entity_cache = EntityCache(
+    max_entries=config.CACHE_MAX_ENTRIES, max_bytes=config.CACHE_MAX_BYTES, ttl=config.CACHE_TTL
+)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=entity_cache.after_fork)
+
+
+def get_cache():
+    #für die repositories: None heißt ohne cache, jede abfrage geht an die db
+    return entity_cache if config.CACHE_ENABLED else None
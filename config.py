@@ -0,0 +1,102 @@
+import os
+
+# ----------------------------------------------------
+# KONFIGURATION (über Umgebungsvariablen)
+# ----------------------------------------------------
+#alles was man beim starten umstellen können soll steht hier, die module lesen es nur von hier
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, "1" if default else "0").lower() in ("1", "true", "yes", "on")
+
+#USE_ASYNC_DB=1 startet die async variante (async def routen + AsyncSession), sonst die normalen sync routen im threadpool
+USE_ASYNC_DB = _env_bool("USE_ASYNC_DB", False)
+
+#welches SQLite speicher-profil (siehe storage.PROFILES) auf jede verbindung angewendet wird
+DB_PROFILE = os.getenv("DB_PROFILE", "wal")
+
+#WAL checkpoints im hintergrund: alle X sekunden, und ab dieser größe der -wal datei wird sie auf 0 gekürzt
+WAL_CHECKPOINT_INTERVAL = float(os.getenv("WAL_CHECKPOINT_INTERVAL", "30"))
+WAL_TRUNCATE_BYTES = int(os.getenv("WAL_TRUNCATE_BYTES", str(64 * 1024 * 1024)))
+
+#GROUP_COMMIT=1: alle schreib-operationen laufen über einen einzigen schreib-thread (write_queue.py)
+#der sie MAX_DELAY_MS lang oder bis MAX_BATCH stück sammelt und zusammen committet
+GROUP_COMMIT = _env_bool("GROUP_COMMIT", False)
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "5"))
+
+#read-through cache für GET /users/{id} und GET /posts/{id} (cache.py)
+CACHE_ENABLED = _env_bool("CACHE_ENABLED", True)
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))
+
+#FAST_RESPONSES=1: orjson als default antwort-klasse und die listen-routen serialisieren ohne nochmal zu validieren (fast_json.py)
+FAST_RESPONSES = _env_bool("FAST_RESPONSES", False)
+
+#SQL_PROFILER=1: zählt statements/SQL-zeit/zeilen pro request und schickt sie als Server-Timing header mit (sql_profiler.py)
+#warnt bei mehr als SQL_QUERY_BUDGET statements, wenn das gleiche SQL SQL_N_PLUS_ONE_THRESHOLD mal kommt (N+1)
+#und loggt statements über SQL_SLOW_MS mit EXPLAIN QUERY PLAN
+SQL_PROFILER = _env_bool("SQL_PROFILER", False)
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "10"))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "3"))
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "100"))
+
+#METRICS_ENABLED=0 schaltet GET /metrics und die messung in der middleware ab (metrics.py)
+#ein schreib-statement das länger als SQLITE_LOCK_WAIT_MS braucht zählt als "hat auf die schreibsperre gewartet"
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+SQLITE_LOCK_WAIT_MS = float(os.getenv("SQLITE_LOCK_WAIT_MS", "50"))
+
+#beim start fehlende migrationen gleich anwenden (migrations.py). mit 0 bricht die app ab und man migriert vorher selber
+#mit "python migrations.py upgrade". MIGRATION_BATCH_PAUSE_MS ist die pause zwischen zwei stücken einer großen umschreibung
+MIGRATE_ON_STARTUP = _env_bool("MIGRATE_ON_STARTUP", True)
+MIGRATION_BATCH_PAUSE_MS = float(os.getenv("MIGRATION_BATCH_PAUSE_MS", "10"))
+
+#mehrere prozesse (serve.py --workers N): jeder worker hat seine eigenen engines und pools. DB_MAX_CONNECTIONS ist das
+#budget an sqlite verbindungen über ALLE worker zusammen (jede hat ihren eigenen page cache, siehe storage.py cache_size),
+#jeder worker bekommt davon seinen teil: ein drittel fest im pool, der rest als overflow. mit 1 worker und dem standard
+#von 15 sind das 5 + 10, also genau die sqlalchemy standardwerte von früher
+WORKERS = max(1, int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "1"))))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "15"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(max(1, DB_MAX_CONNECTIONS // WORKERS // 3))))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", str(max(0, DB_MAX_CONNECTIONS // WORKERS - DB_POOL_SIZE))))
+
+#SHARDS=N (N > 1): users und ihre posts liegen verteilt auf N sqlite dateien in SHARD_DIR (sharding.py). die anzahl steht
+#auch in SHARD_DIR/global.db, ändern nur mit "python sharding.py rebalance --to N" (app vorher stoppen).
+#ID_BLOCK_SIZE: so viele ids holt sich jeder prozess auf einmal aus global.db
+SHARDS = int(os.getenv("SHARDS", "1"))
+SHARD_DIR = os.getenv("SHARD_DIR", "./shards")
+ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", "100"))
+
+#MEMORY_STORE=1: users und posts liegen komplett im speicher (memory_store.py), lesen fragt sqlite gar nicht mehr.
+#jedes schreiben geht erst in das append-only log MEMORY_STORE_LOG, danach schreibt ein thread es nach sqlite.
+#MEMORY_STORE_FSYNC=0: nicht auf die platte syncen (ein absturz der app verliert nichts, ein stromausfall schon).
+#das log wird geleert sobald alles in sqlite steht und es größer als MEMORY_STORE_LOG_MAX_BYTES ist.
+#geht nur mit EINEM prozess (WORKERS=1), den sync routen und ohne SHARDS
+MEMORY_STORE = _env_bool("MEMORY_STORE", False)
+MEMORY_STORE_LOG = os.getenv("MEMORY_STORE_LOG", "./userdaten.wbl")
+MEMORY_STORE_FSYNC = _env_bool("MEMORY_STORE_FSYNC", True)
+MEMORY_STORE_MAX_BATCH = int(os.getenv("MEMORY_STORE_MAX_BATCH", "256"))
+MEMORY_STORE_MAX_DELAY_MS = float(os.getenv("MEMORY_STORE_MAX_DELAY_MS", "2"))
+MEMORY_STORE_LOG_MAX_BYTES = int(os.getenv("MEMORY_STORE_LOG_MAX_BYTES", str(64 * 1024 * 1024)))
+
+#posts.content ab CONTENT_COMPRESS_MIN_BYTES bytes wird komprimiert gespeichert (content_codec.py).
+#CONTENT_COMPRESSION: zlib, zstd (braucht das paket zstandard, sonst zlib) oder none. gilt nur für neue schreibvorgänge,
+#alte zeilen bleiben in jedem format lesbar
+CONTENT_COMPRESSION = os.getenv("CONTENT_COMPRESSION", "zlib").lower()
+CONTENT_COMPRESS_MIN_BYTES = int(os.getenv("CONTENT_COMPRESS_MIN_BYTES", "256"))
+CONTENT_COMPRESS_LEVEL = int(os.getenv("CONTENT_COMPRESS_LEVEL", "6"))
+
+#SINGLE_FLIGHT=1: gleichzeitige gleiche GETs (user, post, listen) teilen sich eine abfrage und das json (single_flight.py)
+SINGLE_FLIGHT = _env_bool("SINGLE_FLIGHT", True)
+
+#ADMISSION_CONTROL=1: pro routen-gruppe (read, write, export, import) nur so viele requests gleichzeitig, ein paar
+#warten davor, der rest bekommt sofort 429/503 mit Retry-After (admission.py). ADMISSION_LIMITS="gruppe=limit:queue,..."
+#ändert einzelne gruppen, ADMISSION_QUEUE_TIMEOUT_MS ist wie lange höchstens gewartet wird
+ADMISSION_CONTROL = _env_bool("ADMISSION_CONTROL", True)
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "")
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "1000"))
+
+#DELETE /users/{id}: users mit bis zu PURGE_BATCH_SIZE posts werden sofort gelöscht, größere stückweise im hintergrund
+#(purge.py): PURGE_BATCH_SIZE posts pro transaktion, PURGE_PAUSE_MS pause dazwischen damit andere schreiber drankommen
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+PURGE_PAUSE_MS = float(os.getenv("PURGE_PAUSE_MS", "20"))
@@ -0,0 +1,151 @@
+import logging
+import zlib
+
+from sqlalchemy import String
+from sqlalchemy.types import TypeDecorator
+
+import config
+
+try:
+    import zstandard #optional: ohne zstandard gibt es nur zlib
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------
+# KOMPRIMIERTER POST-INHALT
+# ----------------------------------------------------
+#posts.content hat keine längengrenze. lange texte machen die db datei und den page cache groß, auch für abfragen die
+#nur titel brauchen (sqlite liest immer die ganze zeile, bei langen texten auch die overflow-seiten)
+#
+#sqlite speichert pro wert den typ mit, daran und am ersten byte erkennt decode das format:
+#  TEXT                        unkomprimiert: alle alten zeilen und alles unter CONTENT_COMPRESS_MIN_BYTES
+#  BLOB b"z" + zlib daten
+#  BLOB b"s" + zstd daten
+#so bleiben alte zeilen lesbar, auch wenn CONTENT_COMPRESSION später umgestellt wird. bringt das komprimieren
+#nichts (schon komprimierte daten, viele emojis...) bleibt es beim text
+#
+#sqlite selbst kennt das format nicht. damit die triggers (FTS, zähler für /stats) ohne eigene funktion auskommen und
+#posts auch mit dem sqlite3 kommandozeilen-programm oder anderen tools geändert werden können, stehen bei einer
+#komprimierten zeile zwei spalten daneben (migration 10):
+#  posts.search_text     der text für die volltextsuche (FTS braucht ihn für snippet() und zum austragen)
+#  posts.content_bytes   utf-8 länge des texts
+#bei TEXT zeilen sind beide NULL, dort lesen die triggers content direkt (plain_text_sql/plain_bytes_sql). fremde tools
+#schreiben immer TEXT, für sie ändert sich also nichts. der preis: ein komprimierter post steht für die suche noch
+#einmal als text in der datei, kleiner wird die datei dadurch nicht mehr, nur content selbst (lesen, page cache, export).
+#wer das nicht will stellt CONTENT_COMPRESSION=none
+#
+#die funktion post_text(content) gibt es weiter (storage.apply_profile), sie wird nur noch von den migrationen 6 und 7
+#auf alten dbs gebraucht
+
+ZLIB = b"z"
+ZSTD = b"s"
+
+METHODS = ("zlib", "zstd", "none")
+
+
+def _method() -> str:
+    method = config.CONTENT_COMPRESSION
+    if method not in METHODS:
+        raise ValueError(f"Unbekannte CONTENT_COMPRESSION '{method}', erlaubt: {', '.join(METHODS)}")
+    if method == "zstd" and zstandard is None:
+        logger.warning("CONTENT_COMPRESSION=zstd, aber das paket zstandard fehlt, nehme zlib")
+        return "zlib"
+    return method
+
+
+METHOD = _method()
+
+
+def encode(text):
+    #str -> was in der spalte landet (str oder bytes)
+    if text is None or METHOD == "none":
+        return text
+    raw = text.encode("utf-8")
+    if len(raw) < config.CONTENT_COMPRESS_MIN_BYTES:
+        return text
+    if METHOD == "zstd":
+        packed = ZSTD + zstandard.ZstdCompressor(level=config.CONTENT_COMPRESS_LEVEL).compress(raw)
+    else:
+        packed = ZLIB + zlib.compress(raw, config.CONTENT_COMPRESS_LEVEL)
+    return packed if len(packed) < len(raw) else text
+
+
+def decode(value):
+    #was in der spalte steht -> str
+    if not isinstance(value, bytes): #text (oder None): unkomprimiert
+        return value
+    marker, data = value[:1], value[1:]
+    if marker == ZLIB:
+        return zlib.decompress(data).decode("utf-8")
+    if marker == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("posts.content ist mit zstd komprimiert, dafür fehlt das paket zstandard")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    raise ValueError(f"Unbekanntes format {marker!r} in posts.content")
+
+
+class CompressedText(TypeDecorator):
+    #für das ORM und select(PostModel.content) ist die spalte ein ganz normaler str
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, bytes): #schon gepackt (content_columns)
+            return value
+        return encode(value)
+
+    def process_result_value(self, value, dialect):
+        return decode(value)
+
+
+def content_columns(text) -> dict:
+    #alles was beim schreiben eines posts in die spalten content, search_text und content_bytes gehört
+    packed = encode(text)
+    if isinstance(packed, bytes):
+        return {"content": packed, "search_text": text, "content_bytes": len(text.encode("utf-8"))}
+    return {"content": packed, "search_text": None, "content_bytes": None}
+
+
+def plain_text_sql(row: str = "") -> str:
+    #der text eines posts in SQL, ohne post_text(). row: "" oder "new." / "old." in triggers
+    return f"CASE WHEN typeof({row}content) = 'text' THEN {row}content ELSE {row}search_text END"
+
+
+def plain_bytes_sql(row: str = "") -> str:
+    #utf-8 länge des texts. bei TEXT aus content selbst, damit ein fremdes UPDATE keine alte länge stehen lässt
+    return f"CASE WHEN typeof({row}content) = 'text' THEN length(CAST({row}content AS BLOB)) ELSE {row}content_bytes END"
+
+
+def register_functions(dbapi_connection):
+    #post_text(content) für SQL, nur noch für die migrationen 6 und 7. deterministic: gleicher wert, gleiches ergebnis
+    dbapi_connection.create_function("post_text", 1, decode, deterministic=True)
+
+
+# ----------------------------------------------------
+# ALTE ZEILEN KOMPRIMIEREN (batch von migration 6)
+# ----------------------------------------------------
+#läuft wie jede batch-migration im hintergrund (migrations.BackfillRunner) oder mit "python migrations.py backfill".
+#ab migration 10 lassen die triggers eine zeile in ruhe wenn sich nur das format ändert (gleicher text): FTS wird nicht
+#neu geschrieben und die user-versionen bleiben, die ETags der clients also gültig.
+#läuft die batch-arbeit vor migration 10 (upgrade --to 6), gibt es search_text/content_bytes noch nicht
+
+def compress_batch(conn, position, limit: int):
+    rows = conn.exec_driver_sql(
+        "SELECT id, content FROM posts WHERE id > ? AND typeof(content) = 'text' ORDER BY id LIMIT ?",
+        (position or 0, limit),
+    ).all()
+    if not rows:
+        return None
+    plain_columns = "search_text" in {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(posts)")}
+    updates = []
+    for post_id, content in rows:
+        values = content_columns(content)
+        if isinstance(values["content"], bytes):
+            updates.append((values["content"], values["search_text"], values["content_bytes"], post_id))
+    if updates and plain_columns:
+        conn.exec_driver_sql("UPDATE posts SET content = ?, search_text = ?, content_bytes = ? WHERE id = ?", updates)
+    elif updates:
+        conn.exec_driver_sql("UPDATE posts SET content = ? WHERE id = ?", [(u[0], u[3]) for u in updates])
+    return rows[-1][0]
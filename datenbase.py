@@ -1,9 +1,27 @@
+import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+import config
+from storage import apply_profile, WalCheckpointScheduler
 
 DATABASE_URL = "sqlite:///./userdaten.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}) #die engine ist der Motor ohne sie gibt es keine Verbindung zur Db und auch nur sie kann mit ihr kommunizieren und weiß wo sie ist
+engine = create_engine(
+    DATABASE_URL, connect_args={"check_same_thread": False},
+    pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW, #pro worker, siehe config.py
+) #die engine ist der Motor ohne sie gibt es keine Verbindung zur Db und auch nur sie kann mit ihr kommunizieren und weiß wo sie ist
 #das connect_args ist ein spezifischer Befehl für sql das einzelnde threads auch gleichseitig laufen dürfen  
+apply_profile(engine, config.DB_PROFILE) #pragmas (WAL, cache, busy_timeout...) für jede neue verbindung, siehe storage.py
+wal_checkpointer = WalCheckpointScheduler(engine, config.WAL_CHECKPOINT_INTERVAL, config.WAL_TRUNCATE_BYTES) #wird in main.py gestartet
+
+#nach einem fork (serve.py, gunicorn --preload) hat der worker eine kopie vom pool des elternprozesses, mit den gleichen
+#offenen sqlite verbindungen. zwei prozesse auf einer verbindung machen die datei kaputt, also wirft der worker den pool
+#weg und öffnet eigene. close=False: die verbindungen gehören weiter dem elternprozess, der worker schließt sie nicht
+def _after_fork():
+    engine.dispose(close=False)
+    wal_checkpointer.after_fork()
+
+if hasattr(os, "register_at_fork"): #windows kennt kein fork, da startet uvicorn die worker mit spawn neu
+    os.register_at_fork(after_in_child=_after_fork)
    
 Base = declarative_base() #ist eine Kopie vom Regelbuch von SQL / später weiß sql das es die Python befehle übersetzen muss in SQL
 SessionLocal = sessionmaker(bind=engine) #wir binden die engine an um immer wenn wir was in der db ändern wollen eine direkte verbindung zur db zu haben,
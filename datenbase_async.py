@@ -0,0 +1,24 @@
+import os
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import config
+from storage import apply_profile
+
+# ----------------------------------------------------
+# ASYNC VARIANTE VON datenbase.py (aiosqlite)
+# ----------------------------------------------------
+#die sync routen blockieren pro request einen platz im threadpool von starlette, bei vielen gleichzeitigen requests ist der
+#threadpool voll bevor die cpu es ist. mit AsyncSession wartet der request auf die db ohne einen thread zu belegen
+#eigenes modul, damit die sync variante auch ohne aiosqlite/greenlet läuft (pip install "sqlalchemy[asyncio]" aiosqlite)
+
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./userdaten.db" #gleiche datei, nur anderer treiber
+async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW)
+apply_profile(async_engine, config.DB_PROFILE) #gleiche pragmas wie die sync engine
+#expire_on_commit=False weil nach dem commit sonst jeder zugriff auf ein attribut nachladen will und das geht async nicht implizit
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+if hasattr(os, "register_at_fork"): #wie in datenbase.py: nach einem fork eigene verbindungen statt die des elternprozesses
+    os.register_at_fork(after_in_child=lambda: async_engine.sync_engine.dispose(close=False))
+
+async def get_async_db(): #wie get_db nur für async routen
+    async with AsyncSessionLocal() as db:
+        yield db
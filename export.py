@@ -0,0 +1,103 @@
+import argparse
+import csv
+import heapq
+import io
+import json
+import sys
+from itertools import islice
+from operator import itemgetter
+
+from sqlalchemy import select
+
+from datenbase import SessionLocal
+from models import UserModel, PostModel
+from sharding import shard_map
+
+# ----------------------------------------------------
+# STREAMING EXPORT (NDJSON / CSV)
+# ----------------------------------------------------
+#get_all_users_with_posts baut alles auf einmal im speicher zusammen, für einen kompletten dump ist das viel zu viel
+#hier lesen wir die tabellen über einen server-side cursor (yield_per) in festen häppchen und schicken sie direkt weiter
+#so bleibt der speicherverbrauch gleich egal wie groß die tabelle ist
+
+EXPORT_TABLES = {
+    "users": (UserModel.id, UserModel.name, UserModel.email),
+    "posts": (PostModel.id, PostModel.title, PostModel.content, PostModel.user_id),
+}
+EXPORT_FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+CHUNK_ROWS = 1000 #so viele zeilen holt der cursor pro runde aus der db und so viele gehen pro chunk raus
+
+
+def iter_rows(session, table: str, chunk_rows: int = CHUNK_ROWS):
+    columns = EXPORT_TABLES[table]
+    stmt = select(*columns).order_by(columns[0]) #nur die spalten, keine ORM objekte die sich in der session ansammeln
+    result = session.execute(stmt.execution_options(stream_results=True, yield_per=chunk_rows))
+    for partition in result.partitions():
+        yield partition
+
+
+def iter_sharded_rows(sessions: list, table: str, chunk_rows: int = CHUNK_ROWS):
+    #SHARDS > 1: ein cursor pro shard, heapq.merge mischt sie nach id zusammen, es liegt trotzdem nie alles im speicher
+    streams = [(row for partition in iter_rows(session, table, chunk_rows) for row in partition) for session in sessions]
+    merged = heapq.merge(*streams, key=itemgetter(0))
+    while True:
+        partition = list(islice(merged, chunk_rows))
+        if not partition:
+            return
+        yield partition
+
+
+def iter_export(table: str, fmt: str = "ndjson", chunk_rows: int = CHUNK_ROWS):
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unbekannte Tabelle: {table}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unbekanntes Format: {fmt}")
+
+    #eigene session, weil der generator erst läuft wenn der endpunkt schon zurückgegeben hat
+    sessions = [SessionLocal()] if shard_map is None else [make_session() for make_session in shard_map.sessionmakers]
+    try:
+        header = [column.key for column in EXPORT_TABLES[table]]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(header)
+
+        if len(sessions) == 1:
+            partitions = iter_rows(sessions[0], table, chunk_rows)
+        else:
+            partitions = iter_sharded_rows(sessions, table, chunk_rows)
+        for partition in partitions:
+            for row in partition:
+                if writer:
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(dict(zip(header, row)), ensure_ascii=False))
+                    buffer.write("\n")
+            yield buffer.getvalue() #ein chunk pro partition, danach wird der puffer wieder geleert
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue() #bei einer leeren tabelle steht hier nur der csv header
+    finally:
+        for session in sessions:
+            session.close()
+
+
+# CLI: python export.py users --format csv > users.csv
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportiert eine Tabelle als NDJSON oder CSV nach stdout")
+    parser.add_argument("table", choices=sorted(EXPORT_TABLES))
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    for chunk in iter_export(args.table, args.format, args.chunk_rows):
+        sys.stdout.write(chunk)
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
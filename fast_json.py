@@ -0,0 +1,92 @@
+import json
+from typing import List, Optional
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict #pydantic braucht auf python < 3.12 die TypedDict aus typing_extensions
+
+try:
+    import orjson #optional: ohne orjson nehmen wir den normalen json encoder
+except ImportError:
+    orjson = None
+
+# ----------------------------------------------------
+# SCHNELLER SERIALISIERUNGS-PFAD (config.FAST_RESPONSES)
+# ----------------------------------------------------
+#normal läuft jede antwort so: route gibt User/Post objekte zurück -> FastAPI validiert sie nochmal gegen
+#das response_model (from_attributes, EmailStr prüfen...) -> jsonable_encoder -> json.dumps
+#bei einer liste mit 10k usern kostet das über eine sekunde, obwohl wir die daten selber aus der db gebaut haben
+#
+#im schnellen modus:
+#  - ist FastJSONResponse (orjson) die default antwort-klasse der app
+#  - bauen die listen-routen einfache dicts und schreiben sie direkt mit einem vorher gebauten TypeAdapter
+#    als json raus, ohne validierung (die daten kommen aus unserer eigenen db, die sind schon geprüft)
+#die TypedDicts unten haben genau die felder von UserResponse/PostResponse, überzählige keys fallen beim dump weg
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class PostSimpleItem(TypedDict):
+    id: int
+    title: str
+    content: str
+
+class UserItem(TypedDict):
+    id: int
+    name: str
+    email: str
+    posts: List[PostSimpleItem]
+
+class PostItem(TypedDict):
+    id: int
+    title: str
+    content: str
+    user_id: int
+
+class UserPageDict(TypedDict):
+    items: List[UserItem]
+    next_cursor: Optional[str]
+
+class PostPageDict(TypedDict):
+    items: List[PostItem]
+    next_cursor: Optional[str]
+
+#einmal beim import bauen, das schema zu kompilieren ist der teure teil
+user_page_adapter = TypeAdapter(UserPageDict)
+post_page_adapter = TypeAdapter(PostPageDict)
+
+
+def user_item(user) -> dict:
+    #user kann ein User logik objekt oder ein UserModel sein, posts gibt es nicht immer (get_all_users lädt sie nicht)
+    return {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "posts": [{"id": p.id, "title": p.title, "content": p.content} for p in (getattr(user, "posts", None) or [])],
+    }
+
+
+def post_item(post) -> dict:
+    return {"id": post.id, "title": post.title, "content": post.content, "user_id": post.user_id}
+
+
+def user_page_response(users: list, next_cursor: str | None) -> Response:
+    page = {"items": [user_item(u) for u in users], "next_cursor": next_cursor}
+    return Response(user_page_adapter.dump_json(page), media_type="application/json")
+
+
+def post_page_response(posts: list, next_cursor: str | None) -> Response:
+    page = {"items": [post_item(p) for p in posts], "next_cursor": next_cursor}
+    return Response(post_page_adapter.dump_json(page), media_type="application/json")
+
+
+def dumps(content) -> bytes:
+    #für stellen die selber json bytes brauchen (z.b. der benchmark)
+    if orjson is None:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,148 @@
+from functools import lru_cache
+from typing import List, Optional
+
+from fastapi import HTTPException, Query
+from fastapi.responses import Response
+from pydantic import ConfigDict, create_model
+from sqlalchemy.orm import load_only, selectinload
+
+from models import UserModel, PostModel
+from schemas import UserResponse, PostResponse, PostSimpleResponse
+
+# ----------------------------------------------------
+# SPARSE FIELDSETS (?fields=id,name)
+# ----------------------------------------------------
+#UserResponse hat immer alle spalten und alle posts mit ganzem content. wer nur id und name braucht zahlt trotzdem alles:
+#sqlite liest die zeilen, das ORM baut die objekte und pydantic schreibt alles ins json
+#
+#mit ?fields=... sagt der client was er braucht:
+#  /users/users?fields=id,name                      nur diese spalten, posts gar nicht
+#  /users/users/1?fields=name,posts                 posts mit id, title, content
+#  /users/users/1?fields=name,posts.id,posts.title  posts ohne content
+#  /posts/users/1/posts?fields=id,title             kommt ganz aus dem index (user_id, id, title), die tabelle bleibt zu
+#im SQL stehen nur diese spalten (load_only, die id kommt immer mit). posts nur wenn sie gefragt sind und dann mit
+#selectinload: EIN "WHERE user_id IN (...)" für die ganze seite, joinedload würde die user-spalten pro post wiederholen.
+#das antwort-modell wird pro auswahl einmal aus UserResponse/PostResponse gebaut (create_model) und gemerkt.
+#ohne fields bleibt alles wie bisher
+
+USER_FIELDS = tuple(UserResponse.model_fields) #id, name, email, posts
+POST_FIELDS = tuple(PostResponse.model_fields) #id, title, content, user_id
+USER_POST_FIELDS = tuple(PostSimpleResponse.model_fields) #id, title, content (die posts in einem user)
+
+
+class FieldSelection:
+    def __init__(self, columns: tuple, posts: tuple = None):
+        self.columns = columns #spalten der entity selbst, in der reihenfolge des response models
+        self.posts = posts #None = ohne posts, sonst die felder der posts
+
+    @property
+    def key(self) -> tuple:
+        #gleiche auswahl, gleicher key (z.b. für single_flight.py)
+        return self.columns, self.posts
+
+    @property
+    def etag_variant(self) -> str:
+        #für den ETag (versioning.make_etag), ohne komma und anführungszeichen: "id.name+posts.id.title"
+        variant = ".".join(self.columns)
+        if self.posts is not None:
+            variant += "+" + ".".join(("posts",) + self.posts)
+        return variant
+
+
+def _parse(raw: str, allowed: tuple, nested: str = None) -> FieldSelection:
+    columns = set()
+    posts = None
+    unknown = []
+    for name in (part.strip() for part in raw.split(",")):
+        if not name:
+            continue
+        if nested is not None and (name == nested or name.startswith(nested + ".")):
+            sub = name[len(nested) + 1:]
+            posts = posts or set()
+            if not sub:
+                posts.update(USER_POST_FIELDS)
+            elif sub in USER_POST_FIELDS:
+                posts.add(sub)
+            else:
+                unknown.append(name)
+        elif name in allowed:
+            columns.add(name)
+        else:
+            unknown.append(name)
+    if unknown or not (columns or posts):
+        choices = list(allowed) + ([f"{nested}.{f}" for f in USER_POST_FIELDS] if nested else [])
+        raise HTTPException(
+            status_code=400,
+            detail=f"Ungültige fields: {', '.join(unknown) or raw!r}. Erlaubt: {', '.join(choices)}",
+        )
+    return FieldSelection(
+        tuple(f for f in allowed if f in columns),
+        None if posts is None else tuple(f for f in USER_POST_FIELDS if f in posts),
+    )
+
+
+#Dependencies für die Router: None heißt alle felder (wie ohne ?fields)
+def get_user_fields(fields: str | None = Query(None, description="Komma-Liste, z.B. id,name oder name,posts.title")):
+    return None if fields is None else _parse(fields, USER_FIELDS, nested="posts")
+
+
+def get_post_fields(fields: str | None = Query(None, description="Komma-Liste, z.B. id,title")):
+    return None if fields is None else _parse(fields, POST_FIELDS)
+
+
+# ----------------------------------------------------
+# SQL: NUR DIE GEFRAGTEN SPALTEN
+# ----------------------------------------------------
+#extra: spalten die der code selber braucht (z.b. version für den ETag), auch wenn sie nicht in der antwort stehen
+
+def user_options(selection: FieldSelection, *extra) -> list:
+    columns = [getattr(UserModel, name) for name in selection.columns if name != "id"]
+    options = [load_only(UserModel.id, *columns, *extra)]
+    if selection.posts is not None:
+        post_columns = [getattr(PostModel, name) for name in selection.posts if name != "id"]
+        options.append(selectinload(UserModel.posts).load_only(PostModel.id, *post_columns))
+    return options
+
+
+def post_options(selection: FieldSelection, *extra) -> list:
+    columns = [getattr(PostModel, name) for name in selection.columns if name != "id"]
+    return [load_only(PostModel.id, *columns, *extra)]
+
+
+# ----------------------------------------------------
+# ANTWORT-MODELLE
+# ----------------------------------------------------
+#es gibt nur 2^4 * 2^3 mögliche auswahlen, der cache bleibt also klein
+
+@lru_cache(maxsize=None)
+def _model(base, columns: tuple, posts: tuple = None):
+    definitions = {name: (base.model_fields[name].annotation, base.model_fields[name]) for name in columns}
+    suffix = list(columns)
+    if posts is not None:
+        definitions["posts"] = (List[_model(PostSimpleResponse, posts)], [])
+        suffix.append("posts_" + "_".join(posts))
+    return create_model(f"{base.__name__}_{'_'.join(suffix)}", __config__=ConfigDict(from_attributes=True), **definitions)
+
+
+@lru_cache(maxsize=None)
+def _page_model(item_model):
+    return create_model(f"{item_model.__name__}Page", items=(List[item_model], ...), next_cursor=(Optional[str], None))
+
+
+def user_model(selection: FieldSelection):
+    return _model(UserResponse, selection.columns, selection.posts)
+
+
+def post_model(selection: FieldSelection):
+    return _model(PostResponse, selection.columns)
+
+
+#die routen geben die Response direkt zurück, das response_model der route (für /docs) wird dann übersprungen
+
+def item_response(model, obj, headers: dict = None) -> Response:
+    return Response(model.model_validate(obj).model_dump_json(), media_type="application/json", headers=headers)
+
+
+def page_response(model, items: list, next_cursor: str | None) -> Response:
+    page = _page_model(model).model_validate({"items": items, "next_cursor": next_cursor}, from_attributes=True)
+    return Response(page.model_dump_json(), media_type="application/json")
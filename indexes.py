@@ -0,0 +1,48 @@
+from sqlalchemy import inspect
+
+from datenbase import Base
+
+# ----------------------------------------------------
+# INDEX-VERWALTUNG
+# ----------------------------------------------------
+#die indizes stehen in models.py (__table_args__ / index=True), angelegt werden sie von einer migration (migrations.py).
+#missing_indexes vergleicht die deklarierten indizes mit denen in der datei, so fällt auf wenn zu einem neuen index in
+#models.py die migration fehlt (query_plans.py prüft das). ensure_indexes legt fehlende von hand an, danach sammelt
+#ANALYZE statistiken damit der query planner sie auch wählt
+
+
+def declared_indexes():
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            yield table.name, index
+
+
+def missing_indexes(engine):
+    inspector = inspect(engine)
+    existing = {}
+    for table_name in inspector.get_table_names():
+        existing[table_name] = {ix["name"] for ix in inspector.get_indexes(table_name)}
+    return [
+        index for table_name, index in declared_indexes()
+        if index.name not in existing.get(table_name, set())
+    ]
+
+
+def ensure_indexes(engine):
+    created = []
+    with engine.begin() as conn:
+        for index in missing_indexes(engine):
+            index.create(bind=conn, checkfirst=True)
+            created.append(index.name)
+        if created:
+            conn.exec_driver_sql("ANALYZE")
+    return created
+
+
+# CLI: python indexes.py  -> zeigt fehlende indizes und legt sie an
+if __name__ == "__main__":
+    import models  # noqa: F401  (registriert die tabellen an Base)
+    from datenbase import engine
+
+    names = ensure_indexes(engine)
+    print("Angelegt:", ", ".join(names) if names else "nichts, alle indizes sind schon da")
@@ -1,23 +1,126 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError
+import config
 import models
-from datenbase import engine, Base
-import routers.users as users
-import routers.posts as posts
+from datenbase import engine, wal_checkpointer
+from write_queue import writer
+import routers.export as export
+import routers.search as search_router
+import routers.stats as stats_router
+import routers.cache_stats as cache_stats
+import routers.metrics as metrics_router
+import migrations
+from fast_json import FastJSONResponse
+import sql_profiler
+import metrics
+import single_flight
+import admission
+import purge
+import sharding
+from sharding import shard_map
+import memory_store
 
-# 1. Tabellen in der DB erstellen
-Base.metadata.create_all(bind=engine)
+if config.USE_ASYNC_DB and shard_map is not None:
+    raise RuntimeError("SHARDS geht bisher nur mit den sync routen (USE_ASYNC_DB=0)")
+if memory_store.store is not None and (config.USE_ASYNC_DB or shard_map is not None or config.WORKERS > 1):
+    raise RuntimeError("MEMORY_STORE geht nur mit einem prozess (WORKERS=1), den sync routen und ohne SHARDS")
+if config.USE_ASYNC_DB:
+    import routers.users_async as users
+    import routers.posts_async as posts
+else:
+    import routers.users as users
+    import routers.posts as posts
+
+# 1. Schema prüfen: liest nur die version aus schema_version, migriert nur wenn die db älter ist (siehe migrations.py)
+pending_backfills = migrations.startup(engine)
+backfill_runner = migrations.BackfillRunner(engine, config.MIGRATION_BATCH_PAUSE_MS / 1000)
+#DELETE /users/{id} von users mit vielen posts: stückweise im hintergrund (purge.py). mit SHARDS hat jeder shard seinen
+#eigenen runner (sharding.py), mit MEMORY_STORE wird immer sofort gelöscht
+purge_runner = purge.PurgeRunner(engine, config.PURGE_BATCH_SIZE, config.PURGE_PAUSE_MS / 1000)
+if shard_map is not None:
+    sharding.startup(shard_map, engine) #SHARDS: global.db prüfen und jeden shard migrieren (siehe sharding.py)
+if memory_store.store is not None:
+    memory_store.store.load(engine) #MEMORY_STORE: log nachholen und alles aus sqlite in den speicher (siehe memory_store.py)
+
+# Start/Stop: der WAL checkpoint thread läuft so lange wie die app, der group-commit writer startet beim ersten schreiben
+#und offene batch-arbeit aus migrationen läuft im hintergrund weiter
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    wal_checkpointer.start()
+    if pending_backfills:
+        backfill_runner.start() #große umschreibungen laufen stückweise weiter während die app schon antwortet
+    if shard_map is not None:
+        shard_map.start() #checkpoints und batch-arbeit pro shard
+    if memory_store.store is not None:
+        memory_store.store.start()
+    elif shard_map is None:
+        purge_runner.start() #offene löschaufträge von vor dem neustart gehen gleich weiter
+    yield
+    purge_runner.stop()
+    if memory_store.store is not None:
+        memory_store.store.stop() #schreibt den rest aus dem log nach sqlite
+    if shard_map is not None:
+        shard_map.stop()
+    backfill_runner.stop()
+    writer.stop() #schreibt noch alles aus der queue weg
+    wal_checkpointer.stop()
 
 # 2. Die App Instanz
-app = FastAPI(title="Mein modulares Programm")
-import schemas
-print("In schemas gefunden:", dir(schemas))
+#FAST_RESPONSES: orjson statt dem normalen json encoder für alle antworten (siehe fast_json.py)
+app_options = {"default_response_class": FastJSONResponse} if config.FAST_RESPONSES else {}
+app = FastAPI(title="Mein modulares Programm", lifespan=lifespan, **app_options)
+# SQL_PROFILER: statements/zeit/zeilen pro request als header, warnungen bei N+1 und zu vielen statements
+if config.SQL_PROFILER:
+    sql_profiler.install(engine)
+    if config.USE_ASYNC_DB:
+        from datenbase_async import async_engine
+        sql_profiler.install(async_engine.sync_engine)
+    for shard_engine in shard_map.engines if shard_map is not None else []:
+        sql_profiler.install(shard_engine)
+    app.add_middleware(sql_profiler.SQLProfilerMiddleware)
+
+# SINGLE_FLIGHT: gleichzeitige gleiche GETs teilen sich eine abfrage, jedes schreiben startet eine neue generation
+if config.SINGLE_FLIGHT:
+    app.add_middleware(single_flight.SingleFlightMiddleware)
+
+# ADMISSION_CONTROL: begrenzte plätze und warteschlangen pro routen-gruppe, überlast bekommt sofort 429/503
+if admission.controller is not None:
+    app.add_middleware(admission.AdmissionMiddleware, controller=admission.controller)
+
+# METRICS_ENABLED: latenz/zähler pro route, pool zustand und sqlite sperren unter GET /metrics
+if config.METRICS_ENABLED:
+    metrics.watch_pool("main", engine)
+    if config.USE_ASYNC_DB:
+        from datenbase_async import async_engine
+        metrics.watch_pool("async", async_engine)
+    for index, shard_engine in enumerate(shard_map.engines if shard_map is not None else []):
+        metrics.watch_pool(f"shard{index}", shard_engine)
+    metrics.watch_sqlite_locks()
+    app.add_middleware(metrics.MetricsMiddleware) #als letztes hinzugefügt = ganz außen, misst also auch den profiler mit
+    app.include_router(metrics_router.router)
+
 # 3. Die Router einbinden
 app.include_router(users.router)
 app.include_router(posts.router)
+app.include_router(export.router)
+app.include_router(search_router.router)
+app.include_router(stats_router.router)
+app.include_router(cache_stats.router)
 
 
 # Optional: Der Global Exception Handler (den wir aus dem Router entfernt haben)
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     print(f"KRITISCHER FEHLER: {exc}")
-    return {"message": "Fehler im System!"}
\ No newline at end of file
+    return JSONResponse(status_code=500, content={"message": "Fehler im System!"})
+
+
+#busy_timeout abgelaufen: kein fehler im system, nur zu viel los. der client soll es gleich nochmal versuchen
+@app.exception_handler(OperationalError)
+async def sqlite_busy_handler(request, exc):
+    if not admission.is_lock_error(exc):
+        return await global_exception_handler(request, exc)
+    return JSONResponse(status_code=503, content={"detail": "Datenbank ausgelastet, bitte gleich nochmal versuchen."},
+                        headers={"Retry-After": "1"})
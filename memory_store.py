@@ -0,0 +1,698 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import Future
+
+from sqlalchemy.exc import IntegrityError
+
+import config
+from content_codec import content_columns, decode
+from datenbase import DATABASE_URL
+from fast_json import dumps
+from models import User
+import purge
+from versioning import VersionMismatch
+from write_queue import _create_writer_engine
+
+try:
+    import fcntl #nur unix: sperrt das log, damit nicht zwei prozesse den gleichen store haben
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------
+# USERS UND POSTS IM SPEICHER, SQLITE DAHINTER (MEMORY_STORE=1)
+# ----------------------------------------------------
+#ein GET /users/{id} kostet mit sqlite: verbindung aus dem pool, SELECT mit join, ORM objekte bauen, kopie für den cache.
+#hier liegt alles als kleine __slots__ objekte in dicts, lesen ist ein dict zugriff. die indizes:
+#  users       id -> UserRecord            posts       id -> PostRecord
+#  user_ids    sortierte liste der ids      emails      email -> id (die unique prüfung)
+#  user_posts  user_id -> sortierte liste seiner post ids
+#die records werden nie geändert, ein update legt einen neuen an. wer einen record hat, hat also einen festen stand
+#
+#schreiben (write-behind): die änderung wird im speicher geprüft und gemacht, bekommt eine laufende nummer und geht als
+#json zeile in ein append-only log. der log-thread sammelt ein paar ms lang, schreibt die zeilen, macht EIN fsync und
+#gibt dann alle wartenden requests frei. erst danach schreibt er die gruppe in einer transaktion nach sqlite, zusammen
+#mit der nummer bis zu der sqlite jetzt aktuell ist (tabelle write_behind, migration 5).
+#beim start wird nachgeholt was im log steht aber noch nicht in sqlite, dann wird alles aus sqlite geladen
+#
+#grenzen: die daten gehören EINEM prozess (mehrere worker hätten jeder eine eigene kopie, main.py lässt das nicht zu),
+#alles muss in den RAM passen, suche und export lesen sqlite und hängen ein paar ms hinterher.
+#eine änderung ist für andere requests sichtbar sobald sie im speicher ist, also schon kurz bevor das fsync durch ist
+
+SCAN_CHUNK = 1000 #so viele users pro lock beim durchsuchen nach namen, dazwischen kommen die schreiber dran
+RECOVERY_BATCH = 1000 #log zeilen pro transaktion beim nachholen
+RETRY_DELAY = 1.0 #sekunden bis ein fehlgeschlagenes schreiben nach sqlite nochmal versucht wird
+
+_STOP = object()
+
+
+class UserRecord:
+    __slots__ = ("id", "name", "email", "version")
+
+    def __init__(self, id: int, name: str, email: str, version: int = 1):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.version = version
+
+
+class PostRecord:
+    __slots__ = ("id", "title", "content", "user_id", "version")
+
+    def __init__(self, id: int, title: str, content: str, user_id: int, version: int = 1):
+        self.id = id
+        self.title = title
+        self.content = content
+        self.user_id = user_id
+        self.version = version
+
+
+class EmailTaken(Exception):
+    pass
+
+
+# ----------------------------------------------------
+# LOG ZEILEN NACH SQLITE
+# ----------------------------------------------------
+#jede zeile hat die fertigen werte (ids, versionen), sqlite rechnet nichts mehr selber aus
+
+def _packed(content) -> tuple:
+    #(content, search_text, content_bytes) wie in repositories._post_row
+    values = content_columns(content)
+    return values["content"], values["search_text"], values["content_bytes"]
+
+
+def _apply(conn, record: dict):
+    op = record["op"]
+    if op == "insert_users":
+        conn.exec_driver_sql("INSERT INTO users (id, name, email, version) VALUES (?, ?, ?, ?)",
+                             [tuple(row) for row in record["rows"]])
+    elif op == "update_user":
+        user_id, name, email, version = record["row"]
+        conn.exec_driver_sql("UPDATE users SET name = ?, email = ?, version = ? WHERE id = ?", (name, email, version, user_id))
+    elif op == "delete_user":
+        #posts zuerst, wie repositories._delete_user. die meisten hat WriteBehindLog._delete_posts_in_chunks schon vorher
+        #stückweise gelöscht, hier kommt nur noch der rest (höchstens PURGE_BATCH_SIZE plus die aus dieser gruppe)
+        conn.exec_driver_sql("DELETE FROM posts WHERE user_id = ?", (record["id"],))
+        conn.exec_driver_sql("DELETE FROM users WHERE id = ?", (record["id"],))
+    elif op == "insert_posts":
+        #rohes SQL geht am CompressedText typ vorbei, also hier selber komprimieren (im speicher bleibt der text)
+        conn.exec_driver_sql(
+            "INSERT INTO posts (id, title, content, search_text, content_bytes, user_id, version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(post_id, title, *_packed(content), user_id, version) for post_id, title, content, user_id, version in record["rows"]],
+        )
+    elif op == "update_post":
+        post_id, title, content, version = record["row"]
+        conn.exec_driver_sql("UPDATE posts SET title = ?, content = ?, search_text = ?, content_bytes = ?, version = ? WHERE id = ?",
+                             (title, *_packed(content), version, post_id))
+    elif op == "delete_post":
+        conn.exec_driver_sql("DELETE FROM posts WHERE id = ?", (record["id"],))
+    else:
+        raise ValueError(f"Unbekannte operation im log: {op}")
+    #die triggers auf posts haben die user-versionen gerade selber hochgezählt, der genaue stand kommt aus dem speicher
+    if record.get("authors"):
+        conn.exec_driver_sql("UPDATE users SET version = ? WHERE id = ?", [(version, user_id) for user_id, version in record["authors"]])
+
+
+class ApplyConflict(RuntimeError):
+    #eine log zeile passt nicht zu sqlite (IntegrityError). sie wird nicht übersprungen, sonst stünde applied_seq hinter
+    #einer änderung die nie in sqlite angekommen ist und der store hätte nach dem nächsten start einen anderen stand
+    pass
+
+
+class WriteBehindLog:
+    def __init__(self, path: str, url: str = DATABASE_URL, fsync: bool = True, max_batch: int = 256,
+                 max_delay: float = 0.002, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.url = url
+        self.fsync = fsync
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_bytes = max_bytes
+        self.next_seq = 1
+        self.applied_seq = 0 #bis hier steht alles in sqlite
+        self.batches = 0
+        self.failed = None #exception, wenn das log nicht mehr geschrieben oder nach sqlite übertragen werden konnte
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._engine = None
+        self._unapplied = [] #schon im log, noch nicht in sqlite
+
+    # --- start: nachholen was fehlt ---
+
+    def open(self):
+        self._engine = _create_writer_engine(self.url)
+        self._file = open(self.path, "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise RuntimeError(f"{self.path} wird schon von einem anderen prozess benutzt (MEMORY_STORE geht nur mit einem)")
+        with self._engine.begin() as conn:
+            self.applied_seq = conn.exec_driver_sql("SELECT applied_seq FROM write_behind WHERE id = 1").scalar()
+        missing = [record for record in self._read() if record["seq"] > self.applied_seq]
+        for start in range(0, len(missing), RECOVERY_BATCH):
+            #ApplyConflict geht bis zum start durch: das log bleibt wie es ist, bis jemand die zeile in sqlite oder
+            #im log repariert hat. alles davor ist schon übertragen und wird beim nächsten versuch übersprungen
+            self._apply(missing[start:start + RECOVERY_BATCH])
+        if missing:
+            logger.info("Write-behind: %d änderungen aus %s nach sqlite nachgeholt", len(missing), self.path)
+        self._file.truncate(0)
+        self.next_seq = self.applied_seq + 1
+
+    def _read(self) -> list:
+        self._file.seek(0)
+        lines = self._file.read().split(b"\n")
+        records = []
+        for number, line in enumerate(lines, start=1):
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                if number == len(lines): #letzte zeile halb geschrieben (absturz mitten im write), die war noch nicht bestätigt
+                    logger.warning("Write-behind: unvollständige letzte zeile in %s ignoriert", self.path)
+                    break
+                raise RuntimeError(f"{self.path} ist in zeile {number} kaputt")
+        return records
+
+    # --- für den store ---
+
+    def append(self, record: dict) -> Future:
+        #vom store unter seinem lock aufgerufen, so ist die reihenfolge im log die gleiche wie im speicher
+        if self.failed is not None:
+            raise RuntimeError(f"Write-behind log ist ausgefallen ({self.failed}), änderungen sind nicht mehr möglich")
+        self.start()
+        record["seq"] = self.next_seq
+        self.next_seq += 1
+        future = Future()
+        self._queue.put((future, record))
+        return future
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        #alles aus der queue ins log und nach sqlite, das log ist danach leer
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        if self._engine is not None:
+            self._engine.dispose()
+        if self._file is not None:
+            self._file.close() #gibt auch die sperre frei
+            self._file = None
+
+    def after_fork(self):
+        #serve.py: der store wird im elternprozess geladen, die verbindung des writers gehört aber dem elternprozess
+        if self._engine is not None:
+            self._engine.dispose(close=False)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {"seq": self.next_seq - 1, "applied_seq": self.applied_seq, "batches": self.batches,
+                "log_bytes": os.path.getsize(self.path) if self._file is not None else 0}
+
+    # --- der log-thread ---
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=RETRY_DELAY if self._unapplied and self.failed is None else None)
+            except queue.Empty:
+                self._flush()
+                continue
+            if first is _STOP:
+                self._flush()
+                return
+            batch, stopping = self._collect(first)
+            self._write(batch)
+            self._flush()
+            if stopping:
+                return
+
+    def _write(self, batch):
+        data = b"".join(dumps(record) + b"\n" for _, record in batch)
+        try:
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except Exception as exc: #platte voll o.ä.: im speicher ist die änderung schon, also ab hier keine schreib-ops mehr
+            logger.exception("Write-behind log %s konnte nicht geschrieben werden", self.path)
+            self.failed = exc
+            for future, _ in batch:
+                future.set_exception(exc)
+            return
+        self.batches += 1
+        self._unapplied.extend(record for _, record in batch)
+        for future, record in batch:
+            future.set_result(record["seq"])
+
+    def _flush(self):
+        if not self._unapplied or self.failed is not None:
+            return
+        try:
+            self._apply(self._unapplied)
+        except ApplyConflict as exc:
+            #ein neuer versuch scheitert genauso. ab hier keine schreib-ops mehr, die zeile und alles danach bleibt im
+            #log und wird beim nächsten start wieder versucht (und hält dann den start auf, siehe open)
+            logger.error("Write-behind: %s, keine änderungen mehr bis zum neustart", exc)
+            self.failed = exc
+            self._unapplied = [record for record in self._unapplied if record["seq"] > self.applied_seq]
+            return
+        except Exception: #z.b. "database is locked": steht sicher im log, wird in RETRY_DELAY nochmal versucht
+            logger.exception("Write-behind: schreiben nach sqlite fehlgeschlagen, neuer versuch in %ss", RETRY_DELAY)
+            return
+        self._unapplied = []
+        if self._file.tell() > self.max_bytes: #alles im log steht jetzt in sqlite
+            self._file.truncate(0)
+
+    def _delete_posts_in_chunks(self, user_id: int):
+        #ein user mit 100.000 posts in EINER transaktion hielte die schreibsperre so lange fest (import status,
+        #backfills, checkpoints warten). also wie purge.py: PURGE_BATCH_SIZE posts pro transaktion, pause dazwischen.
+        #geht, weil die delete_user zeile schon sicher im log steht: der user ist im speicher weg, bricht es mittendrin
+        #ab wird sie beim nächsten versuch (oder start) einfach nochmal ausgeführt
+        while True:
+            with self._engine.begin() as conn:
+                deleted = purge.delete_posts(conn, user_id, config.PURGE_BATCH_SIZE)
+            if deleted < config.PURGE_BATCH_SIZE:
+                return
+            time.sleep(config.PURGE_PAUSE_MS / 1000)
+
+    def _apply(self, records: list):
+        for record in records:
+            if record["op"] == "delete_user" and record["seq"] > self.applied_seq:
+                self._delete_posts_in_chunks(record["id"])
+        applied, conflict = None, None
+        with self._engine.begin() as conn:
+            for record in records:
+                if record["seq"] <= self.applied_seq: #schon drin (z.b. teil vor einem konflikt)
+                    continue
+                try:
+                    with conn.begin_nested(): #SAVEPOINT: was vor der kaputten zeile kam wird trotzdem committed
+                        _apply(conn, record)
+                except IntegrityError as exc:
+                    conflict = ApplyConflict(f"{record['op']} (nr. {record['seq']}) passt nicht zu sqlite: {exc.orig}")
+                    break
+                applied = record["seq"]
+            if applied is not None:
+                conn.exec_driver_sql("UPDATE write_behind SET applied_seq = ? WHERE id = 1", (applied,))
+        if applied is not None:
+            self.applied_seq = applied
+        if conflict is not None:
+            raise conflict
+
+
+# ----------------------------------------------------
+# DER STORE
+# ----------------------------------------------------
+class MemoryStore:
+    def __init__(self, log: WriteBehindLog):
+        self.log = log
+        self.users = {}
+        self.posts = {}
+        self.user_ids = []
+        self.emails = {}
+        self.user_posts = {}
+        self.next_user_id = 1
+        self.next_post_id = 1
+        self._lock = threading.Lock() #für alles was mehr als einen index anfasst, einzelne dict zugriffe brauchen ihn nicht
+
+    def load(self, engine):
+        #einmal beim start (main.py), nach den migrationen
+        self.log.open()
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            for user_id, name, email, version in conn.exec_driver_sql("SELECT id, name, email, version FROM users ORDER BY id"):
+                self.users[user_id] = UserRecord(user_id, name, email, version)
+                self.emails[email] = user_id
+            for post_id, title, content, user_id, version in conn.exec_driver_sql(
+                "SELECT id, title, content, user_id, version FROM posts ORDER BY id"
+            ):
+                post = PostRecord(post_id, title, decode(content), user_id, version)
+                self.posts[post.id] = post
+                self.user_posts.setdefault(post.user_id, []).append(post.id)
+            #höchste je vergebene ids (AUTOINCREMENT, migration 11), auch wenn die zeilen inzwischen gelöscht sind.
+            #sonst bekäme der nächste neue user die id des zuletzt gelöschten und damit dessen alte ETags
+            issued = dict(conn.exec_driver_sql("SELECT name, seq FROM sqlite_sequence WHERE name IN ('users', 'posts')").all())
+        self.user_ids = list(self.users) #die dicts haben die reihenfolge aus dem ORDER BY
+        self.next_user_id = max(self.user_ids[-1] if self.user_ids else 0, issued.get("users", 0)) + 1
+        self.next_post_id = max(next(reversed(self.posts)) if self.posts else 0, issued.get("posts", 0)) + 1
+        logger.info("Memory store: %d users und %d posts in %.1fs geladen",
+                    len(self.users), len(self.posts), time.perf_counter() - start)
+
+    def start(self):
+        self.log.start()
+
+    def stop(self):
+        self.log.close()
+
+    # --- lesen ---
+
+    def get_user(self, user_id: int):
+        #(UserRecord, [PostRecord]) oder None
+        with self._lock:
+            user = self.users.get(user_id)
+            if user is None:
+                return None
+            return user, [self.posts[post_id] for post_id in self.user_posts.get(user_id, ())]
+
+    def list_users(self, name_filter: str = None, limit: int = None, after_id: int = None) -> list:
+        #keyset wie in der db, mit filter stückweise durch user_ids damit der lock nie lange gehalten wird
+        needle = name_filter.casefold() if name_filter else None
+        found = []
+        while limit is None or len(found) < limit:
+            with self._lock:
+                start = bisect_right(self.user_ids, after_id) if after_id is not None else 0
+                stop = start + (SCAN_CHUNK if needle or limit is None else limit - len(found))
+                chunk = [self.users[user_id] for user_id in self.user_ids[start:stop]]
+            if not chunk:
+                break
+            found += [user for user in chunk if needle in user.name.casefold()] if needle else chunk
+            after_id = chunk[-1].id
+        return found if limit is None else found[:limit]
+
+    def list_posts(self, user_id: int, limit: int = None, after_id: int = None) -> list:
+        with self._lock:
+            post_ids = self.user_posts.get(user_id, ())
+            start = bisect_right(post_ids, after_id) if after_id is not None else 0
+            stop = None if limit is None else start + limit
+            return [self.posts[post_id] for post_id in post_ids[start:stop]]
+
+    # --- schreiben ---
+    #unter dem lock: prüfen, speicher ändern, log zeile anstellen. gewartet wird auf das fsync erst nach dem lock
+
+    def insert_users(self, rows: list) -> list:
+        #rows: (name, email, id oder None). gibt pro zeile die id zurück, None wenn email oder id schon vergeben sind
+        ids = []
+        new = []
+        with self._lock:
+            for name, email, user_id in rows:
+                if email in self.emails or (user_id is not None and user_id in self.users):
+                    ids.append(None)
+                    continue
+                if user_id is None:
+                    user_id = self.next_user_id
+                self.next_user_id = max(self.next_user_id, user_id + 1)
+                user = UserRecord(user_id, name, email)
+                self.users[user_id] = user
+                self.emails[email] = user_id
+                if self.user_ids and user_id < self.user_ids[-1]:
+                    insort(self.user_ids, user_id)
+                else:
+                    self.user_ids.append(user_id)
+                new.append(user)
+                ids.append(user_id)
+            if not new:
+                return ids
+            future = self.log.append({"op": "insert_users", "rows": [[u.id, u.name, u.email, u.version] for u in new]})
+        future.result()
+        return ids
+
+    def update_user(self, user_id: int, name: str, email: str, versions=None):
+        #neue version, None = user gibt es nicht. VersionMismatch / EmailTaken wie in der db
+        with self._lock:
+            old = self.users.get(user_id)
+            if old is None:
+                return None
+            if versions is not None and old.version not in versions:
+                raise VersionMismatch(f"users {user_id} hat eine andere Version")
+            if self.emails.get(email, user_id) != user_id:
+                raise EmailTaken(email)
+            user = self.users[user_id] = UserRecord(user_id, name, email, old.version + 1)
+            if email != old.email:
+                del self.emails[old.email]
+                self.emails[email] = user_id
+            future = self.log.append({"op": "update_user", "row": [user_id, name, email, user.version]})
+        future.result()
+        return user.version
+
+    def delete_user(self, user_id: int):
+        #anzahl der mitgelöschten posts, None = user gibt es nicht. im speicher ist er sofort weg, einen löschauftrag
+        #wie mit sqlite (purge.py) braucht es nicht. in sqlite löscht der log-thread die posts dann stückweise
+        with self._lock:
+            old = self.users.pop(user_id, None)
+            if old is None:
+                return None
+            del self.emails[old.email]
+            del self.user_ids[bisect_left(self.user_ids, user_id)]
+            post_ids = self.user_posts.pop(user_id, [])
+            for post_id in post_ids:
+                del self.posts[post_id]
+            future = self.log.append({"op": "delete_user", "id": user_id})
+        future.result()
+        return len(post_ids)
+
+    def _bump_author(self, user_id: int, authors: dict):
+        #wie die triggers auf posts: jede änderung an einem post gibt seinem user eine neue version
+        user = self.users.get(user_id)
+        if user is not None:
+            self.users[user_id] = UserRecord(user.id, user.name, user.email, user.version + 1)
+            authors[user_id] = user.version + 1
+
+    def insert_posts(self, rows: list) -> list:
+        #rows: (title, content, user_id, id oder None). die user_ids prüft der aufrufer vorher, hier nur noch einmal
+        #unter dem lock (der user könnte inzwischen gelöscht sein, in sqlite würde der foreign key den post ablehnen)
+        with self._lock:
+            if any(post_id is not None and post_id in self.posts for _, _, _, post_id in rows):
+                raise ValueError("Post id schon vergeben")
+            if any(user_id not in self.users for _, _, user_id, _ in rows):
+                raise ValueError("User gibt es nicht")
+            new = []
+            authors = {}
+            for title, content, user_id, post_id in rows:
+                if post_id is None:
+                    post_id = self.next_post_id
+                self.next_post_id = max(self.next_post_id, post_id + 1)
+                post = self.posts[post_id] = PostRecord(post_id, title, content, user_id)
+                post_ids = self.user_posts.setdefault(user_id, [])
+                if post_ids and post_id < post_ids[-1]:
+                    insort(post_ids, post_id)
+                else:
+                    post_ids.append(post_id)
+                self._bump_author(user_id, authors)
+                new.append(post)
+            if not new:
+                return []
+            future = self.log.append({
+                "op": "insert_posts",
+                "rows": [[p.id, p.title, p.content, p.user_id, p.version] for p in new],
+                "authors": list(authors.items()),
+            })
+        future.result()
+        return [post.id for post in new]
+
+    def update_post(self, post_id: int, title: str, content: str, versions=None):
+        #(user_id, neue version), None = post gibt es nicht
+        with self._lock:
+            old = self.posts.get(post_id)
+            if old is None:
+                return None
+            if versions is not None and old.version not in versions:
+                raise VersionMismatch(f"posts {post_id} hat eine andere Version")
+            post = self.posts[post_id] = PostRecord(post_id, title, content, old.user_id, old.version + 1)
+            authors = {}
+            self._bump_author(old.user_id, authors)
+            future = self.log.append({"op": "update_post", "row": [post_id, title, content, post.version],
+                                      "authors": list(authors.items())})
+        future.result()
+        return post.user_id, post.version
+
+    def delete_post(self, post_id: int):
+        #user_id des autors, None = post gibt es nicht
+        with self._lock:
+            old = self.posts.pop(post_id, None)
+            if old is None:
+                return None
+            post_ids = self.user_posts[old.user_id]
+            del post_ids[bisect_left(post_ids, post_id)]
+            authors = {}
+            self._bump_author(old.user_id, authors)
+            future = self.log.append({"op": "delete_post", "id": post_id, "authors": list(authors.items())})
+        future.result()
+        return old.user_id
+
+
+# ----------------------------------------------------
+# REPOSITORIES (gleiche methoden wie in repositories.py)
+# ----------------------------------------------------
+#die routen bekommen records statt ORM objekten, die haben die gleichen attribute (id, name, ..., version).
+#fields (?fields=...) wird hier nicht gebraucht, es ist eh alles im speicher, weggelassen wird erst im json (fields.py)
+
+def _user_with_posts(user: UserRecord, posts: list) -> User:
+    result = User(name=user.name, email=user.email, user_id=user.id, version=user.version)
+    result.posts = posts
+    return result
+
+
+class MemoryUserRepository:
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def close(self):
+        pass
+
+    def save_user(self, user_obj: User):
+        user_id, = self.store.insert_users([(user_obj.name, user_obj.email, user_obj.id)])
+        if user_id is None: #email schon vergeben
+            return None
+        user_obj.id = user_id
+        user_obj.version = 1
+        return user_obj
+
+    def save_users_bulk(self, user_objs: list, chunk_size: int = 500):
+        created = []
+        conflicts = []
+        for start in range(0, len(user_objs), chunk_size): #eine log zeile pro chunk
+            chunk = user_objs[start:start + chunk_size]
+            ids = self.store.insert_users([(u.name, u.email, u.id) for u in chunk])
+            for index, (user_obj, user_id) in enumerate(zip(chunk, ids), start=start):
+                if user_id is None:
+                    conflicts.append((index, user_obj.email))
+                else:
+                    user_obj.id = user_id
+                    created.append((index, user_obj))
+        return created, conflicts
+
+    def get_all_users(self, name_filter=None, limit: int = None, after_id: int = None, fields=None):
+        users = self.store.list_users(name_filter, limit, after_id)
+        if fields is not None and fields.posts is not None: #?fields=...,posts: die liste mit posts
+            found = (self.store.get_user(user.id) for user in users)
+            return [_user_with_posts(*user_and_posts) for user_and_posts in found if user_and_posts is not None]
+        return users
+
+    def get_user_by_id(self, user_id: int, fields=None):
+        found = self.store.get_user(user_id)
+        return None if found is None else _user_with_posts(*found)
+
+    def get_existing_user_ids(self, user_ids) -> set:
+        users = self.store.users
+        return {user_id for user_id in set(user_ids) if user_id in users}
+
+    def update_user(self, user_obj, expected_versions=None):
+        try:
+            new_version = self.store.update_user(user_obj.id, user_obj.name, user_obj.email, expected_versions)
+        except EmailTaken:
+            return None
+        if new_version is None:
+            return None
+        user_obj.version = new_version
+        return user_obj
+
+    def get_user_version(self, user_id: int):
+        user = self.store.users.get(user_id)
+        return None if user is None else user.version
+
+    def user_exists(self, user_id: int) -> bool:
+        return user_id in self.store.users
+
+    def delete_user(self, user_id):
+        posts_deleted = self.store.delete_user(user_id)
+        return None if posts_deleted is None else purge.deleted_status(user_id, posts_deleted)
+
+    def get_purge_status(self, user_id: int):
+        return None #gelöscht wird immer sofort
+
+
+class MemoryPostRepository:
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def close(self):
+        pass
+
+    def save_post(self, post_obj):
+        try:
+            post_obj.id, = self.store.insert_posts([(post_obj.title, post_obj.content, post_obj.user_id, post_obj.id)])
+        except ValueError:
+            return None
+        post_obj.version = 1
+        return post_obj
+
+    def save_posts_bulk(self, post_objs: list) -> int:
+        if not post_objs:
+            return 0
+        ids = self.store.insert_posts([(p.title, p.content, p.user_id, p.id) for p in post_objs])
+        for post_obj, post_id in zip(post_objs, ids):
+            post_obj.id = post_id
+        return len(ids)
+
+    def get_post_by_id(self, post_id: int, fields=None):
+        return self.store.posts.get(post_id)
+
+    def get_posts_by_user_id(self, user_id: int, limit: int = None, after_id: int = None, fields=None):
+        return self.store.list_posts(user_id, limit, after_id)
+
+    def update_post(self, post_obj, expected_versions=None):
+        result = self.store.update_post(post_obj.id, post_obj.title, post_obj.content, expected_versions)
+        if result is None:
+            return None
+        _, post_obj.version = result
+        return post_obj
+
+    def get_post_version(self, post_id: int):
+        post = self.store.posts.get(post_id)
+        return None if post is None else post.version
+
+    def delete_post(self, post_id: int):
+        return self.store.delete_post(post_id) is not None
+
+    def get_all_users_with_posts(self):
+        found = (self.store.get_user(user.id) for user in self.store.list_users())
+        return [_user_with_posts(*user_and_posts) for user_and_posts in found if user_and_posts is not None]
+
+
+store = None
+if config.MEMORY_STORE:
+    store = MemoryStore(WriteBehindLog(
+        config.MEMORY_STORE_LOG, fsync=config.MEMORY_STORE_FSYNC, max_batch=config.MEMORY_STORE_MAX_BATCH,
+        max_delay=config.MEMORY_STORE_MAX_DELAY_MS / 1000, max_bytes=config.MEMORY_STORE_LOG_MAX_BYTES,
+    ))
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=store.log.after_fork)
+
+
+#dependencies für die router (statt UserRepository/PostRepository mit session)
+def get_user_repo():
+    return MemoryUserRepository(store)
+
+
+def get_post_repo():
+    return MemoryPostRepository(store)
@@ -0,0 +1,265 @@
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+
+import config
+from single_flight import flights
+import admission
+
+# ----------------------------------------------------
+# METRIKEN IM PROMETHEUS TEXTFORMAT (GET /metrics)
+# ----------------------------------------------------
+#ohne extra abhängigkeit (prometheus_client), das textformat ist simpel genug:
+#  http_request_duration_seconds  histogramm pro methode + route (die route-vorlage wie /users/users/{user_id}, nicht die echte url)
+#  http_requests_total            zähler pro methode + route + status code
+#  http_request_exceptions_total  requests die mit einer exception statt einer antwort geendet haben
+#  http_requests_in_flight        wie viele requests gerade laufen
+#  admission_*                    plätze, warteschlange und abgewiesene requests pro routen-gruppe (admission.py)
+#  single_flight_*                wie viele GETs selber gerechnet (leader) oder ein ergebnis mitbenutzt haben (follower)
+#  db_pool_*                      zustand des connection pools (ausgeliehen, overflow, wartezeit beim ausleihen)
+#  sqlite_lock_*                  "database is locked" fehler und schreibvorgänge die auf die sperre gewartet haben
+#
+#die middleware läuft bei jedem request, deshalb macht sie so wenig wie möglich: zwei perf_counter aufrufe,
+#ein bisect und ein paar += (siehe benchmarks/metrics_overhead.py). zusammengebaut wird der text erst beim abruf.
+#an den einzelnen SQL statements hängt absichtlich nichts, gemessen wird beim pool und beim schreiben
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0001, 0.001, 0.01, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) #letzter platz ist +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1 #bisect_left: value == grenze zählt noch in diesen bucket (le)
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list:
+        sep = "," if labels else ""
+        braces = f"{{{labels}}}" if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{braces} {self.sum}")
+        lines.append(f"{name}_count{braces} {self.count}")
+        return lines
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock() #für alles was aus threads kommt (pool, sqlite events), die middleware läuft nur im event loop
+        self.latency = {} #(method, route) -> Histogram
+        self.requests = {} #(method, route, status) -> anzahl
+        self.exceptions = {} #(method, route) -> anzahl
+        self.in_flight = 0
+        self.pool_wait = Histogram(POOL_WAIT_BUCKETS)
+        self.pool_timeouts = 0
+        self.lock_errors = 0
+        self.lock_waits = 0
+        self.lock_wait_seconds = 0.0
+        self.engines = [] #(name, engine) deren pool in /metrics auftaucht
+
+    # ---- http (middleware) ----
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        key = (method, route)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    def observe_exception(self, method: str, route: str):
+        key = (method, route)
+        self.exceptions[key] = self.exceptions.get(key, 0) + 1
+
+    # ---- datenbank (threads) ----
+    def observe_pool_wait(self, seconds: float, timed_out: bool):
+        with self._lock:
+            self.pool_wait.observe(seconds)
+            if timed_out:
+                self.pool_timeouts += 1
+
+    def observe_write(self, seconds: float):
+        #sqlite wartet bei einer belegten schreibsperre selber bis busy_timeout. ein schreiben das deutlich länger als
+        #normal braucht hat also fast immer auf die sperre gewartet. gemessen wird nur beim schreiben, nicht pro statement
+        #(before/after_cursor_execute events an jedem statement kosten ~15 µs, siehe benchmarks/metrics_overhead.py)
+        if seconds < config.SQLITE_LOCK_WAIT_MS / 1000:
+            return
+        with self._lock:
+            self.lock_waits += 1
+            self.lock_wait_seconds += seconds
+
+    def observe_lock_error(self):
+        with self._lock:
+            self.lock_errors += 1
+
+    # ---- ausgabe ----
+    def render(self) -> str:
+        out = []
+        out += ["# HELP http_request_duration_seconds Dauer der requests pro route",
+                "# TYPE http_request_duration_seconds histogram"]
+        for (method, route), histogram in list(self.latency.items()):
+            out += histogram.render("http_request_duration_seconds", f'method="{method}",route="{route}"')
+        out += ["# HELP http_requests_total Beantwortete requests pro route und status code",
+                "# TYPE http_requests_total counter"]
+        for (method, route, status), n in list(self.requests.items()):
+            out.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {n}')
+        out += ["# HELP http_request_exceptions_total Requests die mit einer exception geendet haben",
+                "# TYPE http_request_exceptions_total counter"]
+        for (method, route), n in list(self.exceptions.items()):
+            out.append(f'http_request_exceptions_total{{method="{method}",route="{route}"}} {n}')
+        out += ["# HELP http_requests_in_flight Requests die gerade bearbeitet werden",
+                "# TYPE http_requests_in_flight gauge",
+                f"http_requests_in_flight {self.in_flight}"]
+
+        gates = admission.controller.stats() if admission.controller is not None else {}
+        out += ["# HELP admission_active Requests die gerade in ihrer gruppe laufen", "# TYPE admission_active gauge"]
+        for group, gate in gates.items():
+            out.append(f'admission_active{{group="{group}"}} {gate["active"]}')
+        out += ["# HELP admission_queued Requests die auf einen platz warten", "# TYPE admission_queued gauge"]
+        for group, gate in gates.items():
+            out.append(f'admission_queued{{group="{group}"}} {gate["queued"]}')
+        out += ["# HELP admission_rejected_total Abgewiesene requests (queue_full: 429, queue_timeout: 503)",
+                "# TYPE admission_rejected_total counter"]
+        for group, gate in gates.items():
+            for reason, n in gate["rejected"].items():
+                out.append(f'admission_rejected_total{{group="{group}",reason="{reason}"}} {n}')
+
+        coalescing = flights.stats()
+        out += ["# HELP single_flight_requests_total Lesende requests pro gruppe, leader haben abgefragt, follower mitbenutzt",
+                "# TYPE single_flight_requests_total counter"]
+        for group, counts in coalescing.items():
+            out.append(f'single_flight_requests_total{{group="{group}",role="leader"}} {counts["leaders"]}')
+            out.append(f'single_flight_requests_total{{group="{group}",role="follower"}} {counts["followers"]}')
+        out += ["# HELP single_flight_coalesced_ratio Anteil der requests ohne eigene abfrage",
+                "# TYPE single_flight_coalesced_ratio gauge"]
+        for group, counts in coalescing.items():
+            out.append(f'single_flight_coalesced_ratio{{group="{group}"}} {counts["coalesced_ratio"]}')
+
+        out += ["# HELP db_pool_size Feste größe des connection pools", "# TYPE db_pool_size gauge"]
+        pools = [(name, engine.pool) for name, engine in self.engines]
+        for name, pool in pools:
+            out.append(f'db_pool_size{{engine="{name}"}} {pool.size()}')
+        out += ["# HELP db_pool_checked_out Gerade ausgeliehene verbindungen", "# TYPE db_pool_checked_out gauge"]
+        for name, pool in pools:
+            out.append(f'db_pool_checked_out{{engine="{name}"}} {pool.checkedout()}')
+        out += ["# HELP db_pool_overflow Verbindungen über pool_size hinaus (negativ = noch nicht alle geöffnet)",
+                "# TYPE db_pool_overflow gauge"]
+        for name, pool in pools:
+            out.append(f'db_pool_overflow{{engine="{name}"}} {pool.overflow()}')
+        with self._lock:
+            out += ["# HELP db_pool_wait_seconds Wartezeit bis eine verbindung aus dem pool kam",
+                    "# TYPE db_pool_wait_seconds histogram"]
+            out += self.pool_wait.render("db_pool_wait_seconds", "")
+            out += ["# HELP db_pool_timeouts_total Kein platz im pool innerhalb von pool_timeout",
+                    "# TYPE db_pool_timeouts_total counter",
+                    f"db_pool_timeouts_total {self.pool_timeouts}",
+                    "# HELP sqlite_lock_errors_total 'database is locked' fehler (busy_timeout abgelaufen)",
+                    "# TYPE sqlite_lock_errors_total counter",
+                    f"sqlite_lock_errors_total {self.lock_errors}",
+                    "# HELP sqlite_lock_waits_total Schreibvorgänge die länger als SQLITE_LOCK_WAIT_MS gebraucht haben (warten auf die sperre)",
+                    "# TYPE sqlite_lock_waits_total counter",
+                    f"sqlite_lock_waits_total {self.lock_waits}",
+                    "# HELP sqlite_lock_wait_seconds_total Summe der zeit dieser schreibvorgänge",
+                    "# TYPE sqlite_lock_wait_seconds_total counter",
+                    f"sqlite_lock_wait_seconds_total {self.lock_wait_seconds}"]
+        return "\n".join(out) + "\n"
+
+
+metrics = Metrics()
+
+
+# ----------------------------------------------------
+# MIDDLEWARE
+# ----------------------------------------------------
+class MetricsMiddleware:
+    #reine ASGI middleware, die route steht erst nach dem routing in scope["route"] (setzt FastAPI)
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500 #falls gar keine antwort rausgeht
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            metrics.observe_exception(scope["method"], _route(scope))
+            raise
+        finally:
+            metrics.in_flight -= 1
+            metrics.observe_request(scope["method"], _route(scope), status, time.perf_counter() - start)
+
+
+def _route(scope) -> str:
+    route = scope.get("route")
+    #ohne passende route (404) nicht die url nehmen, sonst gibt es für jede zufällige url eine eigene zeitreihe
+    return route.path if route is not None else "unmatched"
+
+
+# ----------------------------------------------------
+# DATENBANK: POOL UND SQLITE SPERREN
+# ----------------------------------------------------
+def watch_pool(name: str, engine):
+    #engine ist eine Engine oder AsyncEngine. die wartezeit misst ein wrapper um pool._do_get (da wird gewartet wenn der
+    #pool leer ist), nach engine.dispose() gibt es einen neuen pool und der wrapper wird neu gesetzt
+    target = getattr(engine, "sync_engine", engine)
+    metrics.engines.append((name, target))
+    _time_pool_checkout(target.pool)
+
+    @event.listens_for(target, "engine_disposed")
+    def _rewrap(engine):
+        _time_pool_checkout(engine.pool)
+
+
+def _time_pool_checkout(pool):
+    do_get = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        try:
+            conn = do_get()
+        except exc.TimeoutError: #nur das ist ein pool timeout, kein platz frei geworden
+            metrics.observe_pool_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        except Exception: #z.b. "unable to open database file" beim verbinden: gewartet ja, timeout nein
+            metrics.observe_pool_wait(time.perf_counter() - start, timed_out=False)
+            raise
+        metrics.observe_pool_wait(time.perf_counter() - start, timed_out=False)
+        return conn
+
+    pool._do_get = timed_do_get
+
+
+def watch_sqlite_locks(target=Engine):
+    #"database is locked" kommt erst wenn busy_timeout abgelaufen ist. handle_error läuft nur im fehlerfall, kostet also nichts.
+    #standardmäßig an der Engine klasse, gilt also für alle engines (auch den group-commit writer und die async engine)
+    @event.listens_for(target, "handle_error")
+    def _error(context):
+        message = str(context.original_exception).lower()
+        if "database is locked" in message or "database is busy" in message:
+            metrics.observe_lock_error()
@@ -0,0 +1,598 @@
+"""
+Versionierte schema-migrationen für die SQLite datenbank.
+
+    python migrations.py status            # welche version hat die db, was fehlt noch
+    python migrations.py upgrade           # alle fehlenden migrationen anwenden (auch die batch-arbeit, im vordergrund)
+    python migrations.py upgrade --to 3    # nur bis version 3
+    python migrations.py backfill          # nur noch offene batch-arbeit fertig machen
+"""
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+
+import config
+import search
+import stats
+from content_codec import compress_batch, decode, plain_text_sql, plain_bytes_sql
+from storage import apply_profile
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------
+# MIGRATIONEN
+# ----------------------------------------------------
+#früher lief bei jedem start create_all + ensure_* (jede tabelle, jede spalte, jeder index wurde per reflection geprüft)
+#und neue spalten/indizes kamen in einer bestehenden userdaten.db trotzdem nie an
+#
+#jetzt steht in der tabelle schema_version welche migrationen schon gelaufen sind. beim start wird nur die höchste
+#nummer gelesen, ist sie aktuell passiert sonst nichts. jede migration ist eine nummerierte funktion unten in MIGRATIONS,
+#die reihenfolge ist fest und eine einmal ausgelieferte migration wird nie mehr geändert (sonst neue anhängen)
+#
+#eine migration hat bis zu zwei teile:
+#  up(conn)                      schnelle DDL (CREATE/ALTER), läuft in EINER transaktion mit BEGIN IMMEDIATE
+#  batch(conn, position, limit)  große umschreibungen (z.b. eine spalte für jede zeile neu füllen) in kleinen stücken,
+#                                jedes stück eine eigene kurze transaktion. gibt die neue position zurück (z.b. die
+#                                letzte bearbeitete id) oder None wenn alles fertig ist. die position steht in
+#                                schema_version, nach einem absturz geht es dort weiter
+#beim app-start läuft nur up() sofort, die batches laufen danach im hintergrund (BackfillRunner) während die app
+#schon anfragen beantwortet ("online"). bis dahin muss der code mit halb gefüllten daten klarkommen
+#
+#rebuilds_tables=True: up() baut tabellen neu (neue tabelle, kopieren, DROP, RENAME, so wie es die sqlite doku für
+#änderungen beschreibt die ALTER TABLE nicht kann). dafür sind die foreign keys während der migration aus, sonst
+#löscht das DROP TABLE users per ON DELETE CASCADE alle posts. am ende prüft foreign_key_check ob noch alles passt
+
+
+class Migration:
+    def __init__(self, version: int, name: str, up=None, batch=None, batch_size: int = 1000, rebuilds_tables: bool = False):
+        self.version = version
+        self.name = name
+        self.up = up
+        self.batch = batch
+        self.batch_size = batch_size
+        self.rebuilds_tables = rebuilds_tables
+
+
+def _columns(conn, table: str) -> set:
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _001_tabellen(conn):
+    #so wie create_all sie im allerersten models.py angelegt hat, IF NOT EXISTS weil alte dbs sie schon haben
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        email VARCHAR NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (email)
+    )""")
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER NOT NULL,
+        title VARCHAR NOT NULL,
+        content VARCHAR NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE
+    )""")
+
+
+def _002_versionen(conn):
+    #version spalten für die ETags (versioning.py), ADD COLUMN mit DEFAULT ändert in sqlite keine zeile, geht also sofort
+    for table in ("users", "posts"):
+        if "version" not in _columns(conn, table):
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    #UserResponse enthält die posts, also steigt die user-version mit jeder änderung an seinen posts (auch bei bulk/import)
+    conn.exec_driver_sql("""CREATE TRIGGER IF NOT EXISTS posts_bump_user_ai AFTER INSERT ON posts BEGIN
+        UPDATE users SET version = version + 1 WHERE id = new.user_id;
+    END""")
+    conn.exec_driver_sql("""CREATE TRIGGER IF NOT EXISTS posts_bump_user_au AFTER UPDATE ON posts BEGIN
+        UPDATE users SET version = version + 1 WHERE id IN (old.user_id, new.user_id);
+    END""")
+    conn.exec_driver_sql("""CREATE TRIGGER IF NOT EXISTS posts_bump_user_ad AFTER DELETE ON posts BEGIN
+        UPDATE users SET version = version + 1 WHERE id = old.user_id;
+    END""")
+
+
+def _003_posts_index(conn):
+    #covering index für "posts eines users, seitenweise" (siehe models.PostModel.__table_args__)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_posts_user_id_id_title ON posts (user_id, id, title)")
+    conn.exec_driver_sql("ANALYZE")
+
+
+def _004_volltextsuche(conn):
+    #FTS5 tabellen + triggers (search.py). ohne FTS5 im sqlite build bleibt es beim ilike, die migration gilt trotzdem
+    #als gelaufen. der SAVEPOINT nimmt bei einem fehler nur diesen teil zurück
+    try:
+        with conn.begin_nested():
+            conn.exec_driver_sql("""CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                name, content='users', content_rowid='id', tokenize='trigram')""")
+            conn.exec_driver_sql("""CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+                INSERT INTO users_fts(rowid, name) VALUES (new.id, new.name);
+            END""")
+            conn.exec_driver_sql("""CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+                INSERT INTO users_fts(users_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            END""")
+            conn.exec_driver_sql("""CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF name ON users BEGIN
+                INSERT INTO users_fts(users_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                INSERT INTO users_fts(rowid, name) VALUES (new.id, new.name);
+            END""")
+            conn.exec_driver_sql("""CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+                title, content, content='posts', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""")
+            conn.exec_driver_sql("""CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts BEGIN
+                INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END""")
+            conn.exec_driver_sql("""CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts BEGIN
+                INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            END""")
+            conn.exec_driver_sql("""CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF title, content ON posts BEGIN
+                INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END""")
+            #die texte stehen nur in users/posts (external content), 'rebuild' liest sie einmal komplett ein
+            conn.exec_driver_sql("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+            conn.exec_driver_sql("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+    except OperationalError as exc: #z.b. "no such module: fts5"
+        logger.warning("Volltextsuche nicht verfügbar, nutze ilike: %s", exc)
+
+
+def _005_write_behind(conn):
+    #MEMORY_STORE (memory_store.py): bis zu welcher nummer das write-behind log schon in users/posts steht.
+    #wird in der gleichen transaktion wie die änderungen selbst hochgezählt, nach einem absturz fehlt also genau der rest
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS write_behind (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        applied_seq INTEGER NOT NULL
+    )""")
+    conn.exec_driver_sql("INSERT OR IGNORE INTO write_behind (id, applied_seq) VALUES (1, 0)")
+
+
+def _006_komprimierter_inhalt(conn):
+    #posts.content kann ab jetzt ein komprimierter BLOB sein (content_codec.py). die FTS triggers und snippet() brauchen
+    #aber den text: sie lesen ihn über post_text() bzw. die view posts_fts_source. content= lässt sich bei einer FTS5
+    #tabelle nicht ändern, posts_fts wird deshalb neu angelegt und einmal neu gefüllt. die alten zeilen komprimiert
+    #danach die batch-arbeit (content_codec.compress_batch)
+    if not conn.exec_driver_sql("SELECT count(*) FROM sqlite_master WHERE name = 'posts_fts'").scalar():
+        return #sqlite ohne FTS5, siehe migration 4
+    for trigger in ("posts_fts_ai", "posts_fts_ad", "posts_fts_au"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.exec_driver_sql("DROP TABLE posts_fts")
+    conn.exec_driver_sql(
+        "CREATE VIEW IF NOT EXISTS posts_fts_source AS SELECT id, title, post_text(content) AS content FROM posts"
+    )
+    conn.exec_driver_sql("""CREATE VIRTUAL TABLE posts_fts USING fts5(
+        title, content, content='posts_fts_source', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""")
+    conn.exec_driver_sql("""CREATE TRIGGER posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, post_text(new.content));
+    END""")
+    conn.exec_driver_sql("""CREATE TRIGGER posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, post_text(old.content));
+    END""")
+    conn.exec_driver_sql("""CREATE TRIGGER posts_fts_au AFTER UPDATE OF title, content ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, post_text(old.content));
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, post_text(new.content));
+    END""")
+    conn.exec_driver_sql("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+
+
+def _udf_bytes_sql(column: str) -> str:
+    #so hat migration 7 die länge gerechnet (mit post_text(), siehe content_codec.py). steht hier fest, weil eine
+    #ausgelieferte migration sich nicht mehr ändern darf, migration 10 ersetzt die triggers
+    return f"length(CAST(post_text({column}) AS BLOB))"
+
+
+def _stats_change(length: str, user_id: str, sign: str) -> str:
+    #ein post kommt dazu (+) oder fällt weg (-): zähler des users und die stufe im histogramm anpassen.
+    #length: SQL für die utf-8 länge des texts
+    return f"""
+        UPDATE users SET post_count = post_count {sign} 1, content_bytes = content_bytes {sign} {length}
+        WHERE id = {user_id};
+        INSERT INTO post_length_histogram (bucket, posts, bytes)
+        SELECT {stats.bucket_sql("b")}, {sign}1, {sign}b FROM (SELECT {length} AS b) WHERE true
+        ON CONFLICT (bucket) DO UPDATE SET posts = posts + excluded.posts, bytes = bytes + excluded.bytes;"""
+
+
+def _007_statistik(conn):
+    #materialisierte zähler für GET /stats (stats.py), gepflegt von triggers auf posts.
+    #das erste zählen läuft hier und nicht als batch-arbeit: zähler und triggers müssen in der gleichen transaktion
+    #entstehen, sonst würde ein post der dazwischen kommt doppelt oder gar nicht gezählt. liest jeden post einmal
+    for column in ("post_count", "content_bytes"):
+        if column not in _columns(conn, "users"):
+            conn.exec_driver_sql(f"ALTER TABLE users ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS post_length_histogram (
+        bucket INTEGER PRIMARY KEY,
+        posts INTEGER NOT NULL,
+        bytes INTEGER NOT NULL
+    )""")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_users_post_count ON users (post_count DESC, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_users_content_bytes ON users (content_bytes DESC, id)")
+    conn.exec_driver_sql(f"""CREATE TRIGGER IF NOT EXISTS posts_stats_ai AFTER INSERT ON posts BEGIN
+        {_stats_change(_udf_bytes_sql("new.content"), "new.user_id", "+")}
+    END""")
+    conn.exec_driver_sql(f"""CREATE TRIGGER IF NOT EXISTS posts_stats_ad AFTER DELETE ON posts BEGIN
+        {_stats_change(_udf_bytes_sql("old.content"), "old.user_id", "-")}
+    END""")
+    conn.exec_driver_sql(f"""CREATE TRIGGER IF NOT EXISTS posts_stats_au AFTER UPDATE OF content, user_id ON posts BEGIN
+        {_stats_change(_udf_bytes_sql("old.content"), "old.user_id", "-")}
+        {_stats_change(_udf_bytes_sql("new.content"), "new.user_id", "+")}
+    END""")
+    stats.rebuild(conn, _udf_bytes_sql("content"))
+
+
+def _008_loeschauftraege(conn):
+    #DELETE /users/{id} für users mit vielen posts: der auftrag steht hier, gelöscht wird stückweise (purge.py).
+    #kein foreign key auf users: die zeile bleibt als protokoll stehen wenn der user längst weg ist
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS user_purges (
+        user_id INTEGER PRIMARY KEY,
+        requested_at VARCHAR NOT NULL,
+        started_at VARCHAR,
+        finished_at VARCHAR,
+        posts_deleted INTEGER NOT NULL DEFAULT 0
+    )""")
+
+
+def _009_importauftraege(conn):
+    #status der POST /posts/import jobs (post_import.py). stand vorher nur im speicher des workers der den upload
+    #bekommen hat, mit serve.py --workers N fragten die anderen worker ins leere
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS import_jobs (
+        id VARCHAR PRIMARY KEY,
+        format VARCHAR NOT NULL,
+        chunk_size INTEGER NOT NULL,
+        status VARCHAR NOT NULL,
+        rows_read INTEGER NOT NULL DEFAULT 0,
+        rows_imported INTEGER NOT NULL DEFAULT 0,
+        rows_failed INTEGER NOT NULL DEFAULT 0,
+        errors VARCHAR NOT NULL DEFAULT '[]',
+        detail VARCHAR,
+        created_at VARCHAR NOT NULL,
+        updated_at VARCHAR NOT NULL
+    )""")
+
+
+def _010_triggers_ohne_funktion(conn):
+    #die triggers von migration 6 und 7 riefen post_text() auf, die gibt es nur auf verbindungen der app: jedes
+    #INSERT/UPDATE/DELETE auf posts aus dem sqlite3 programm oder einem backup-skript brach ab. jetzt steht bei
+    #komprimierten zeilen der text in search_text und die länge in content_bytes (content_codec.py), die triggers lesen
+    #nur noch spalten. die texte ändern sich dabei nicht, FTS und zähler bleiben wie sie sind (kein rebuild).
+    #dazu bekommen die UPDATE triggers ein WHEN: ändert sich nur das format (compress_batch), bleibt FTS wie es ist und die
+    #user-versionen steigen nicht, sonst wären nach dem komprimieren alle ETags der clients ungültig
+    for column, kind in (("search_text", "VARCHAR"), ("content_bytes", "INTEGER")):
+        if column not in _columns(conn, "posts"):
+            conn.exec_driver_sql(f"ALTER TABLE posts ADD COLUMN {column} {kind}")
+    #erst die alten triggers weg: das auffüllen unten ist selber ein UPDATE auf posts und würde sonst post_text() rufen
+    #und die user-versionen hochzählen
+    for trigger in ("posts_bump_user_au", "posts_stats_ai", "posts_stats_ad", "posts_stats_au",
+                    "posts_fts_ai", "posts_fts_ad", "posts_fts_au"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.exec_driver_sql("DROP VIEW IF EXISTS posts_fts_source")
+    #schon komprimierte zeilen (batch von migration 6) einmal auspacken, in stücken damit nicht alles im speicher liegt
+    last_id = 0
+    while True:
+        rows = conn.exec_driver_sql(
+            "SELECT id, content FROM posts WHERE id > ? AND typeof(content) = 'blob' ORDER BY id LIMIT 1000", (last_id,)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for post_id, content in rows:
+            text = decode(content)
+            updates.append((text, len(text.encode("utf-8")), post_id))
+        conn.exec_driver_sql("UPDATE posts SET search_text = ?, content_bytes = ? WHERE id = ?", updates)
+        last_id = rows[-1][0]
+
+    old_text, new_text = plain_text_sql("old."), plain_text_sql("new.")
+    text_changed = f"old.title IS NOT new.title OR ({old_text}) IS NOT ({new_text})"
+    conn.exec_driver_sql(f"""CREATE TRIGGER posts_bump_user_au AFTER UPDATE ON posts
+        WHEN old.user_id IS NOT new.user_id OR {text_changed} BEGIN
+        UPDATE users SET version = version + 1 WHERE id IN (old.user_id, new.user_id);
+    END""")
+
+    old_bytes, new_bytes = plain_bytes_sql("old."), plain_bytes_sql("new.")
+    conn.exec_driver_sql(f"""CREATE TRIGGER posts_stats_ai AFTER INSERT ON posts BEGIN
+        {_stats_change(new_bytes, "new.user_id", "+")}
+    END""")
+    conn.exec_driver_sql(f"""CREATE TRIGGER posts_stats_ad AFTER DELETE ON posts BEGIN
+        {_stats_change(old_bytes, "old.user_id", "-")}
+    END""")
+    conn.exec_driver_sql(f"""CREATE TRIGGER posts_stats_au AFTER UPDATE OF content, user_id ON posts
+        WHEN old.user_id IS NOT new.user_id OR ({old_bytes}) IS NOT ({new_bytes}) BEGIN
+        {_stats_change(old_bytes, "old.user_id", "-")}
+        {_stats_change(new_bytes, "new.user_id", "+")}
+    END""")
+
+    if not conn.exec_driver_sql("SELECT count(*) FROM sqlite_master WHERE name = 'posts_fts'").scalar():
+        return #sqlite ohne FTS5, siehe migration 4
+    conn.exec_driver_sql(f"CREATE VIEW posts_fts_source AS SELECT id, title, {plain_text_sql()} AS content FROM posts")
+    conn.exec_driver_sql(f"""CREATE TRIGGER posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, {new_text});
+    END""")
+    conn.exec_driver_sql(f"""CREATE TRIGGER posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, {old_text});
+    END""")
+    conn.exec_driver_sql(f"""CREATE TRIGGER posts_fts_au AFTER UPDATE OF title, content ON posts WHEN {text_changed} BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, {old_text});
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, {new_text});
+    END""")
+
+
+def _autoincrement_sql(create_sql: str, table: str, new_table: str) -> str:
+    #"CREATE TABLE users (id INTEGER NOT NULL, ..., PRIMARY KEY (id), ...)" so wie migration 1 (und früher create_all)
+    #sie anlegt -> "CREATE TABLE users_neu (id INTEGER PRIMARY KEY AUTOINCREMENT, ...)"
+    new_sql, renamed = re.subn(rf"^CREATE TABLE \"?{table}\"?\s*\(", f"CREATE TABLE {new_table} (", create_sql)
+    new_sql, typed = re.subn(r"\bid INTEGER NOT NULL\b", "id INTEGER PRIMARY KEY AUTOINCREMENT", new_sql, count=1)
+    new_sql, dropped = re.subn(r",\s*PRIMARY KEY \(id\)", "", new_sql, count=1)
+    if (renamed, typed, dropped) != (1, 1, 1):
+        raise RuntimeError(f"Tabelle {table} hat ein unerwartetes schema, bitte von hand migrieren:\n{create_sql}")
+    return new_sql
+
+
+def _rebuild_with_autoincrement(conn, table: str):
+    create_sql = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).scalar()
+    if "AUTOINCREMENT" in create_sql.upper():
+        return
+    #indizes und triggers der tabelle verschwinden mit dem DROP, also vorher ihr SQL merken und danach neu anlegen
+    dependents = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL", (table,)
+    ).scalars().all()
+    columns = ", ".join(row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})"))
+    conn.exec_driver_sql(_autoincrement_sql(create_sql, table, f"{table}_neu"))
+    #die ids werden mitkopiert, dabei setzt sqlite den zähler in sqlite_sequence auf die höchste id
+    conn.exec_driver_sql(f"INSERT INTO {table}_neu ({columns}) SELECT {columns} FROM {table}")
+    conn.exec_driver_sql(f"DROP TABLE {table}")
+    conn.exec_driver_sql(f"ALTER TABLE {table}_neu RENAME TO {table}")
+    for sql in dependents:
+        conn.exec_driver_sql(sql)
+
+
+def _011_ids_nie_wiederverwenden(conn):
+    #ohne AUTOINCREMENT nimmt sqlite für eine neue zeile max(id) + 1. wird der user mit der höchsten id gelöscht, bekommt
+    #der nächste neue genau seine id wieder und fängt wieder bei version 1 an: der ETag "user-<id>-<version>" eines
+    #clients, der noch den gelöschten kannte, passt dann auf einen fremden user (304 mit falschen daten, PUT mit If-Match
+    #überschreibt ihn). mit AUTOINCREMENT merkt sich sqlite die höchste je vergebene id in sqlite_sequence.
+    #ids die schon vor dieser migration gelöscht wurden kennt sqlite nicht mehr, ab hier wird aber keine mehr doppelt
+    #vergeben. kopiert beide tabellen einmal komplett (dauert so lange wie ein VACUUM)
+    #legacy_alter_table: sonst prüft sqlite beim RENAME alle triggers/views, und die auf posts zeigen in dem moment auf
+    #eine tabelle users die es gerade nicht gibt
+    conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    try:
+        for table in ("users", "posts"):
+            _rebuild_with_autoincrement(conn, table)
+    finally:
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+    broken = conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+    if broken:
+        raise RuntimeError(f"Migration 11: {len(broken)} posts zeigen auf users die es nicht gibt, z.b. {broken[0]}")
+
+
+MIGRATIONS = [
+    Migration(1, "tabellen users und posts", up=_001_tabellen),
+    Migration(2, "version spalten und triggers für ETags", up=_002_versionen),
+    Migration(3, "index posts(user_id, id, title)", up=_003_posts_index),
+    Migration(4, "FTS5 volltextsuche", up=_004_volltextsuche),
+    Migration(5, "tabelle write_behind (stand des MEMORY_STORE logs)", up=_005_write_behind),
+    Migration(6, "komprimierter posts.content", up=_006_komprimierter_inhalt, batch=compress_batch),
+    Migration(7, "zähler pro user und längen-histogramm (GET /stats)", up=_007_statistik),
+    Migration(8, "tabelle user_purges (users stückweise löschen)", up=_008_loeschauftraege),
+    Migration(9, "tabelle import_jobs (status der imports für alle worker)", up=_009_importauftraege),
+    Migration(10, "triggers ohne post_text(): search_text und content_bytes in posts", up=_010_triggers_ohne_funktion),
+    Migration(11, "AUTOINCREMENT für users.id und posts.id (ETags)", up=_011_ids_nie_wiederverwenden, rebuilds_tables=True),
+]
+
+LATEST = MIGRATIONS[-1].version
+
+
+# ----------------------------------------------------
+# AUSFÜHREN
+# ----------------------------------------------------
+_SCHEMA_VERSION_DDL = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    applied_at VARCHAR,
+    position INTEGER
+)""" #applied_at ist NULL solange die batch-arbeit der migration noch läuft, position ist der stand darin
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _migration_engine(url):
+    #eigene engine: pysqlite startet transaktionen sonst erst vor dem ersten INSERT/UPDATE und DDL läuft ohne transaktion.
+    #so ist jede migration atomar und BEGIN IMMEDIATE sorgt dafür dass zwei worker nicht gleichzeitig migrieren
+    engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=1, max_overflow=0)
+    apply_profile(engine, config.DB_PROFILE)
+
+    @event.listens_for(engine, "connect")
+    def _no_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+def read_state(conn) -> tuple:
+    #(höchste version, {version: position} der migrationen deren batch-arbeit noch offen ist)
+    #ein einziges SELECT, das ist alles was beim normalen start passiert
+    try:
+        rows = conn.exec_driver_sql(
+            "SELECT version, applied_at, position FROM schema_version ORDER BY version"
+        ).all()
+    except OperationalError: #keine schema_version tabelle: ganz neue db oder eine von vor den migrationen
+        return 0, {}
+    current = rows[-1][0] if rows else 0
+    pending = {version: position for version, applied_at, position in rows if applied_at is None}
+    return current, pending
+
+
+@contextmanager
+def _foreign_keys_off(conn, active: bool):
+    #PRAGMA foreign_keys wirkt nur außerhalb einer transaktion, also direkt auf der sqlite verbindung vor dem BEGIN
+    #(über conn.exec_driver_sql würde schon das BEGIN IMMEDIATE kommen). danach wieder wie es das profil gesetzt hatte
+    if not active:
+        yield
+        return
+    raw = conn.connection.dbapi_connection
+    before = raw.execute("PRAGMA foreign_keys").fetchone()[0]
+    raw.execute("PRAGMA foreign_keys = OFF")
+    try:
+        yield
+    finally:
+        raw.execute(f"PRAGMA foreign_keys = {before}")
+
+
+def upgrade(engine, target: int = None, backfill: bool = True) -> list:
+    #wendet alle migrationen > aktuelle version an (bis target). backfill=False: die batch-arbeit bleibt offen für später
+    target = LATEST if target is None else target
+    applied = []
+    migration_engine = _migration_engine(engine.url)
+    try:
+        with migration_engine.begin() as conn:
+            conn.exec_driver_sql(_SCHEMA_VERSION_DDL)
+        for migration in MIGRATIONS:
+            if migration.version > target:
+                break
+            with migration_engine.connect() as conn, _foreign_keys_off(conn, migration.rebuilds_tables), conn.begin():
+                current, _ = read_state(conn) #erst mit der sperre nachsehen, vielleicht war ein anderer worker schneller
+                if migration.version <= current:
+                    continue
+                logger.info("Migration %d: %s", migration.version, migration.name)
+                if migration.up is not None:
+                    migration.up(conn)
+                conn.exec_driver_sql(
+                    "INSERT INTO schema_version (version, name, applied_at, position) VALUES (?, ?, ?, NULL)",
+                    (migration.version, migration.name, None if migration.batch else _now()),
+                )
+            applied.append(migration.version)
+        if backfill:
+            run_backfills(migration_engine)
+    finally:
+        migration_engine.dispose()
+    return applied
+
+
+def run_backfills(engine, stop: threading.Event = None, pause: float = 0.0):
+    #arbeitet die offene batch-arbeit ab, ein stück pro transaktion. pause: sekunden zwischen den stücken, damit die
+    #schreibenden requests der app dazwischen auch mal die sperre bekommen
+    by_version = {m.version: m for m in MIGRATIONS}
+    with engine.connect() as conn:
+        _, pending = read_state(conn)
+    for version in sorted(pending):
+        migration = by_version[version]
+        while not (stop is not None and stop.is_set()):
+            with engine.begin() as conn:
+                #position erst mit der sperre lesen: mit mehreren workern (serve.py) läuft der runner in jedem, so macht
+                #jeder das nächste stück statt alle das gleiche
+                applied_at, position = conn.exec_driver_sql(
+                    "SELECT applied_at, position FROM schema_version WHERE version = ?", (version,)
+                ).one()
+                if applied_at is not None: #ein anderer worker war schon fertig
+                    break
+                position = migration.batch(conn, position, migration.batch_size)
+                if position is None:
+                    conn.exec_driver_sql(
+                        "UPDATE schema_version SET applied_at = ?, position = NULL WHERE version = ?", (_now(), version)
+                    )
+                else:
+                    conn.exec_driver_sql("UPDATE schema_version SET position = ? WHERE version = ?", (position, version))
+            if position is None:
+                logger.info("Migration %d: batch-arbeit fertig", version)
+                break
+            if pause:
+                time.sleep(pause)
+
+
+def startup(engine) -> dict:
+    #der schnelle weg beim app-start: nur schema_version lesen. fehlt etwas wird migriert (MIGRATE_ON_STARTUP=1)
+    #oder abgebrochen, damit nie eine app gegen ein falsches schema läuft. gibt die offene batch-arbeit zurück
+    with engine.connect() as conn:
+        current, pending = read_state(conn)
+    if current < LATEST:
+        if not config.MIGRATE_ON_STARTUP:
+            raise RuntimeError(
+                f"Datenbank hat schema version {current}, die app braucht {LATEST}. Bitte 'python migrations.py upgrade' ausführen."
+            )
+        upgrade(engine, backfill=False)
+        with engine.connect() as conn:
+            current, pending = read_state(conn)
+    with engine.connect() as conn:
+        search.detect_search_index(conn)
+    return pending
+
+
+class BackfillRunner:
+    #läuft im hintergrund (main.py lifespan) solange es offene batch-arbeit gibt
+    def __init__(self, engine, pause: float):
+        self.engine = engine
+        self.pause = pause
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        migration_engine = _migration_engine(self.engine.url)
+        try:
+            run_backfills(migration_engine, stop=self._stop, pause=self.pause)
+        except Exception: #beim nächsten start geht es an der gespeicherten position weiter
+            logger.exception("Batch-migration fehlgeschlagen")
+        finally:
+            migration_engine.dispose()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="migration-backfill", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+
+# CLI
+def main(argv=None):
+    import argparse
+    from datenbase import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Schema-migrationen für userdaten.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status")
+    up = sub.add_parser("upgrade")
+    up.add_argument("--to", type=int, default=None)
+    sub.add_parser("backfill")
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        applied = upgrade(engine, target=args.to)
+        print("Angewendet:", ", ".join(map(str, applied)) if applied else "nichts, die db ist aktuell")
+    elif args.command == "backfill":
+        migration_engine = _migration_engine(engine.url)
+        run_backfills(migration_engine)
+        migration_engine.dispose()
+
+    with engine.connect() as conn:
+        current, pending = read_state(conn)
+    print(f"schema version {current} von {LATEST}")
+    for migration in MIGRATIONS:
+        if migration.version > current:
+            state = "fehlt"
+        elif migration.version in pending:
+            state = f"batch-arbeit offen (position {pending[migration.version]})"
+        else:
+            state = "ok"
+        print(f"  {migration.version:>3}  {migration.name:<45} {state}")
+
+
+if __name__ == "__main__":
+    main()
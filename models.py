@@ -1,7 +1,8 @@
-from sqlalchemy import Integer, String, ForeignKey
+from sqlalchemy import Integer, String, ForeignKey, Index, desc, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import List
 from datenbase import Base # Import von oben!
+from content_codec import CompressedText
 
 
 # 🟦 DATENBANK-MODELL: User (ERWEITERT UM DIE BEZIEHUNG)
@@ -10,6 +11,16 @@ class UserModel(Base): #bekommt Base vererbt und ist somit eine Tochterklasse =
     id : Mapped[int] = mapped_column(Integer, primary_key=True)# primary_key macht das die id unique ist, gleichermaßen zählt sie auch automatisch nach oben
     name: Mapped[str] = mapped_column(String)
     email : Mapped[str] = mapped_column(String, unique=True) #emails sind einzigartig
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default=text("1")) #steigt bei jedem update, daraus wird der ETag (versioning.py)
+    #zähler für GET /stats, die pflegen die triggers auf posts (migration 7, stats.py). deferred: das ORM braucht sie nie
+    post_count: Mapped[int] = mapped_column(Integer, server_default=text("0"), deferred=True)
+    content_bytes: Mapped[int] = mapped_column(Integer, server_default=text("0"), deferred=True)
+    #top-N autoren (GET /stats/top-authors) kommen so direkt in der richtigen reihenfolge aus dem index
+    __table_args__ = (
+        Index("ix_users_post_count", desc("post_count"), "id"),
+        Index("ix_users_content_bytes", desc("content_bytes"), "id"),
+        {"sqlite_autoincrement": True}, #ids werden nie wieder vergeben (ETags), siehe migration 11
+    )
     
     # 🔗 NEUE ZEILE: Beziehung zu Posts (Ein User hat viele Posts)
     # In models/user_model.py
@@ -27,10 +38,22 @@ class UserModel(Base): #bekommt Base vererbt und ist somit eine Tochterklasse =
 # 🟦 DATENBANK-MODELL: Post (GANZ NEU) ist das gleiche wie bei User_Model
 class PostModel(Base):
     __tablename__ = 'posts'
+    #ohne index auf user_id muss jede abfrage "alle posts von user X" (liste, joinedload, cascade delete) die ganze tabelle lesen
+    #(user_id, id, title) deckt dazu die sortierung nach id ab und listen die nur den titel brauchen kommen ganz ohne tabelle aus
+    __table_args__ = (
+        Index("ix_posts_user_id_id_title", "user_id", "id", "title"),
+        {"sqlite_autoincrement": True},
+    )
 
     id : Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String)
-    content: Mapped[str] = mapped_column(String)
+    #komprimiert gespeichert (content_codec.py) und deferred: ohne undefer(PostModel.content) bleibt der text in der db.
+    #wer ihn trotzdem anfasst bekommt einen fehler statt einer heimlichen extra-abfrage pro post
+    content: Mapped[str] = mapped_column(CompressedText, deferred=True, deferred_raiseload=True)
+    #nur bei komprimiertem content gesetzt: text und länge für die triggers (FTS, /stats), das ORM liest sie nie
+    search_text: Mapped[str] = mapped_column(String, nullable=True, deferred=True, deferred_raiseload=True)
+    content_bytes: Mapped[int] = mapped_column(Integer, nullable=True, deferred=True, deferred_raiseload=True)
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default=text("1"))
     
     # 🔗 FREMDSCHLÜSSEL: Verweist auf die users.id (DIE VERBINDUNG)
     # In models/post_model.py
@@ -47,14 +70,16 @@ class PostModel(Base):
 #sie werden verwendet um sachen umzuschreiben uns später werden sie wieder in UserModel umgewandelt und abgespeichert
 
 class User:
-    def __init__(self, name: str, email: str, user_id: int = None): #self weil wir die Werte anpassen wollen und int = None weil wir hier noch nicht bestimmen wollen was die id ist
+    def __init__(self, name: str, email: str, user_id: int = None, version: int = None): #self weil wir die Werte anpassen wollen und int = None weil wir hier noch nicht bestimmen wollen was die id ist
         self.id = user_id
         self.name = name
         self.email = email 
+        self.version = version
 
 class Post: # NEU
-    def __init__(self, title: str, content: str, user_id: int, post_id: int = None):
+    def __init__(self, title: str, content: str, user_id: int, post_id: int = None, version: int = None):
         self.id = post_id
         self.title = title
         self.content = content
         self.user_id = user_id
+        self.version = version
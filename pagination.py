@@ -0,0 +1,83 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+# ----------------------------------------------------
+# KEYSET (CURSOR) PAGINATION
+# ----------------------------------------------------
+#statt OFFSET (die db muss alle übersprungenen zeilen trotzdem lesen) merken wir uns die letzte id der seite
+#die nächste seite ist dann einfach "WHERE id > letzte_id ORDER BY id LIMIT n" und das geht direkt über den primary key
+#so kostet seite 1000 genau so viel wie seite 1
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def encode_cursor(last_id: int) -> str:
+    #der cursor ist "opak", der client soll nicht wissen was drin steht, er gibt ihn nur unverändert zurück
+    raw = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    padded = cursor + "=" * (-len(cursor) % 4) #das abgeschnittene "=" wieder dranhängen
+    try:
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = data["id"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError(f"Ungültiger Cursor: {cursor!r}")
+    if not isinstance(last_id, int):
+        raise ValueError(f"Ungültiger Cursor: {cursor!r}")
+    return last_id
+
+
+#Dependency für die Router: macht aus ?after=... die letzte id (oder None für die erste Seite)
+def get_after_id(after: str | None = None) -> int | None:
+    if after is None:
+        return None
+    try:
+        return decode_cursor(after)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def make_page(rows: list, limit: int):
+    #das repository holt limit + 1 zeilen, gibt es die extra zeile dann gibt es auch eine nächste seite
+    #so sparen wir uns ein extra COUNT(*)
+    if len(rows) > limit:
+        items = rows[:limit]
+        return items, encode_cursor(items[-1].id)
+    return rows, None
+
+
+# ----------------------------------------------------
+# CURSOR FÜR GERANKTE LISTEN (Suche)
+# ----------------------------------------------------
+#bei der suche ist die reihenfolge (rank, id) statt nur id, also merkt sich der cursor beides. der rank ist schon
+#gerundet (search.RANK_DIGITS), json gibt einen float unverändert zurück, die nächste seite vergleicht also exakt
+
+def encode_rank_cursor(last_rank: float, last_id: int) -> str:
+    raw = json.dumps({"rank": last_rank, "id": last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def get_after_rank(after: str | None = None):
+    if after is None:
+        return None
+    padded = after + "=" * (-len(after) % 4)
+    try:
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_rank, last_id = float(data["rank"]), data["id"]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail=f"Ungültiger Cursor: {after!r}")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail=f"Ungültiger Cursor: {after!r}")
+    return last_rank, last_id
+
+
+def make_ranked_page(rows: list, limit: int):
+    if len(rows) > limit:
+        items = rows[:limit]
+        return items, encode_rank_cursor(items[-1]["rank"], items[-1]["id"])
+    return rows, None
@@ -0,0 +1,175 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pydantic import ValidationError
+
+from datenbase import SessionLocal, engine
+from models import Post
+from cache import get_cache
+from repositories import UserRepository, PostRepository
+from schemas import PostCreate
+from sharding import shard_map, ShardedUserRepository, ShardedPostRepository
+import memory_store
+
+# ----------------------------------------------------
+# BULK IMPORT VON POSTS (NDJSON / CSV)
+# ----------------------------------------------------
+#create_post prüft pro post den author und committet einzeln, für millionen posts viel zu langsam
+#hier lesen wir die hochgeladene datei zeile für zeile, sammeln chunks, prüfen alle user_ids eines chunks mit EINER
+#IN-abfrage und schreiben die gültigen zeilen mit einem insert pro chunk
+#das ganze läuft als background task, der upload bekommt sofort eine job_id und fragt den status später ab
+#
+#der status steht in der tabelle import_jobs (migration 9) in userdaten.db, auch mit SHARDS und MEMORY_STORE (die
+#datei wird in jedem modus migriert). so kann jeder worker von serve.py ihn beantworten, nicht nur der mit dem upload.
+#geschrieben wird beim start, nach jedem chunk und am ende. stirbt der worker mitten im import, bleibt der job auf
+#"running" stehen, updated_at zeigt dann wann er zuletzt weiter kam
+
+IMPORT_FORMATS = ("ndjson", "csv")
+DEFAULT_CHUNK_SIZE = 1000
+MAX_ERRORS = 1000 #mehr fehler merken wir uns nicht, sonst wächst der status bei einer kaputten datei ins unendliche
+KEEP_FINISHED_DAYS = 7 #fertige jobs werden danach beim nächsten upload weggeräumt
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class ImportJob:
+    def __init__(self, fmt: str, chunk_size: int, job_id: str = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.format = fmt
+        self.chunk_size = chunk_size
+        self.status = "pending" #pending -> running -> done / failed
+        self.rows_read = 0
+        self.rows_imported = 0
+        self.rows_failed = 0
+        self.errors = [] #(zeile, grund)
+        self.detail = None
+
+    def add_error(self, line: int, reason: str):
+        self.rows_failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"line": line, "error": reason})
+
+    def save(self):
+        with engine.begin() as conn:
+            conn.exec_driver_sql("""
+                UPDATE import_jobs SET status = ?, rows_read = ?, rows_imported = ?, rows_failed = ?, errors = ?,
+                                       detail = ?, updated_at = ?
+                WHERE id = ?
+            """, (self.status, self.rows_read, self.rows_imported, self.rows_failed, json.dumps(self.errors),
+                  self.detail, _now(), self.id))
+
+
+def create_job(fmt: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ImportJob:
+    job = ImportJob(fmt, chunk_size)
+    now = _now()
+    old = (datetime.now(timezone.utc) - timedelta(days=KEEP_FINISHED_DAYS)).isoformat(timespec="seconds")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "DELETE FROM import_jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (old,)
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO import_jobs (id, format, chunk_size, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job.id, job.format, job.chunk_size, job.status, now, now),
+        )
+    return job
+
+
+def get_job(job_id: str):
+    #None = unbekannte job_id
+    with engine.connect() as conn:
+        row = conn.exec_driver_sql("""
+            SELECT format, chunk_size, status, rows_read, rows_imported, rows_failed, errors, detail
+            FROM import_jobs WHERE id = ?
+        """, (job_id,)).first()
+    if row is None:
+        return None
+    job = ImportJob(row.format, row.chunk_size, job_id)
+    job.status, job.detail = row.status, row.detail
+    job.rows_read, job.rows_imported, job.rows_failed = row.rows_read, row.rows_imported, row.rows_failed
+    job.errors = json.loads(row.errors)
+    return job
+
+
+def iter_records(file_obj, fmt: str):
+    #gibt (zeilennummer, dict oder fehlertext) zurück, die datei wird nie komplett eingelesen
+    text = io.TextIOWrapper(file_obj, encoding="utf-8", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, f"Kein gültiges JSON: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, "Zeile ist kein JSON-Objekt"
+            continue
+        yield line_number, record
+
+
+def _import_chunk(job: ImportJob, chunk: list, user_repo: UserRepository, post_repo: PostRepository):
+    existing = user_repo.get_existing_user_ids([post.user_id for _, post in chunk])
+    valid = []
+    for line_number, post in chunk:
+        if post.user_id in existing:
+            valid.append(post)
+        else:
+            job.add_error(line_number, f"User mit ID {post.user_id} existiert nicht")
+    job.rows_imported += post_repo.save_posts_bulk(valid)
+
+
+def run_import(job: ImportJob, path: str):
+    if memory_store.store is not None: #MEMORY_STORE: die posts müssen in den speicher, sonst sieht die app sie nicht
+        user_repo = memory_store.MemoryUserRepository(memory_store.store)
+        post_repo = memory_store.MemoryPostRepository(memory_store.store)
+    elif shard_map is not None: #SHARDS > 1: jeder chunk wird nach shards aufgeteilt (sharding.py)
+        user_repo = ShardedUserRepository(shard_map)
+        post_repo = ShardedPostRepository(shard_map, cache=get_cache())
+    else:
+        session = SessionLocal() #eigene session, der request ist schon längst fertig
+        user_repo = UserRepository(session)
+        post_repo = PostRepository(session, cache=get_cache()) #neue posts ändern die gecachten users
+    job.status = "running"
+    job.save()
+    try:
+        with open(path, "rb") as file_obj:
+            chunk = []
+            for line_number, record in iter_records(file_obj, job.format):
+                job.rows_read += 1
+                if isinstance(record, str):
+                    job.add_error(line_number, record)
+                    continue
+                try:
+                    data = PostCreate.model_validate(record) #gleiche regeln wie bei POST /posts
+                except ValidationError as exc:
+                    job.add_error(line_number, "; ".join(e["msg"] for e in exc.errors()))
+                    continue
+                chunk.append((line_number, Post(title=data.title, content=data.content, user_id=data.user_id)))
+                if len(chunk) >= job.chunk_size:
+                    _import_chunk(job, chunk, user_repo, post_repo)
+                    chunk = []
+                    job.save() #fortschritt für GET /posts/import/{job_id}
+            if chunk:
+                _import_chunk(job, chunk, user_repo, post_repo)
+        job.status = "done"
+    except Exception as exc: #alles was schon committed ist bleibt drin, der status sagt wo es abgebrochen ist
+        job.status = "failed"
+        job.detail = str(exc)
+    finally:
+        job.save() #zuerst den endstand, sonst bliebe der job bei einem fehler unten für immer auf "running"
+        user_repo.close()
+        post_repo.close()
+        with contextlib.suppress(OSError): #schon weg oder gesperrt: eine liegengebliebene temp datei ist egal
+            os.remove(path)
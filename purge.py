@@ -0,0 +1,288 @@
+"""
+Benutzer mit vielen posts stückweise im hintergrund löschen (DELETE /users/{id}) und posts ohne user aufräumen.
+
+    python purge.py status              # offene und fertige löschaufträge
+    python purge.py run                 # offene löschaufträge jetzt abarbeiten (z.b. wenn die app nicht läuft)
+    python purge.py orphans             # posts deren user es nicht mehr gibt (aus der zeit ohne foreign keys)
+    python purge.py orphans --delete    # ... und stückweise löschen
+"""
+import logging
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import migrations
+from cache import get_cache, user_key
+from single_flight import flights
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------
+# USER LÖSCHEN IN KLEINEN STÜCKEN
+# ----------------------------------------------------
+#früher: DELETE FROM users, die foreign keys waren aus (storage.py), ON DELETE CASCADE hat also nie gegriffen und
+#die posts blieben ohne user liegen. mit foreign_keys=ON würde sqlite sie jetzt mitlöschen, aber für einen user mit
+#100.000 posts in EINER transaktion: so lange hält sie die schreibsperre und alle anderen schreiber warten.
+#
+#deshalb (repositories._delete_user): hat der user höchstens PURGE_BATCH_SIZE posts (users.post_count, migration 7)
+#wird er sofort gelöscht, posts zuerst, alles in der transaktion des requests. sonst kommt nur ein auftrag in die
+#tabelle user_purges (migration 8) und die antwort ist 202. der PurgeRunner löscht dann pro transaktion
+#PURGE_BATCH_SIZE posts, mit PURGE_PAUSE_MS pause dazwischen, und im letzten stück den user selbst. die foreign keys
+#stimmen also zu jedem zeitpunkt.
+#bis dahin ist der user ganz normal lesbar (mit immer weniger posts), den stand gibt es unter
+#GET /users/users/{id}/purge. ein absturz verliert nichts: der auftrag steht in der db und geht beim nächsten start
+#weiter. mit mehreren workern arbeitet jeder runner an den offenen aufträgen, die stücke sind trotzdem korrekt
+#(jedes löscht nur was noch da ist)
+
+POLL_INTERVAL = 5.0 #sekunden: so oft schaut ein runner auch ohne wake() nach (aufträge aus anderen workern)
+
+_runners = [] #laufende PurgeRunner dieses prozesses (einer, mit SHARDS einer pro shard)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _status(user_id: int, state: str, posts_deleted: int, posts_remaining: int,
+            requested_at: str = None, finished_at: str = None) -> dict:
+    return {
+        "user_id": user_id,
+        "status": state, #queued, running oder done
+        "posts_deleted": posts_deleted,
+        "posts_remaining": posts_remaining,
+        "requested_at": requested_at,
+        "finished_at": finished_at,
+    }
+
+
+def deleted_status(user_id: int, posts_deleted: int) -> dict:
+    #für users die gleich im request gelöscht wurden, dafür gibt es keinen auftrag
+    return _status(user_id, "done", posts_deleted, 0)
+
+
+def read_status(conn, user_id: int):
+    #None = für diesen user gab es keinen auftrag. die restlichen posts kommen aus dem zähler, nicht aus einem count(*)
+    row = conn.exec_driver_sql("""
+        SELECT p.requested_at, p.started_at, p.finished_at, p.posts_deleted, coalesce(u.post_count, 0)
+        FROM user_purges p LEFT JOIN users u ON u.id = p.user_id
+        WHERE p.user_id = ?
+    """, (user_id,)).first()
+    if row is None:
+        return None
+    requested_at, started_at, finished_at, posts_deleted, remaining = row
+    state = "done" if finished_at is not None else "running" if started_at is not None else "queued"
+    return _status(user_id, state, posts_deleted, 0 if finished_at is not None else remaining, requested_at, finished_at)
+
+
+def queue_purge(conn, user_id: int) -> dict:
+    #ein zweites DELETE während es läuft ändert nichts. ein alter fertiger auftrag mit der gleichen id (ohne SHARDS
+    #vergibt sqlite die id des höchsten gelöschten users neu) wird zurückgesetzt
+    conn.exec_driver_sql("""
+        INSERT INTO user_purges (user_id, requested_at) VALUES (?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            requested_at = excluded.requested_at, started_at = NULL, finished_at = NULL, posts_deleted = 0
+        WHERE finished_at IS NOT NULL
+    """, (user_id, _now()))
+    return read_status(conn, user_id)
+
+
+def delete_posts(conn, user_id: int, limit: int) -> int:
+    #bis zu limit posts des users, gibt zurück wie viele es waren (auch für memory_store.py)
+    return conn.exec_driver_sql(
+        "DELETE FROM posts WHERE id IN (SELECT id FROM posts WHERE user_id = ? ORDER BY id LIMIT ?)", (user_id, limit)
+    ).rowcount
+
+
+def purge_step(conn, user_id: int, limit: int) -> bool:
+    #ein stück: bis zu limit posts des users. kommen weniger, ist er leer und der user selbst geht in der gleichen
+    #transaktion mit. True = fertig
+    deleted = delete_posts(conn, user_id, limit)
+    done = deleted < limit
+    if done:
+        conn.exec_driver_sql("DELETE FROM users WHERE id = ?", (user_id,))
+    now = _now()
+    conn.exec_driver_sql("""
+        UPDATE user_purges SET posts_deleted = posts_deleted + ?, started_at = coalesce(started_at, ?), finished_at = ?
+        WHERE user_id = ?
+    """, (deleted, now, now if done else None, user_id))
+    return done
+
+
+def has_pending(engine) -> bool:
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT EXISTS (SELECT 1 FROM user_purges WHERE finished_at IS NULL)").scalar() == 1
+
+
+def run_purges(engine, limit: int, stop: threading.Event = None, pause: float = 0.0, on_step=None) -> int:
+    #arbeitet alle offenen aufträge ab, ein stück pro transaktion. engine wie bei den migrationen (BEGIN IMMEDIATE),
+    #der nächste auftrag wird erst mit der sperre gelesen. on_step(user_id, done) nach jedem commit
+    steps = 0
+    while not (stop is not None and stop.is_set()):
+        with engine.begin() as conn:
+            user_id = conn.exec_driver_sql(
+                "SELECT user_id FROM user_purges WHERE finished_at IS NULL ORDER BY requested_at, user_id LIMIT 1"
+            ).scalar()
+            if user_id is None:
+                break
+            done = purge_step(conn, user_id, limit)
+        steps += 1
+        if done:
+            logger.info("Purge: user %d und seine posts sind gelöscht", user_id)
+        if on_step is not None:
+            on_step(user_id, done)
+        if pause:
+            time.sleep(pause)
+    return steps
+
+
+def wake():
+    #nach einem neuen auftrag: die runner nicht erst POLL_INTERVAL warten lassen
+    for runner in list(_runners):
+        runner.wake()
+
+
+class PurgeRunner:
+    #läuft im hintergrund (main.py lifespan, mit SHARDS einer pro shard). on_done(user_id): wenn ein user ganz weg ist
+    def __init__(self, engine, limit: int, pause: float, on_done=None):
+        self.engine = engine
+        self.limit = limit
+        self.pause = pause
+        self.on_done = on_done
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _after_step(self, user_id: int, done: bool):
+        #die posts-liste im cache stimmt nicht mehr und ein laufender single-flight hat noch den alten stand
+        cache = get_cache()
+        if cache is not None:
+            cache.invalidate(user_key(user_id), tags=[user_key(user_id)])
+        flights.invalidate()
+        if done and self.on_done is not None:
+            self.on_done(user_id)
+
+    def _loop(self):
+        purge_engine = migrations._migration_engine(self.engine.url)
+        try:
+            while not self._stop.is_set():
+                try:
+                    if has_pending(self.engine): #ohne auftrag nicht jedes mal die schreibsperre holen
+                        run_purges(purge_engine, self.limit, stop=self._stop, pause=self.pause, on_step=self._after_step)
+                except Exception: #z.b. "database is locked", der auftrag steht noch in der db
+                    logger.exception("Purge fehlgeschlagen, nächster versuch in %.0fs", POLL_INTERVAL)
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+        finally:
+            purge_engine.dispose()
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="user-purge", daemon=True)
+        self._thread.start()
+        _runners.append(self)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        _runners.remove(self)
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+
+# ----------------------------------------------------
+# POSTS OHNE USER (ALTE DATENBANKEN)
+# ----------------------------------------------------
+#alles was vor den foreign keys gelöscht wurde hat seine posts zurückgelassen. sie tauchen in GET /posts/{id}, der suche,
+#dem export und den summen von GET /stats auf, gehören aber niemandem mehr. neue kommen nicht mehr dazu.
+#der zähler liest nur den index (user_id, id, title), das löschen geht in id-reihenfolge stückweise wie eine
+#batch-migration (position = letzte geprüfte post id)
+
+def count_orphans(conn, limit: int = 20) -> tuple:
+    #(anzahl insgesamt, [(user_id, anzahl)] der ersten limit user_ids)
+    rows = conn.exec_driver_sql(
+        "SELECT user_id, count(*) FROM posts WHERE user_id NOT IN (SELECT id FROM users) GROUP BY user_id ORDER BY user_id"
+    ).all()
+    return sum(n for _, n in rows), [tuple(row) for row in rows[:limit]]
+
+
+def delete_orphans_batch(conn, position, limit: int) -> tuple:
+    #(neue position oder None wenn fertig, gelöschte posts)
+    rows = conn.exec_driver_sql(
+        "SELECT id FROM posts WHERE id > ? ORDER BY id LIMIT ?", (position or 0, limit)
+    ).all()
+    if not rows:
+        return None, 0
+    deleted = conn.exec_driver_sql(
+        "DELETE FROM posts WHERE id > ? AND id <= ? AND user_id NOT IN (SELECT id FROM users)",
+        (position or 0, rows[-1][0]),
+    ).rowcount
+    return rows[-1][0], deleted
+
+
+# CLI
+def main(argv=None):
+    import argparse
+    import config
+    from datenbase import engine
+    from sharding import shard_map
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Löschaufträge für users abarbeiten und posts ohne user aufräumen")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status")
+    sub.add_parser("run")
+    orphans = sub.add_parser("orphans")
+    orphans.add_argument("--delete", action="store_true", help="die gefundenen posts stückweise löschen")
+    orphans.add_argument("--show", type=int, default=20, help="so viele user_ids höchstens anzeigen")
+    args = parser.parse_args(argv)
+
+    #mit SHARDS jeder shard für sich, posts liegen immer im shard ihres users
+    engines = shard_map.engines if shard_map is not None else [engine]
+    on_step = (lambda user_id, done: done and shard_map.forget_user(user_id)) if shard_map is not None else None
+    for db in engines:
+        url = db.url
+        admin = migrations._migration_engine(url) #zum schreiben (BEGIN IMMEDIATE), gelesen wird über die normale engine
+        try:
+            if args.command == "status":
+                with db.connect() as conn:
+                    user_ids = [row[0] for row in conn.exec_driver_sql("SELECT user_id FROM user_purges ORDER BY requested_at")]
+                    purges = [read_status(conn, user_id) for user_id in user_ids]
+                for p in purges:
+                    print(f"{url.database}: user {p['user_id']} {p['status']}, {p['posts_deleted']} posts gelöscht, "
+                          f"{p['posts_remaining']} übrig (seit {p['requested_at']})")
+                if not purges:
+                    print(f"{url.database}: keine löschaufträge")
+            elif args.command == "run":
+                steps = run_purges(admin, config.PURGE_BATCH_SIZE, pause=config.PURGE_PAUSE_MS / 1000, on_step=on_step)
+                print(f"{url.database}: {steps} stücke")
+            elif args.delete:
+                position, total = None, 0
+                while True:
+                    with admin.begin() as conn:
+                        position, deleted = delete_orphans_batch(conn, position, config.PURGE_BATCH_SIZE)
+                    total += deleted
+                    if position is None:
+                        break
+                    time.sleep(config.PURGE_PAUSE_MS / 1000)
+                print(f"{url.database}: {total} posts ohne user gelöscht")
+            else:
+                with db.connect() as conn:
+                    total, by_user = count_orphans(conn, args.show)
+                for user_id, n in by_user:
+                    print(f"{url.database}: {n} posts von user {user_id}, den es nicht mehr gibt")
+                print(f"{url.database}: {total} posts ohne user" + (", löschen mit --delete" if total else ""))
+        finally:
+            admin.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
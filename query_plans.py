@@ -0,0 +1,156 @@
+"""
+Query-plan regressionscheck: führt jede heiße repository-abfrage gegen eine frische test-db aus, holt sich für jedes
+abgeschickte SQL den EXPLAIN QUERY PLAN und schlägt fehl sobald eine tabelle komplett gelesen wird (SCAN statt SEARCH).
+
+    python query_plans.py          # exit code 1 wenn ein hot query auf einen full scan zurückfällt
+                                   # oder ein index aus models.py von keiner migration angelegt wird
+    python query_plans.py -v       # zeigt alle pläne
+
+Die echte userdaten.db wird nicht angefasst.
+"""
+import os
+import re
+import sys
+import tempfile
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import models  # noqa: F401  (registriert die tabellen an Base)
+import migrations
+import purge
+from indexes import missing_indexes
+from models import User, Post
+from fields import FieldSelection
+from repositories import UserRepository, PostRepository
+from search import SearchRepository
+from stats import StatsRepository
+from storage import apply_profile
+
+#SCAN heißt die ganze tabelle (oder ein ganzer index) wird gelesen. nicht gezählt werden FTS tabellen (VIRTUAL TABLE INDEX
+#ist dort die index-suche), konstante zeilen und das ergebnis einer unterabfrage (CO-ROUTINE/MATERIALIZE)
+_SCAN = re.compile(r"\bSCAN (\w+)(.*)")
+_SUBQUERY = re.compile(r"\b(?:CO-ROUTINE|MATERIALIZE) (\w+)")
+
+# (name, aufruf, tabellen die hier ausnahmsweise gescannt werden dürfen)
+#die erste seite einer liste ist ein scan in id-reihenfolge, aber durch LIMIT nach n zeilen vorbei
+HOT_QUERIES = [
+    ("users: liste, erste seite", lambda u, p, s: u.get_all_users(limit=11), {"users"}),
+    ("users: liste, seite n", lambda u, p, s: u.get_all_users(limit=11, after_id=2), set()),
+    ("users: liste mit namensfilter", lambda u, p, s: u.get_all_users(name_filter="anna", limit=11, after_id=1), set()),
+    ("users: einzeln mit posts", lambda u, p, s: u.get_user_by_id(1), set()),
+    ("users: liste ?fields=id,name,posts.title", lambda u, p, s: u.get_all_users(
+        limit=11, after_id=0, fields=FieldSelection(("id", "name"), ("id", "title"))), set()),
+    ("users: einzeln ?fields=name", lambda u, p, s: u.get_user_by_id(1, fields=FieldSelection(("name",))), set()),
+    ("users: nur version (If-None-Match)", lambda u, p, s: u.get_user_version(1), set()),
+    ("users: existiert", lambda u, p, s: u.user_exists(1), set()),
+    ("users: existierende ids", lambda u, p, s: u.get_existing_user_ids([1, 2, 99]), set()),
+    ("users: update", lambda u, p, s: u.update_user(User(name="Anna Neu", email="anna.neu@example.com", user_id=1)), set()),
+    ("users: update mit If-Match", lambda u, p, s: u.update_user(User(name="Anna", email="anna@example.com", user_id=1), [u.get_user_version(1)]), set()),
+    ("users: delete", lambda u, p, s: u.delete_user(3), set()),
+    ("users: löschauftrag + status", lambda u, p, s: purge.queue_purge(s.session.connection(), 2), set()),
+    ("users: löschauftrag, ein stück", lambda u, p, s: purge.purge_step(s.session.connection(), 2, 5), set()),
+    ("posts: einzeln", lambda u, p, s: p.get_post_by_id(1), set()),
+    ("posts: nur version (If-None-Match)", lambda u, p, s: p.get_post_version(1), set()),
+    ("posts: liste eines users, erste seite", lambda u, p, s: p.get_posts_by_user_id(1, limit=11), set()),
+    ("posts: liste eines users, seite n", lambda u, p, s: p.get_posts_by_user_id(1, limit=11, after_id=1), set()),
+    ("posts: liste eines users ?fields=id,title", lambda u, p, s: p.get_posts_by_user_id(
+        1, limit=11, fields=FieldSelection(("id", "title"))), set()),
+    ("posts: update", lambda u, p, s: p.update_post(Post(title="Neu", content="neu", user_id=1, post_id=1)), set()),
+    ("posts: delete", lambda u, p, s: p.delete_post(2), set()),
+    ("suche: users", lambda u, p, s: s.search_users("anna", limit=11), set()),
+    ("suche: posts", lambda u, p, s: s.search_posts("datenbank", limit=11, after=(-1.0, 1)), set()),
+    #GET /stats: die zahl der users liest einen ganzen (kleinen) index, das histogramm hat nur ein paar zeilen,
+    #top-N läuft den index (post_count DESC, id) ab und hört nach LIMIT auf
+    ("stats: summen", lambda u, p, s: StatsRepository(s.session).totals(), {"users", "post_length_histogram"}),
+    ("stats: top autoren", lambda u, p, s: StatsRepository(s.session).top_authors(10), {"users"}),
+    ("stats: top autoren nach bytes", lambda u, p, s: StatsRepository(s.session).top_authors(10, "bytes"), {"users"}),
+    ("stats: längen-histogramm", lambda u, p, s: StatsRepository(s.session).post_lengths(), {"post_length_histogram"}),
+]
+
+
+def _seed(session_factory):
+    session = session_factory()
+    users = UserRepository(session)
+    users.save_users_bulk([
+        User(name="Anna Müller", email="anna@example.com"),
+        User(name="Bernd Nanna", email="bernd@example.com"),
+        User(name="Carla", email="carla@example.com"),
+    ])
+    PostRepository(session).save_posts_bulk([
+        Post(title=f"Datenbank {i}", content="SQLite Datenbank Inhalt", user_id=1 + i % 3) for i in range(30)
+    ])
+    session.close()
+
+
+def collect_plans(engine):
+    session_factory = sessionmaker(bind=engine)
+    _seed(session_factory)
+
+    captured = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")) and not executemany:
+            captured.append((statement, parameters))
+
+    results = []
+    for name, call, allowed in HOT_QUERIES:
+        session = session_factory()
+        captured.clear()
+        call(UserRepository(session), PostRepository(session), SearchRepository(session))
+        statements = list(captured)
+        session.close()
+
+        with engine.connect() as conn:
+            for statement, parameters in statements:
+                plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+                results.append((name, statement, [row[-1] for row in plan], allowed))
+
+    event.remove(engine, "before_cursor_execute", _capture)
+    return results
+
+
+def find_full_scans(results):
+    failures = []
+    for name, statement, plan, allowed in results:
+        subqueries = {m.group(1) for detail in plan for m in _SUBQUERY.finditer(detail)}
+        for detail in plan:
+            match = _SCAN.search(detail)
+            if match is None:
+                continue
+            target, rest = match.groups()
+            if target == "CONSTANT" or "VIRTUAL TABLE" in rest or target in subqueries or target in allowed:
+                continue
+            failures.append((name, statement, detail))
+    return failures
+
+
+def main(argv=None):
+    verbose = "-v" in (argv if argv is not None else sys.argv[1:])
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'plans.db')}")
+        apply_profile(engine, "legacy") #keine pragmas, aber post_text() für die migrationen 6 und 7
+        migrations.upgrade(engine) #das schema genau so wie es die migrationen bauen
+        migrations.startup(engine)
+        missing = [index.name for index in missing_indexes(engine)]
+
+        results = collect_plans(engine)
+        failures = find_full_scans(results)
+        engine.dispose()
+
+    for name in missing:
+        print(f"INDEX FEHLT: {name} steht in models.py, aber keine migration legt ihn an")
+    if verbose:
+        for name, statement, plan, _ in results:
+            print(f"--- {name}\n{' '.join(statement.split())}")
+            for detail in plan:
+                print(f"    {detail}")
+    for name, statement, detail in failures:
+        print(f"FULL SCAN in '{name}': {detail}\n    {' '.join(statement.split())}")
+    print(f"{len(results)} statements geprüft, {len(failures)} full scans")
+    return 1 if failures or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
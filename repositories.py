@@ -1,17 +1,217 @@
-from sqlalchemy.orm import Session, joinedload
+import time
+
+from sqlalchemy.orm import Session, joinedload, selectinload, undefer
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from search import name_filter_clause
+from fields import user_options, post_options
+from cache import user_key, post_key, snapshot_user, user_size, post_size
 from models import UserModel, PostModel, User, Post  # Wir brauchen die Baupläne
+from content_codec import content_columns
+from versioning import VersionMismatch
+from metrics import metrics
+import config
+import purge
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError 
 
 
 
+# ----------------------------------------------------
+# SCHREIB-OPERATIONEN (ohne commit)
+# ----------------------------------------------------
+#jede op bekommt eine session, ändert etwas und gibt nur einfache werte zurück (keine ORM objekte)
+#so kann sie entweder direkt mit eigenem commit laufen oder im group-commit writer (write_queue.py) mit anderen zusammen
+
+def _insert_user(session, name, email, user_id=None):
+    db_model = UserModel(id=user_id, name=name, email=email) #user_id=None: die db vergibt sie, mit shards kommt sie vom IdAllocator
+    session.add(db_model)
+    session.flush() #flush schickt das INSERT ab, danach kennt db_model seine id (ohne extra SELECT)
+    return db_model.id
+
+#die update-ops sind EIN "UPDATE ... RETURNING", kein vorheriges SELECT. mit versions (aus If-Match) steht die
+#erwartete version mit im WHERE, passt sie nicht kommt keine zeile zurück
+def _versioned_update(session, model, entity_id, values, versions, returning):
+    stmt = update(model).where(model.id == entity_id)
+    if versions is not None:
+        stmt = stmt.where(model.version.in_(versions))
+    stmt = stmt.values(**values, version=model.version + 1).returning(*returning)
+    row = session.execute(stmt, execution_options={"synchronize_session": False}).first()
+    if row is None and versions is not None and session.get(model, entity_id) is not None:
+        raise VersionMismatch(f"{model.__tablename__} {entity_id} hat eine andere Version")
+    return row
+
+def _update_user(session, user_id, name, email, versions=None):
+    row = _versioned_update(session, UserModel, user_id, {"name": name, "email": email}, versions, [UserModel.version])
+    return None if row is None else row.version #neue version, None = user gibt es nicht
+
+#None = user gibt es nicht, sonst der stand aus purge.py. bis PURGE_BATCH_SIZE posts wird gleich gelöscht, posts zuerst
+#(mit foreign_keys=ON würde die cascade das auch machen, mit dem legacy profil nicht). mehr posts: nur der auftrag,
+#gelöscht wird stückweise im hintergrund und der aufrufer muss purge.wake() nach dem commit machen
+def _delete_user(session, user_id):
+    post_count = session.execute(select(UserModel.post_count).where(UserModel.id == user_id)).scalar()
+    if post_count is None:
+        return None
+    if post_count > config.PURGE_BATCH_SIZE:
+        return purge.queue_purge(session.connection(), user_id)
+    session.query(PostModel).filter_by(user_id=user_id).delete(synchronize_session=False)
+    session.query(UserModel).filter_by(id=user_id).delete(synchronize_session=False)
+    return purge.deleted_status(user_id, post_count)
+
+#bulk-anlage von usern (sync und async): ein Core INSERT direkt auf die tabelle, die zeilen sind einfache dicts. über das
+#ORM (sqlite_insert(UserModel)) lief jede zeile noch durch die bulk-maschinerie der session, das war pro zeile teurer als
+#das INSERT selbst. ON CONFLICT DO NOTHING: eine vergebene email bricht nicht den ganzen chunk ab, die zeile fehlt nur
+#im RETURNING
+_user_table = UserModel.__table__
+USERS_BULK_INSERT = sqlite_insert(_user_table).on_conflict_do_nothing(index_elements=[_user_table.c.email]).returning(
+    _user_table.c.id, _user_table.c.email
+)
+
+def _split_duplicate_emails(user_objs: list):
+    #doppelte emails innerhalb der anfrage selbst gehen gar nicht erst zur db -> (zu speichern, konflikte)
+    seen_emails = set()
+    pending, conflicts = [], []
+    for index, user_obj in enumerate(user_objs):
+        if user_obj.email in seen_emails:
+            conflicts.append((index, user_obj.email))
+        else:
+            seen_emails.add(user_obj.email)
+            pending.append((index, user_obj))
+    return pending, conflicts
+
+def _bulk_user_rows(chunk: list) -> list:
+    return [{"id": u.id, "name": u.name, "email": u.email} for _, u in chunk] #id None = von der db vergeben
+
+def _assign_bulk_ids(chunk: list, rows, created: list, conflicts: list):
+    #was nicht im RETURNING steht hatte eine schon vergebene email
+    ids_by_email = {email: user_id for user_id, email in rows}
+    for index, user_obj in chunk:
+        if user_obj.email in ids_by_email:
+            user_obj.id = ids_by_email[user_obj.email]
+            created.append((index, user_obj))
+        else:
+            conflicts.append((index, user_obj.email))
+
+#content_columns: packt den text und setzt search_text/content_bytes dazu, die lesen die triggers (content_codec.py)
+def _post_row(title, content, user_id, post_id=None) -> dict:
+    return {"id": post_id, "title": title, "user_id": user_id, **content_columns(content)}
+
+def _insert_post(session, title, content, user_id, post_id=None):
+    db_model = PostModel(**_post_row(title, content, user_id, post_id))
+    session.add(db_model)
+    session.flush()
+    return db_model.id
+
+#die post-ops geben die user_id des autors zurück (None = post gibt es nicht), damit der cache dessen posts-liste rauswerfen kann
+def _update_post(session, post_id, title, content, versions=None):
+    row = _versioned_update(
+        session, PostModel, post_id, {"title": title, **content_columns(content)}, versions, [PostModel.user_id, PostModel.version]
+    )
+    return None if row is None else (row.user_id, row.version)
+
+def _delete_post(session, post_id):
+    db_post = session.get(PostModel, post_id)
+    if db_post is None:
+        return None
+    session.delete(db_post)
+    session.flush()
+    return db_post.user_id
+
+
+# ----------------------------------------------------
+# LESE-ABFRAGEN (sync und async)
+# ----------------------------------------------------
+#die statements baut nur dieser teil, UserRepository/PostRepository hier und die async repositories
+#(async_repositories.py) führen sie nur aus. so können die beiden stacks nicht mehr auseinanderlaufen
+
+def _users_page_stmt(name_filter=None, limit: int = None, after_id: int = None, fields=None):
+    stmt = select(UserModel)
+    if fields is not None:
+        stmt = stmt.options(*user_options(fields)) #?fields=...: nur diese spalten, posts per selectinload (fields.py)
+    if name_filter:
+        stmt = stmt.where(name_filter_clause(name_filter)) #mit FTS5 über den trigram index, sonst ilike (siehe search.py)
+    if after_id is not None:
+        stmt = stmt.where(UserModel.id > after_id) #keyset: wir springen über den primary key direkt hinter die letzte seite
+    stmt = stmt.order_by(UserModel.id) #ohne feste reihenfolge wäre der cursor sinnlos
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def _user_detail_stmt(user_id: int, fields=None):
+    if fields is not None: #nur die gefragten spalten (+ version für den ETag)
+        return select(UserModel).options(*user_options(fields, UserModel.version)).filter_by(id=user_id)
+    # joinedload sorgt dafür, dass die Posts im "Rucksack" mitkommen (eine abfrage). beim ausführen unique(),
+    #sonst kommt der user einmal pro post
+    return select(UserModel).options(joinedload(UserModel.posts).undefer(PostModel.content)).filter_by(id=user_id)
+
+def _existing_user_ids_stmt(user_ids):
+    return select(UserModel.id).where(UserModel.id.in_(set(user_ids)))
+
+def _user_version_stmt(user_id: int):
+    return select(UserModel.version).where(UserModel.id == user_id)
+
+def _post_load_options(fields=None) -> list:
+    #für session.get: content ist deferred (models.py), ohne fields gehört er zur antwort
+    return post_options(fields, PostModel.version) if fields is not None else [undefer(PostModel.content)]
+
+def _posts_page_stmt(user_id: int, limit: int = None, after_id: int = None, fields=None):
+    stmt = select(PostModel).where(PostModel.user_id == user_id)
+    #mit fields nur die gefragten spalten, content also nur wenn er gefragt ist
+    stmt = stmt.options(*post_options(fields)) if fields is not None else stmt.options(undefer(PostModel.content))
+    if after_id is not None:
+        stmt = stmt.where(PostModel.id > after_id)
+    stmt = stmt.order_by(PostModel.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def _post_version_stmt(post_id: int):
+    return select(PostModel.version).where(PostModel.id == post_id)
+
+def _users_with_posts_stmt():
+    #selectinload statt joinedload: die posts kommen in "WHERE user_id IN (...)" abfragen nach, joinedload würde
+    #jede user-zeile so oft schicken wie der user posts hat
+    return select(UserModel).options(selectinload(UserModel.posts).undefer(PostModel.content))
+
+def _to_user(db_user) -> User:
+    return User(name=db_user.name, email=db_user.email, user_id=db_user.id)
+
+def _to_post(db_post, with_version: bool = False) -> Post:
+    return Post(title=db_post.title, content=db_post.content, user_id=db_post.user_id, post_id=db_post.id,
+                version=db_post.version if with_version else None)
+
+#executemany-insert für viele posts, die ids kommen mit (None = von der db, mit SHARDS vom IdAllocator)
+POSTS_BULK_INSERT = insert(PostModel)
+
+def _bulk_post_rows(post_objs: list) -> list:
+    return [_post_row(p.title, p.content, p.user_id, p.id) for p in post_objs]
+
+
+def _run_write(session, writer, op, *args):
+    #mit writer: op wird in die queue gestellt und wir warten auf das ergebnis nach dem gemeinsamen commit
+    if writer is not None:
+        return writer.run(op, *args)
+    start = time.perf_counter()
+    try:
+        result = op(session, *args)
+        session.commit()
+        return result
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        metrics.observe_write(time.perf_counter() - start) #zählt nur wenn es so lange gedauert hat dass es auf die sperre warten musste
+
+
 # ----------------------------------------------------
 # 3. REPOSITORIES (Küchenchefs)
 # ----------------------------------------------------
 
 # REPOSITORY FÜR USER (Hier nur gekürzt, ist in deinem Code enthalten)
 class UserRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, writer=None, cache=None):
         self.session = db
+        self.writer = writer #GroupCommitWriter oder None (dann committet jede op selbst)
+        self.cache = cache #EntityCache oder None (dann geht jedes get_user_by_id an die db)
 
     def close(self):
         self.session.close()
@@ -19,71 +219,122 @@ class UserRepository:
     # CRUD: CREATE (POST)
     def save_user(self, user_obj: User): # Das ": User" ist der Hinweis, user_obj ist nur ein Platzhalter 
         try:
-            db_model = UserModel(name=user_obj.name, email=user_obj.email)
-            self.session.add(db_model)
-            self.session.commit() #erst commit dann ergibt sich die id für user_obj weil die db dann erst die id vergibt 
-            user_obj.id = db_model.id #das logic Objekt hat nun eine id welche nach commit() automatisch von der db zugewiesen wurde, also ist nicht mehr none
+            #das logic Objekt bekommt die id welche beim INSERT von der db vergeben wurde, also ist sie nicht mehr none
+            user_obj.id = _run_write(self.session, self.writer, _insert_user, user_obj.name, user_obj.email, user_obj.id)
             return user_obj #ist das logic Objekt jetzt mit eigener Id nicht mehr none
         except IntegrityError: #wenn Email nicht Unique ist 
-            self.session.rollback()
             return None
         except SQLAlchemyError: #allgemeiner fehler 
-            self.session.rollback()
             return None
 
+    # CRUD: CREATE (VIELE AUF EINMAL)
+    #save_user macht pro user einen commit (= ein fsync) und danach noch ein SELECT für die id
+    #hier geht pro chunk EIN insert mit RETURNING raus und EIN commit, die ids kommen direkt aus dem insert zurück
+    def save_users_bulk(self, user_objs: list, chunk_size: int = 500):
+        created = [] #(index, User) mit vergebener id
+        pending, conflicts = _split_duplicate_emails(user_objs) #conflicts: (index, email) wo die email schon vergeben ist
+
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            try:
+                rows = self.session.execute(USERS_BULK_INSERT, _bulk_user_rows(chunk)).all()
+                self.session.commit()
+            except SQLAlchemyError:
+                self.session.rollback()
+                raise
+            _assign_bulk_ids(chunk, rows, created, conflicts)
+
+        conflicts.sort()
+        return created, conflicts
+
     # CRUD: READ (ALLE MIT FILTER)
-    def get_all_users(self, name_filter=None): #none heißt einfach das es standartmäßig alle nutzer anzeigt es dient als Platzhalter für Namen
-        query = self.session.query(UserModel)
-        #query ist eine Anfrage/Abfrage, indem fall wird in die Tabelle von UserModel mit allen Spalten geschaut
-        if name_filter:
-            query = query.filter(UserModel.name.ilike(f'%{name_filter}%')) #ilike ist eine suche, das i heißt das es groß und Kleinschreibung ignoriert
-            #die % nach ilike heißt egal wo diese folgenden silben vorkommen(hinten/vorne etc.) du zeigst mir dann immer den gesamten Namen 
-        db_users = query.all() #hier sehen wir dann alle user nicht nur die mit dem filter 
+    def get_all_users(self, name_filter=None, limit: int = None, after_id: int = None, fields=None): #none heißt einfach das es standartmäßig alle nutzer anzeigt es dient als Platzhalter für Namen
+        #die abfrage (filter, keyset, reihenfolge) baut _users_page_stmt, die gleiche wie im async repository
+        db_users = self.session.execute(_users_page_stmt(name_filter, limit, after_id, fields)).scalars().all()
+        if fields is not None:
+            return db_users #die ORM objekte direkt, eine kopie würde die nicht geladenen spalten einzeln nachladen
         
-        #es gibt uns eine Liste aus Logic Objekten zurück mithilfe von query.all() was alle Objekte der Spalte von UserModel durchgeht
-        return [
-            User(name=db_user.name, email=db_user.email, user_id=db_user.id)
-            for db_user in db_users
-        ] 
+        #es gibt uns eine Liste aus Logic Objekten zurück
+        return [_to_user(db_user) for db_user in db_users]
 
     # CRUD: READ (EINZELN)
-    def get_user_by_id(self, user_id: int):
-            # joinedload sorgt dafür, dass die Posts im "Rucksack" mitkommen
-            return self.session.query(UserModel).options(
-                joinedload(UserModel.posts) #hiermit sagen wir das wir zusätzlich mit nur einer db anfrage auch die Post des users zur verfügung haben möchten
-            ).filter_by(id=user_id).first()
+    def get_user_by_id(self, user_id: int, fields=None):
+            if self.cache is not None:
+                cached = self.cache.get(user_key(user_id))
+                if cached is not None:
+                    return cached
+                token = self.cache.begin_load()
+            if fields is not None: #so ein teil-objekt kommt nicht in den cache
+                return self.session.execute(_user_detail_stmt(user_id, fields)).scalars().first()
+            #mit den posts in einer abfrage (joinedload), unique() weil die user-zeile pro post einmal kommt
+            db_user = self.session.execute(_user_detail_stmt(user_id)).unique().scalars().first()
+            if self.cache is None or db_user is None:
+                return db_user
+            user = snapshot_user(db_user) #kopie ohne session, die darf im cache liegen
+            self.cache.put(user_key(user_id), user, user_size(user), token=token)
+            return user
     
+    # READ: welche dieser ids gibt es wirklich? (EINE IN-abfrage statt get_user_by_id pro id)
+    def get_existing_user_ids(self, user_ids) -> set:
+        if not user_ids:
+            return set()
+        return set(self.session.execute(_existing_user_ids_stmt(user_ids)).scalars())
+
     # CRUD: UPDATE (PUT)
-    def update_user(self, user_obj): #Platzhalter user_obj
-        db_user = self.session.query(UserModel).filter_by(id=user_obj.id).first()
-        
-        if db_user:
-            #hier findet die Überschreibung statt
-            #db_user.name etc ist möglich weil wir eine Zeile aus UserModel genommen haben und diese zeile kann nun nach belieben verändert werden
-            db_user.name = user_obj.name
-            db_user.email = user_obj.email
-            
-            try:
-                self.session.commit()
-                return user_obj
-            except IntegrityError:
-                self.session.rollback()
-                return None
-            except SQLAlchemyError:
-                self.session.rollback()
-                return None
-        return None
+    def update_user(self, user_obj, expected_versions=None): #Platzhalter user_obj
+        #die Überschreibung der Zeile aus UserModel findet in _update_user statt
+        #expected_versions kommt aus If-Match, passt die version nicht wird VersionMismatch geworfen
+        try:
+            new_version = _run_write(
+                self.session, self.writer, _update_user, user_obj.id, user_obj.name, user_obj.email, expected_versions
+            )
+        except IntegrityError:
+            return None
+        except VersionMismatch:
+            raise
+        except SQLAlchemyError:
+            return None
+        if new_version is None:
+            return None
+        if self.cache is not None:
+            self.cache.invalidate(user_key(user_obj.id))
+        user_obj.version = new_version
+        return user_obj
+
+    # READ: nur die version (für If-None-Match reicht das, der ganze user muss nicht geladen werden)
+    def get_user_version(self, user_id: int):
+        if self.cache is not None:
+            cached = self.cache.get(user_key(user_id))
+            if cached is not None:
+                return cached.version
+        return self.session.execute(_user_version_stmt(user_id)).scalar()
+
+    # READ: gibt es den user? (ein primary key lookup, get_user_by_id würde alle seine posts mitladen)
+    def user_exists(self, user_id: int) -> bool:
+        return self.get_user_version(user_id) is not None
 
     # CRUD: DELETE
     def delete_user(self, user_id):
-        rows_deleted = self.session.query(UserModel).filter_by(id=user_id).delete() #gibt 1 für es wurde was gelöscht und 0 für es wurde nichts gelöscht
-        self.session.commit()
-        return rows_deleted > 0 #Trich wenn rows_deleted wahr ist ist es eins und es gibt als return wert True zurück wenn nicht False
+        #None = user gibt es nicht, sonst {"status": "done"} oder "queued" wenn er im hintergrund gelöscht wird (purge.py)
+        result = _run_write(self.session, self.writer, _delete_user, user_id)
+        if result is None:
+            return None
+        if self.cache is not None:
+            self.cache.invalidate(user_key(user_id), tags=[user_key(user_id)]) #den user und alle seine posts
+        if result["status"] != "done":
+            purge.wake()
+        return result
+
+    # READ: stand eines löschauftrags, None = es gab keinen
+    def get_purge_status(self, user_id: int):
+        return purge.read_status(self.session.connection(), user_id)
 
 # REPOSITORY FÜR POSTS (GANZ NEU: Post-CRUD)
 class PostRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, writer=None, cache=None):
         self.session = db
+        self.writer = writer
+        self.cache = cache
 
     def close(self):
         self.session.close()
@@ -91,67 +342,92 @@ class PostRepository:
     # CRUD: CREATE (POST)
     def save_post(self, post_obj: Post):
         try:
-            db_model = PostModel(
-                title=post_obj.title, 
-                content=post_obj.content, 
-                user_id=post_obj.user_id # Hier wird die Beziehung hergestellt
+            post_obj.id = _run_write(
+                self.session, self.writer, _insert_post,
+                post_obj.title, post_obj.content, post_obj.user_id, post_obj.id # Hier wird die Beziehung hergestellt
             )
-            self.session.add(db_model)
-            self.session.commit()
-            post_obj.id = db_model.id
+            if self.cache is not None:
+                self.cache.invalidate(user_key(post_obj.user_id)) #die posts-liste des autors hat sich geändert
             return post_obj
         except IntegrityError: # Fängt Foreign Key Fehler ab (user_id existiert nicht)
-            self.session.rollback()
             return None
         except Exception:
-            self.session.rollback()
             return None
             
+    # CRUD: CREATE (VIELE AUF EINMAL)
+    #ein executemany-insert und ein commit für die ganze liste, die user_ids müssen vorher geprüft sein
+    def save_posts_bulk(self, post_objs: list) -> int:
+        if not post_objs:
+            return 0
+        try:
+            self.session.execute(POSTS_BULK_INSERT, _bulk_post_rows(post_objs))
+            self.session.commit()
+        except SQLAlchemyError:
+            self.session.rollback()
+            raise
+        if self.cache is not None:
+            self.cache.invalidate(*{user_key(p.user_id) for p in post_objs})
+        return len(post_objs)
+
     # CRUD: READ (EINZELN)
-    def get_post_by_id(self, post_id: int):
-        db_post = self.session.get(PostModel, post_id)
-        if db_post is None:
-            return None
-        return Post(
-            title=db_post.title, content=db_post.content, user_id=db_post.user_id, post_id=db_post.id
-        )
+    def get_post_by_id(self, post_id: int, fields=None):
+        if self.cache is not None:
+            cached = self.cache.get(post_key(post_id))
+            if cached is not None:
+                return cached
+            token = self.cache.begin_load()
+        db_post = self.session.get(PostModel, post_id, options=_post_load_options(fields))
+        if fields is not None or db_post is None:
+            return db_post
+        post = _to_post(db_post, with_version=True)
+        if self.cache is not None:
+            self.cache.put(post_key(post_id), post, post_size(post), tags=[user_key(post.user_id)], token=token)
+        return post
 
     # CRUD: READ (ALLE POSTS EINES USERS)
-    def get_posts_by_user_id(self, user_id: int):
-        posts = self.session.query(PostModel).filter(PostModel.user_id == user_id).all()
-        return [
-            Post(title=p.title, content=p.content, user_id=p.user_id, post_id=p.id)
-            for p in posts
-        ]
+    def get_posts_by_user_id(self, user_id: int, limit: int = None, after_id: int = None, fields=None):
+        posts = self.session.execute(_posts_page_stmt(user_id, limit, after_id, fields)).scalars().all()
+        if fields is not None:
+            return posts
+        return [_to_post(p) for p in posts]
         
     # CRUD: UPDATE (PUT)
-    def update_post(self, post_obj: Post):
-        db_post = self.session.get(PostModel, post_obj.id)
-        if db_post is None:
-            return None
-        db_post.title = post_obj.title
-        db_post.content = post_obj.content
+    def update_post(self, post_obj: Post, expected_versions=None):
         try:
-            self.session.commit()
-            return post_obj
+            result = _run_write(
+                self.session, self.writer, _update_post, post_obj.id, post_obj.title, post_obj.content, expected_versions
+            )
+        except VersionMismatch:
+            raise
         except Exception:
-            self.session.rollback()
             return None
+        if result is None:
+            return None
+        author_id, post_obj.version = result
+        if self.cache is not None:
+            self.cache.invalidate(post_key(post_obj.id), user_key(author_id))
+        return post_obj
+
+    # READ: nur die version (für If-None-Match)
+    def get_post_version(self, post_id: int):
+        if self.cache is not None:
+            cached = self.cache.get(post_key(post_id))
+            if cached is not None:
+                return cached.version
+        return self.session.execute(_post_version_stmt(post_id)).scalar()
 
     # CRUD: DELETE
     def delete_post(self, post_id: int):
-        db_post = self.session.get(PostModel, post_id)
-        if db_post is None:
-            return False
         try:
-            self.session.delete(db_post)
-            self.session.commit()
-            return True
+            author_id = _run_write(self.session, self.writer, _delete_post, post_id)
         except Exception:
-            self.session.rollback()
             return False
+        if author_id is None:
+            return False
+        if self.cache is not None:
+            self.cache.invalidate(post_key(post_id), user_key(author_id))
+        return True
     #um n + 1 Problem zu beheben da die seite sonnst langsam ist
     def get_all_users_with_posts(self):
-        # Wir sagen: Query UserModel, aber lade die 'posts' sofort mit!
-        users = self.session.query(UserModel).options(joinedload(UserModel.posts)).all()
-        return users
+        # Wir sagen: Query UserModel, aber lade die 'posts' sofort mit! (siehe _users_with_posts_stmt)
+        return self.session.execute(_users_with_posts_stmt()).scalars().all()
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+
+from cache import entity_cache
+
+router = APIRouter(
+    prefix="/cache",
+    tags=["Cache"]
+)
+
+# GET /cache/stats (Treffer, Fehlschläge, rausgeworfene Einträge...)
+@router.get("/stats", summary="Zähler des User/Post Caches", tags=["Cache"])
+def cache_stats():
+    return entity_cache.stats()
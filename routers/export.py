@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from export import EXPORT_TABLES, EXPORT_FORMATS, MEDIA_TYPES, iter_export
+
+router = APIRouter(
+    prefix="/export",
+    tags=["Export"]
+)
+
+# GET /export/{table}?format=ndjson|csv
+@router.get("/{table}", summary="Ganze Tabelle als NDJSON/CSV streamen", tags=["Export"])
+def export_table(table: str, format: str = Query("ndjson")):
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Tabelle '{table}' kann nicht exportiert werden.")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format '{format}' wird nicht unterstützt (ndjson oder csv).")
+
+    #StreamingResponse holt sich die chunks erst beim senden aus dem generator, es liegt nie alles im speicher
+    return StreamingResponse(
+        iter_export(table, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'},
+    )
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from metrics import metrics
+
+router = APIRouter(
+    tags=["Monitoring"]
+)
+
+# GET /metrics (Prometheus textformat, für den scraper, nicht für menschen)
+@router.get("/metrics", response_class=PlainTextResponse, summary="Metriken im Prometheus Format", tags=["Monitoring"])
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,23 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Header, HTTPException, Query, Response, UploadFile, status
 from sqlalchemy.orm import Session
 from typing import List # Wichtig für Listen-Rückgaben
 from fastapi.responses import JSONResponse
+import shutil
+import tempfile
 
 # Eigene Imports
 from datenbase import get_db
 from repositories import UserRepository, PostRepository # Beide importieren!
-from schemas import PostResponse, PostCreate             # Deine Siebe
+from cache import get_cache                         # Read-Through-Cache (optional)
+from write_queue import get_writer                       # Group-Commit (optional)
+from schemas import PostResponse, PostCreate, PostPage, ImportStatusResponse   # Deine Siebe
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, get_after_id, make_page
+from fast_json import post_page_response
+from fields import FieldSelection, get_post_fields, post_model, item_response, page_response # ?fields=... (sparse fieldsets)
+import config
+import sharding
+import memory_store
+import post_import
 from models import Post                                  # Deine Logik-Klasse
+from versioning import make_etag, etag_matches, expected_versions, VersionMismatch
+from single_flight import shared_response                # gleichzeitige gleiche GETs teilen sich eine abfrage
 
 router = APIRouter(
     prefix="/posts",
     tags=["Posts"]
 )
 def get_post_repo(db: Session = Depends(get_db)):
-    return PostRepository(db)
+    return PostRepository(db, writer=get_writer(), cache=get_cache())
 
 def get_user_repo(db: Session = Depends(get_db)):
-    return UserRepository(db)
+    return UserRepository(db, writer=get_writer(), cache=get_cache())
+
+if sharding.shard_map is not None: #SHARDS > 1: posts liegen beim shard ihres users
+    get_post_repo = sharding.get_post_repo
+    get_user_repo = sharding.get_user_repo
+if memory_store.store is not None: #MEMORY_STORE: alles aus dem speicher
+    get_post_repo = memory_store.get_post_repo
+    get_user_repo = memory_store.get_user_repo
 
 # --- POST ENDPUNKTE (GANZ NEU: Post-CRUD) ---
 
@@ -28,8 +48,7 @@ def create_post(post_data: PostCreate,
                 user_repo: UserRepository = Depends(get_user_repo)): # Zweites Repo dazu!
     
     # Check: Gibt es den User?
-    user = user_repo.get_user_by_id(post_data.user_id)
-    if not user:
+    if not user_repo.user_exists(post_data.user_id): #nur die id prüfen, die posts des users brauchen wir hier nicht
         raise HTTPException(
             status_code=404, 
             detail=f"Abbruch: User mit ID {post_data.user_id} existiert nicht. Ein Geist kann keine Posts schreiben!"
@@ -38,58 +57,110 @@ def create_post(post_data: PostCreate,
     post_obj = Post(title=post_data.title, content=post_data.content, user_id=post_data.user_id)
     return post_repo.save_post(post_obj)
 
+# POST /posts/import (Datei mit vielen Posts, läuft im Hintergrund)
+@router.post("/posts/import", response_model=ImportStatusResponse, status_code=202, summary="Beiträge aus NDJSON/CSV importieren", tags=["Beiträge"])
+def import_posts(background_tasks: BackgroundTasks,
+                 file: UploadFile = File(...),
+                 format: str | None = Query(None, description="ndjson oder csv, sonst anhand der Dateiendung"),
+                 chunk_size: int = Query(post_import.DEFAULT_CHUNK_SIZE, ge=1, le=50000)):
+
+    fmt = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    if fmt not in post_import.IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format '{fmt}' wird nicht unterstützt (ndjson oder csv).")
+
+    #die hochgeladene datei ist nach dem request weg, also kopieren wir sie stückweise in eine temp datei
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{fmt}") as tmp:
+        shutil.copyfileobj(file.file, tmp)
+
+    job = post_import.create_job(fmt, chunk_size)
+    background_tasks.add_task(post_import.run_import, job, tmp.name) #läuft erst nachdem die antwort raus ist
+    return job
+
+# GET /posts/import/{job_id}
+@router.get("/posts/import/{job_id}", response_model=ImportStatusResponse, summary="Status eines Imports abrufen", tags=["Beiträge"])
+def get_import_status(job_id: str):
+    job = post_import.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Import-Job {job_id} not found.")
+    return job
+
 # GET /posts/{post_id}
 @router.get("/posts/{post_id}", response_model=PostResponse, summary="Einzelnen Beitrag abrufen", tags=["Beiträge"])
-def get_post(post_id: int, repo: PostRepository = Depends(get_post_repo)):
-   
-    post = repo.get_post_by_id(post_id)
-    
+def get_post(post_id: int,
+             if_none_match: str | None = Header(None),
+             fields: FieldSelection | None = Depends(get_post_fields),
+             repo: PostRepository = Depends(get_post_repo)):
+    variant = fields.etag_variant if fields is not None else None #teil-antworten haben einen eigenen ETag
+    if if_none_match:
+        version = repo.get_post_version(post_id)
+        if version is not None and etag_matches(if_none_match, make_etag("post", post_id, version, variant)):
+            return Response(status_code=304, headers={"ETag": make_etag("post", post_id, version, variant)})
+
+    def build():
+        post = repo.get_post_by_id(post_id, fields=fields)
+        if post is None:
+            raise HTTPException(status_code=404, detail=f"Post with ID {post_id} not found")
+        headers = {"ETag": make_etag("post", post.id, post.version, variant)}
+        return item_response(post_model(fields) if fields is not None else PostResponse, post, headers)
+
+    if config.SINGLE_FLIGHT:
+        return shared_response("post", (post_id, fields and fields.key), build)
+    return build()
 
-    if post is None:
-        raise HTTPException(status_code=404, detail=f"Post with ID {post_id} not found")
-
-    return post
-    
 # GET /users/{user_id}/posts (Alle Posts eines Autors) #das users ist das Objekt und die user_id wo gesucht werden soll = Hauptressource
-@router.get("/users/{user_id}/posts", response_model=List[PostResponse], summary="Alle Beiträge eines Benutzers abrufen", tags=["Beiträge"])
-def get_user_posts(user_id: int, user_repo: UserRepository = Depends(get_user_repo), post_repo: PostRepository = Depends(get_post_repo)):
-    # ----------------------------------------------------
-    # 1. PRÜFUNG: Existiert die Hauptressource (User)?
-    # ----------------------------------------------------
-    
-    user_exists = user_repo.get_user_by_id(user_id)
-    
-
-    if user_exists is None:
-        # User existiert NICHT -> 404 Not Found! (Architektonisch korrekt)
-        raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found.")
-
-    # ----------------------------------------------------
-    # 2. ABFRAGE: Nur wenn User existiert, Posts holen
-    # ----------------------------------------------------
-    
-    posts = post_repo.get_posts_by_user_id(user_id)
-    
-    
-    # ----------------------------------------------------
-    # 3. RÜCKGABE: User existiert, Posts sind hier (können leer sein: 200 OK)
-    # ----------------------------------------------------
-    return posts
+@router.get("/users/{user_id}/posts", response_model=PostPage, summary="Alle Beiträge eines Benutzers abrufen (seitenweise)", tags=["Beiträge"])
+def get_user_posts(user_id: int,
+                   limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                   after_id: int | None = Depends(get_after_id),
+                   fields: FieldSelection | None = Depends(get_post_fields),
+                   user_repo: UserRepository = Depends(get_user_repo), post_repo: PostRepository = Depends(get_post_repo)):
+    def build():
+        # ----------------------------------------------------
+        # 1. PRÜFUNG: Existiert die Hauptressource (User)?
+        # ----------------------------------------------------
+        if not user_repo.user_exists(user_id):
+            # User existiert NICHT -> 404 Not Found! (Architektonisch korrekt)
+            raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found.")
+
+        # ----------------------------------------------------
+        # 2. ABFRAGE: Nur wenn User existiert, Posts holen
+        # ----------------------------------------------------
+        posts = post_repo.get_posts_by_user_id(user_id, limit=limit + 1, after_id=after_id, fields=fields)
+        items, next_cursor = make_page(posts, limit)
+
+        # ----------------------------------------------------
+        # 3. RÜCKGABE: User existiert, Posts sind hier (können leer sein: 200 OK)
+        # ----------------------------------------------------
+        if fields is not None:
+            return page_response(post_model(fields), items, next_cursor)
+        if config.FAST_RESPONSES:
+            return post_page_response(items, next_cursor) #direkt als json, ohne das PostPage sieb nochmal drüber laufen zu lassen
+        return page_response(PostResponse, items, next_cursor)
+
+    if config.SINGLE_FLIGHT: #auch ein 404 für einen nicht existierenden user wird geteilt
+        return shared_response("user_posts", (user_id, limit, after_id, fields and fields.key), build)
+    return build()
 
 # PUT /posts/{post_id}
 @router.put("/posts/{post_id}", response_model=PostResponse, summary="Beitrag aktualisieren", tags=["Beiträge"])
-def update_post_api(post_id: int, post_data: PostResponse, repo: PostRepository = Depends(get_post_repo)):
+def update_post_api(post_id: int, post_data: PostResponse, response: Response,
+                    if_match: str | None = Header(None),
+                    repo: PostRepository = Depends(get_post_repo)):
     post_obj = Post(
         title=post_data.title, content=post_data.content, user_id=post_data.user_id, post_id=post_id
     )
 
-    
-    updated_post = repo.update_post(post_obj)
+    versions = expected_versions(if_match, "post", post_id) if if_match else None
+    try:
+        updated_post = repo.update_post(post_obj, expected_versions=versions)
+    except VersionMismatch:
+        raise HTTPException(status_code=412, detail=f"Post with ID {post_id} was changed in the meantime (If-Match failed).")
    
 
     if updated_post is None:
         raise HTTPException(status_code=404, detail=f"Post with ID {post_id} not found.")
 
+    response.headers["ETag"] = make_etag("post", post_id, updated_post.version)
     return updated_post #Fast api wandelt das automatisch in PostResponse um 
 
 # DELETE /posts/{post_id}
@@ -0,0 +1,118 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from datenbase_async import get_async_db
+from async_repositories import AsyncUserRepository, AsyncPostRepository
+from cache import get_cache
+from write_queue import get_writer
+from schemas import PostResponse, PostCreate, PostPage, ImportStatusResponse
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, get_after_id, make_page
+from fast_json import post_page_response
+from fields import FieldSelection, get_post_fields, post_model, item_response, page_response
+import config
+from models import Post
+from versioning import make_etag, etag_matches, expected_versions, VersionMismatch
+from single_flight import shared_response_async
+import routers.posts as sync_posts
+
+#gleiche endpunkte wie routers/posts.py, nur als "async def" mit AsyncSession (siehe main.py: USE_ASYNC_DB)
+router = APIRouter(
+    prefix="/posts",
+    tags=["Posts"]
+)
+
+async def get_post_repo(db: AsyncSession = Depends(get_async_db)):
+    return AsyncPostRepository(db, writer=get_writer(), cache=get_cache())
+
+async def get_user_repo(db: AsyncSession = Depends(get_async_db)):
+    return AsyncUserRepository(db, writer=get_writer(), cache=get_cache())
+
+# POST /posts
+@router.post("/posts", response_model=PostResponse, summary="Neuen Beitrag erstellen", tags=["Beiträge"])
+async def create_post(post_data: PostCreate,
+                      post_repo: AsyncPostRepository = Depends(get_post_repo),
+                      user_repo: AsyncUserRepository = Depends(get_user_repo)):
+    if not await user_repo.user_exists(post_data.user_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Abbruch: User mit ID {post_data.user_id} existiert nicht. Ein Geist kann keine Posts schreiben!"
+        )
+    post_obj = Post(title=post_data.title, content=post_data.content, user_id=post_data.user_id)
+    return await post_repo.save_post(post_obj)
+
+#der import läuft sowieso als background task im threadpool, den übernehmen wir einfach vom sync router
+router.add_api_route("/posts/import", sync_posts.import_posts, methods=["POST"], response_model=ImportStatusResponse,
+                     status_code=202, summary="Beiträge aus NDJSON/CSV importieren", tags=["Beiträge"])
+router.add_api_route("/posts/import/{job_id}", sync_posts.get_import_status, methods=["GET"], response_model=ImportStatusResponse,
+                     summary="Status eines Imports abrufen", tags=["Beiträge"])
+
+# GET /posts/{post_id}
+@router.get("/posts/{post_id}", response_model=PostResponse, summary="Einzelnen Beitrag abrufen", tags=["Beiträge"])
+async def get_post(post_id: int,
+                   if_none_match: str | None = Header(None),
+                   fields: FieldSelection | None = Depends(get_post_fields),
+                   repo: AsyncPostRepository = Depends(get_post_repo)):
+    variant = fields.etag_variant if fields is not None else None #teil-antworten haben einen eigenen ETag
+    if if_none_match:
+        version = await repo.get_post_version(post_id)
+        if version is not None and etag_matches(if_none_match, make_etag("post", post_id, version, variant)):
+            return Response(status_code=304, headers={"ETag": make_etag("post", post_id, version, variant)})
+
+    async def build():
+        post = await repo.get_post_by_id(post_id, fields=fields)
+        if post is None:
+            raise HTTPException(status_code=404, detail=f"Post with ID {post_id} not found")
+        headers = {"ETag": make_etag("post", post.id, post.version, variant)}
+        return item_response(post_model(fields) if fields is not None else PostResponse, post, headers)
+
+    if config.SINGLE_FLIGHT:
+        return await shared_response_async("post", (post_id, fields and fields.key), build)
+    return await build()
+
+# GET /users/{user_id}/posts
+@router.get("/users/{user_id}/posts", response_model=PostPage, summary="Alle Beiträge eines Benutzers abrufen (seitenweise)", tags=["Beiträge"])
+async def get_user_posts(user_id: int,
+                         limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                         after_id: int | None = Depends(get_after_id),
+                         fields: FieldSelection | None = Depends(get_post_fields),
+                         user_repo: AsyncUserRepository = Depends(get_user_repo),
+                         post_repo: AsyncPostRepository = Depends(get_post_repo)):
+    async def build():
+        if not await user_repo.user_exists(user_id):
+            raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found.")
+        posts = await post_repo.get_posts_by_user_id(user_id, limit=limit + 1, after_id=after_id, fields=fields)
+        items, next_cursor = make_page(posts, limit)
+        if fields is not None:
+            return page_response(post_model(fields), items, next_cursor)
+        if config.FAST_RESPONSES:
+            return post_page_response(items, next_cursor)
+        return page_response(PostResponse, items, next_cursor)
+
+    if config.SINGLE_FLIGHT:
+        return await shared_response_async("user_posts", (user_id, limit, after_id, fields and fields.key), build)
+    return await build()
+
+# PUT /posts/{post_id}
+@router.put("/posts/{post_id}", response_model=PostResponse, summary="Beitrag aktualisieren", tags=["Beiträge"])
+async def update_post_api(post_id: int, post_data: PostResponse, response: Response,
+                          if_match: str | None = Header(None),
+                          repo: AsyncPostRepository = Depends(get_post_repo)):
+    post_obj = Post(
+        title=post_data.title, content=post_data.content, user_id=post_data.user_id, post_id=post_id
+    )
+    versions = expected_versions(if_match, "post", post_id) if if_match else None
+    try:
+        updated_post = await repo.update_post(post_obj, expected_versions=versions)
+    except VersionMismatch:
+        raise HTTPException(status_code=412, detail=f"Post with ID {post_id} was changed in the meantime (If-Match failed).")
+    if updated_post is None:
+        raise HTTPException(status_code=404, detail=f"Post with ID {post_id} not found.")
+    response.headers["ETag"] = make_etag("post", post_id, updated_post.version)
+    return updated_post
+
+# DELETE /posts/{post_id}
+@router.delete("/posts/{post_id}", status_code=204, summary="Beitrag löschen", tags=["Beiträge"])
+async def delete_post_api(post_id: int, repo: AsyncPostRepository = Depends(get_post_repo)):
+    was_deleted = await repo.delete_post(post_id)
+    if not was_deleted:
+        raise HTTPException(status_code=404, detail=f"Post with ID {post_id} not found.")
@@ -0,0 +1,40 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from datenbase import get_db
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, get_after_rank, make_ranked_page
+from schemas import SearchPage
+import search
+import sharding
+
+router = APIRouter(
+    prefix="/search",
+    tags=["Suche"]
+)
+
+def get_search_repo(db: Session = Depends(get_db)):
+    return search.SearchRepository(db)
+if sharding.shard_map is not None:
+    get_search_repo = sharding.get_search_repo #sucht in allen shards und mischt nach rank
+
+# GET /search?q=...&type=posts|users
+@router.get("", response_model=SearchPage, summary="Volltextsuche in Benutzern oder Beiträgen (nach Relevanz)", tags=["Suche"])
+def search_api(q: str = Query(..., min_length=1, max_length=200),
+               type: Literal["posts", "users"] = "posts",
+               limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+               after: tuple | None = Depends(get_after_rank), #?after=<next_cursor>
+               repo: search.SearchRepository = Depends(get_search_repo)):
+
+    if not search.fts_enabled():
+        raise HTTPException(status_code=503, detail="Volltextsuche ist auf diesem Server nicht verfügbar (kein FTS5).")
+    if type == "users" and search.user_match_query(q) is None:
+        raise HTTPException(status_code=400, detail=f"Für die Benutzersuche braucht jeder Suchbegriff mindestens {search.MIN_TRIGRAM} Zeichen.")
+
+    if type == "users":
+        hits = repo.search_users(q, limit + 1, after)
+    else:
+        hits = repo.search_posts(q, limit + 1, after)
+    items, next_cursor = make_ranked_page(hits, limit)
+    return {"items": items, "next_cursor": next_cursor}
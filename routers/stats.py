@@ -0,0 +1,39 @@
+from typing import List, Literal
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from datenbase import get_db
+from schemas import StatsTotals, TopAuthor, PostLengthBucket
+import sharding
+import stats
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["Statistik"]
+)
+
+#alle routen lesen nur die zähler, die triggers in sqlite aktuell halten (stats.py). mit MEMORY_STORE hängen sie
+#dem speicher um die paar millisekunden des write-behind hinterher
+
+def get_stats_repo(db: Session = Depends(get_db)):
+    return stats.StatsRepository(db)
+if sharding.shard_map is not None:
+    get_stats_repo = sharding.get_stats_repo #fragt jeden shard und rechnet zusammen
+
+# GET /stats (summen über alles)
+@router.get("", response_model=StatsTotals, summary="Anzahl Benutzer, Beiträge und Bytes insgesamt", tags=["Statistik"])
+def stats_totals(repo: stats.StatsRepository = Depends(get_stats_repo)):
+    return repo.totals()
+
+# GET /stats/top-authors?limit=10&by=posts|bytes
+@router.get("/top-authors", response_model=List[TopAuthor], summary="Benutzer mit den meisten Beiträgen (oder Bytes)", tags=["Statistik"])
+def top_authors(limit: int = Query(10, ge=1, le=100),
+                by: Literal["posts", "bytes"] = "posts",
+                repo: stats.StatsRepository = Depends(get_stats_repo)):
+    return repo.top_authors(limit, by)
+
+# GET /stats/post-lengths (histogramm der beitragslängen in bytes)
+@router.get("/post-lengths", response_model=List[PostLengthBucket], summary="Verteilung der Beitragslängen", tags=["Statistik"])
+def post_lengths(repo: stats.StatsRepository = Depends(get_stats_repo)):
+    return repo.post_lengths()
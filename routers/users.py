@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from datenbase import get_db            # Deine DB-Verbindung
 from repositories import UserRepository # Dein Koch
-from schemas import UserResponse, UserCreate     # Dein Sieb
+from cache import get_cache         # Read-Through-Cache (optional)
+from write_queue import get_writer      # Group-Commit (optional)
+from schemas import UserResponse, UserCreate, UserPage, UserBulkResponse, PurgeStatusResponse     # Dein Sieb
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, get_after_id, make_page
+from fast_json import user_page_response          # schneller json pfad (config.FAST_RESPONSES)
+from fields import FieldSelection, get_user_fields, user_model, item_response, page_response # ?fields=... (sparse fieldsets)
+import config
+import sharding
+import memory_store
 from models import User
+from versioning import make_etag, etag_matches, expected_versions, VersionMismatch
+from single_flight import shared_response   # gleichzeitige gleiche GETs teilen sich eine abfrage (config.SINGLE_FLIGHT)
 from typing import List
 
 router = APIRouter(
@@ -12,7 +23,11 @@ router = APIRouter(
 )
 
 def get_user_repo(db: Session = Depends(get_db)):
-    return UserRepository(db)
+    return UserRepository(db, writer=get_writer(), cache=get_cache())
+if sharding.shard_map is not None:
+    get_user_repo = sharding.get_user_repo #SHARDS > 1: users liegen verteilt auf mehrere dateien
+if memory_store.store is not None:
+    get_user_repo = memory_store.get_user_repo #MEMORY_STORE: users liegen im speicher, sqlite nur dahinter
 # --- USER ENDPUNKTE (Bisheriger Code) ---
 
 @router.get("/", summary="Basis-Status", tags=["Status"]) # / heißt das ist die Startseite (Hauseingang) == Standart Pfad
@@ -20,22 +35,50 @@ def read_root():
     return {"message": "Backend läuft. Gehe zu /docs zum Testen der API."}
 
 # GET /users
-@router.get("/users", response_model=List[UserResponse], summary="Alle Benutzer abrufen (Filterbar nach Name)", tags=["Benutzer"]) #/useres (Tür zu Users), 
-def get_all_users(name: str | None = None, repo: UserRepository = Depends(get_user_repo)):
-   
-    users = repo.get_all_users(name_filter=name) 
-    
-    return users
+@router.get("/users", response_model=UserPage, summary="Alle Benutzer abrufen (Filterbar nach Name, seitenweise)", tags=["Benutzer"]) #/useres (Tür zu Users), 
+def get_all_users(name: str | None = None,
+                  limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                  after_id: int | None = Depends(get_after_id), #?after=<next_cursor der vorherigen Seite>
+                  fields: FieldSelection | None = Depends(get_user_fields), #?fields=id,name nur diese felder
+                  repo: UserRepository = Depends(get_user_repo)):
+
+    def build():
+        users = repo.get_all_users(name_filter=name, limit=limit + 1, after_id=after_id, fields=fields) #eine zeile mehr um zu wissen ob es weiter geht
+        items, next_cursor = make_page(users, limit)
+        if fields is not None:
+            return page_response(user_model(fields), items, next_cursor) #antwort-modell nur mit den gefragten feldern
+        if config.FAST_RESPONSES:
+            return user_page_response(items, next_cursor) #direkt als json, ohne das UserPage sieb nochmal drüber laufen zu lassen
+        return page_response(UserResponse, items, next_cursor)
+
+    if config.SINGLE_FLIGHT: #gleiche gleichzeitige abfragen laufen nur einmal (single_flight.py)
+        return shared_response("users", (name, limit, after_id, fields and fields.key), build)
+    return build()
 
 # GET /users/{user_id}
 @router.get("/users/{user_id}", response_model = UserResponse, summary="Einzelnen Benutzer abrufen", tags=["Benutzer"]) #response_model=UserResponse muss da sein es sagt das es dem von UserRespone entsprechen muss
 #es kommt also ein Objekt raus was genau so aussieht wie UserResponse 
-def get_user(user_id: int, repo: UserRepository = Depends(get_user_repo)):
-    user = repo.get_user_by_id(user_id) 
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-        
-    return user
+def get_user(user_id: int,
+             if_none_match: str | None = Header(None), #der ETag den der client schon hat
+             fields: FieldSelection | None = Depends(get_user_fields),
+             repo: UserRepository = Depends(get_user_repo)):
+    variant = fields.etag_variant if fields is not None else None #teil-antworten haben einen eigenen ETag
+    if if_none_match:
+        #erst nur die version fragen, ist sie gleich bekommt der client 304 und nimmt seine kopie
+        version = repo.get_user_version(user_id)
+        if version is not None and etag_matches(if_none_match, make_etag("user", user_id, version, variant)):
+            return Response(status_code=304, headers={"ETag": make_etag("user", user_id, version, variant)})
+
+    def build():
+        user = repo.get_user_by_id(user_id, fields=fields)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        headers = {"ETag": make_etag("user", user.id, user.version, variant)}
+        return item_response(user_model(fields) if fields is not None else UserResponse, user, headers)
+
+    if config.SINGLE_FLIGHT: #der ETag kommt mit, alle bekommen also genau die version die sie im body sehen
+        return shared_response("user", (user_id, fields and fields.key), build)
+    return build()
 
 # POST /users
 @router.post("/users", response_model=UserResponse, summary="Neuen Benutzer erstellen", tags=["Benutzer"])
@@ -50,27 +93,58 @@ def create_user(user_data: UserCreate, repo: UserRepository = Depends(get_user_r
         raise HTTPException(status_code=409, detail=f"User with email '{user_data.email}' already exists (Conflict)")
     return saved_user
 
+# POST /users/bulk
+@router.post("/users/bulk", response_model=UserBulkResponse, summary="Viele Benutzer auf einmal erstellen", tags=["Benutzer"])
+def create_users_bulk(users_data: List[UserCreate], repo: UserRepository = Depends(get_user_repo)):
+
+    user_objs = [User(name=u.name, email=u.email) for u in users_data]
+    created, conflicts = repo.save_users_bulk(user_objs) #email konflikte brechen nicht ab, sie landen in conflicts
+
+    return {
+        "created": [{"index": i, "id": u.id, "email": u.email} for i, u in created],
+        "conflicts": [{"index": i, "email": email} for i, email in conflicts],
+    }
+
 # PUT /users/{user_id}
 @router.put("/users/{user_id}", response_model=UserResponse, summary="Benutzer aktualisieren", tags=["Benutzer"])
-def update_user_api(user_id: int, user_data: UserResponse, repo: UserRepository = Depends(get_user_repo)):
+def update_user_api(user_id: int, user_data: UserResponse, response: Response,
+                    if_match: str | None = Header(None), #optimistic locking: nur updaten wenn die version noch stimmt
+                    repo: UserRepository = Depends(get_user_repo)):
    
     user_obj = User(user_id=user_id, name=user_data.name, email=user_data.email)
-    updated_user = repo.update_user(user_obj)
+    versions = expected_versions(if_match, "user", user_id) if if_match else None
+    try:
+        updated_user = repo.update_user(user_obj, expected_versions=versions)
+    except VersionMismatch:
+        raise HTTPException(status_code=412, detail=f"User with ID {user_id} was changed in the meantime (If-Match failed).")
     
 
     if updated_user is None:
         raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found or email conflict.")
             
+    response.headers["ETag"] = make_etag("user", user_id, updated_user.version)
     return updated_user
 
 # DELETE /users/{user_id}
-@router.delete("/users/{user_id}", summary="Benutzer löschen", tags=["Benutzer"]) #packe das in die kategorie tags 
+@router.delete("/users/{user_id}", summary="Benutzer löschen", tags=["Benutzer"], #packe das in die kategorie tags 
+               responses={202: {"model": PurgeStatusResponse, "description": "Viele Beiträge, wird im Hintergrund gelöscht"}})
 def delete_user_api(user_id: int, repo: UserRepository = Depends(get_user_repo)):
  
-    was_deleted = repo.delete_user(user_id)
+    result = repo.delete_user(user_id)
    
 
-    if not was_deleted:
+    if result is None:
         raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found")
+    if result["status"] != "done":
+        #mehr als PURGE_BATCH_SIZE posts: die werden stückweise im hintergrund gelöscht (purge.py), den stand gibt es unter Location
+        return JSONResponse(status_code=202, content=result, headers={"Location": f"/users/users/{user_id}/purge"})
         
     return {"message": f"User with ID {user_id} successfully deleted"}
+
+# GET /users/{user_id}/purge
+@router.get("/users/{user_id}/purge", response_model=PurgeStatusResponse, summary="Stand des Löschens abrufen", tags=["Benutzer"])
+def get_purge_status(user_id: int, repo: UserRepository = Depends(get_user_repo)):
+    result = repo.get_purge_status(user_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No purge for user with ID {user_id}")
+    return result
@@ -0,0 +1,125 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from datenbase_async import get_async_db
+from async_repositories import AsyncUserRepository
+from cache import get_cache
+from write_queue import get_writer
+from schemas import UserResponse, UserCreate, UserPage, UserBulkResponse, PurgeStatusResponse
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, get_after_id, make_page
+from fast_json import user_page_response
+from fields import FieldSelection, get_user_fields, user_model, item_response, page_response
+import config
+from models import User
+from versioning import make_etag, etag_matches, expected_versions, VersionMismatch
+from single_flight import shared_response_async
+from typing import List
+
+#gleiche endpunkte wie routers/users.py, nur als "async def" mit AsyncSession (siehe main.py: USE_ASYNC_DB)
+router = APIRouter(
+    prefix="/users",
+    tags=["Users"]
+)
+
+async def get_user_repo(db: AsyncSession = Depends(get_async_db)):
+    return AsyncUserRepository(db, writer=get_writer(), cache=get_cache())
+
+@router.get("/", summary="Basis-Status", tags=["Status"])
+async def read_root():
+    return {"message": "Backend läuft (async). Gehe zu /docs zum Testen der API."}
+
+# GET /users
+@router.get("/users", response_model=UserPage, summary="Alle Benutzer abrufen (Filterbar nach Name, seitenweise)", tags=["Benutzer"])
+async def get_all_users(name: str | None = None,
+                        limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                        after_id: int | None = Depends(get_after_id),
+                        fields: FieldSelection | None = Depends(get_user_fields),
+                        repo: AsyncUserRepository = Depends(get_user_repo)):
+    async def build():
+        users = await repo.get_all_users(name_filter=name, limit=limit + 1, after_id=after_id, fields=fields)
+        items, next_cursor = make_page(users, limit)
+        if fields is not None:
+            return page_response(user_model(fields), items, next_cursor)
+        if config.FAST_RESPONSES:
+            return user_page_response(items, next_cursor)
+        return page_response(UserResponse, items, next_cursor)
+
+    if config.SINGLE_FLIGHT:
+        return await shared_response_async("users", (name, limit, after_id, fields and fields.key), build)
+    return await build()
+
+# GET /users/{user_id}
+@router.get("/users/{user_id}", response_model=UserResponse, summary="Einzelnen Benutzer abrufen", tags=["Benutzer"])
+async def get_user(user_id: int,
+                   if_none_match: str | None = Header(None),
+                   fields: FieldSelection | None = Depends(get_user_fields),
+                   repo: AsyncUserRepository = Depends(get_user_repo)):
+    variant = fields.etag_variant if fields is not None else None #teil-antworten haben einen eigenen ETag
+    if if_none_match:
+        version = await repo.get_user_version(user_id)
+        if version is not None and etag_matches(if_none_match, make_etag("user", user_id, version, variant)):
+            return Response(status_code=304, headers={"ETag": make_etag("user", user_id, version, variant)})
+
+    async def build():
+        user = await repo.get_user_by_id(user_id, fields=fields)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        headers = {"ETag": make_etag("user", user.id, user.version, variant)}
+        return item_response(user_model(fields) if fields is not None else UserResponse, user, headers)
+
+    if config.SINGLE_FLIGHT:
+        return await shared_response_async("user", (user_id, fields and fields.key), build)
+    return await build()
+
+# POST /users
+@router.post("/users", response_model=UserResponse, summary="Neuen Benutzer erstellen", tags=["Benutzer"])
+async def create_user(user_data: UserCreate, repo: AsyncUserRepository = Depends(get_user_repo)):
+    saved_user = await repo.save_user(User(name=user_data.name, email=user_data.email))
+    if saved_user is None:
+        raise HTTPException(status_code=409, detail=f"User with email '{user_data.email}' already exists (Conflict)")
+    return saved_user
+
+# POST /users/bulk
+@router.post("/users/bulk", response_model=UserBulkResponse, summary="Viele Benutzer auf einmal erstellen", tags=["Benutzer"])
+async def create_users_bulk(users_data: List[UserCreate], repo: AsyncUserRepository = Depends(get_user_repo)):
+    user_objs = [User(name=u.name, email=u.email) for u in users_data]
+    created, conflicts = await repo.save_users_bulk(user_objs)
+    return {
+        "created": [{"index": i, "id": u.id, "email": u.email} for i, u in created],
+        "conflicts": [{"index": i, "email": email} for i, email in conflicts],
+    }
+
+# PUT /users/{user_id}
+@router.put("/users/{user_id}", response_model=UserResponse, summary="Benutzer aktualisieren", tags=["Benutzer"])
+async def update_user_api(user_id: int, user_data: UserResponse, response: Response,
+                          if_match: str | None = Header(None),
+                          repo: AsyncUserRepository = Depends(get_user_repo)):
+    user_obj = User(user_id=user_id, name=user_data.name, email=user_data.email)
+    versions = expected_versions(if_match, "user", user_id) if if_match else None
+    try:
+        updated_user = await repo.update_user(user_obj, expected_versions=versions)
+    except VersionMismatch:
+        raise HTTPException(status_code=412, detail=f"User with ID {user_id} was changed in the meantime (If-Match failed).")
+    if updated_user is None:
+        raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found or email conflict.")
+    response.headers["ETag"] = make_etag("user", user_id, updated_user.version)
+    return updated_user
+
+# DELETE /users/{user_id}
+@router.delete("/users/{user_id}", summary="Benutzer löschen", tags=["Benutzer"],
+               responses={202: {"model": PurgeStatusResponse, "description": "Viele Beiträge, wird im Hintergrund gelöscht"}})
+async def delete_user_api(user_id: int, repo: AsyncUserRepository = Depends(get_user_repo)):
+    result = await repo.delete_user(user_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found")
+    if result["status"] != "done":
+        return JSONResponse(status_code=202, content=result, headers={"Location": f"/users/users/{user_id}/purge"})
+    return {"message": f"User with ID {user_id} successfully deleted"}
+
+# GET /users/{user_id}/purge
+@router.get("/users/{user_id}/purge", response_model=PurgeStatusResponse, summary="Stand des Löschens abrufen", tags=["Benutzer"])
+async def get_purge_status(user_id: int, repo: AsyncUserRepository = Depends(get_user_repo)):
+    result = await repo.get_purge_status(user_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No purge for user with ID {user_id}")
+    return result
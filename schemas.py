@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import List
+from typing import List, Optional
 
 # 1. Was der User an uns schickt (EINGABE)
 # Was das Frontend schickt (Eingang)
@@ -45,3 +45,92 @@ class PostCreate(BaseModel):
     content: str = Field(..., min_length=1)               # Inhalt darf nicht leer sein
     user_id: int
 
+
+# 4. Eine Seite aus einer Liste (Keyset-Pagination)
+# next_cursor ist None wenn es keine weitere Seite gibt, sonst schickt der Client ihn als ?after=... wieder mit
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+
+class PostPage(BaseModel):
+    items: List[PostResponse]
+    next_cursor: Optional[str] = None
+
+# 5. Bulk-Anlage von Usern: was angelegt wurde und welche Zeilen an der Email gescheitert sind
+# index ist die Position in der gesendeten Liste, so weiß der Client welche Zeile gemeint ist
+# email nur als str: geprüft wurde sie schon beim Einlesen (UserCreate), EmailStr hier hieße jede Adresse ein zweites
+# Mal durch email_validator, das kostet pro Zeile mehr als das INSERT
+class BulkCreatedUser(BaseModel):
+    index: int
+    id: int
+    email: str
+
+class BulkConflict(BaseModel):
+    index: int
+    email: str
+
+class UserBulkResponse(BaseModel):
+    created: List[BulkCreatedUser]
+    conflicts: List[BulkConflict]
+
+# 6. Status eines Post-Imports (läuft im Hintergrund)
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportStatusResponse(BaseModel):
+    id: str
+    status: str
+    format: str
+    chunk_size: int
+    rows_read: int
+    rows_imported: int
+    rows_failed: int
+    errors: List[ImportRowError] = []
+    detail: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+# 7. Suche (FTS5): ein Treffer ist entweder ein User (title = name) oder ein Post
+class SearchHit(BaseModel):
+    type: str
+    id: int
+    title: str
+    rank: float
+    email: Optional[str] = None
+    user_id: Optional[int] = None
+    snippet: Optional[str] = None
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+
+# 8. Statistik (GET /stats): liest nur die materialisierten zähler (stats.py)
+class StatsTotals(BaseModel):
+    users: int
+    posts: int
+    content_bytes: int
+    avg_posts_per_user: float
+    avg_post_bytes: float
+
+class TopAuthor(BaseModel):
+    id: int
+    name: str
+    post_count: int
+    content_bytes: int
+
+class PostLengthBucket(BaseModel):
+    min_bytes: int
+    max_bytes: Optional[int] = None #None = nach oben offen
+    posts: int
+    content_bytes: int
+
+# 9. DELETE /users/{id} für users mit vielen posts: stand des löschauftrags (purge.py)
+class PurgeStatusResponse(BaseModel):
+    user_id: int
+    status: str #queued, running oder done
+    posts_deleted: int
+    posts_remaining: int
+    requested_at: Optional[str] = None
+    finished_at: Optional[str] = None
@@ -0,0 +1,133 @@
+import logging
+
+from sqlalchemy import column, text
+
+from models import UserModel
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------
+# VOLLTEXTSUCHE (SQLite FTS5)
+# ----------------------------------------------------
+#name.ilike('%x%') kann keinen index benutzen, jede suche liest die ganze users tabelle
+#FTS5 virtuelle tabellen sind ein invertierter index über die texte, die triggers halten sie synchron mit users/posts
+#
+#users_fts nutzt den trigram tokenizer: er findet auch teilstücke mitten im wort ("nna" -> "Anna"),
+#also das gleiche wie das alte ilike, braucht aber mindestens 3 zeichen pro suchbegriff
+#posts_fts nutzt unicode61 (ganze wörter, umlaute egal) und sucht mit präfix ("daten" -> "datenbank")
+#beide sind "external content" tabellen: der text steht nur in users/posts, der index speichert nur die rowid
+#posts_fts liest den inhalt über die view posts_fts_source, weil posts.content komprimiert sein kann: dann kommt der
+#text aus posts.search_text (content_codec.py)
+
+MIN_TRIGRAM = 3
+
+#die FTS tabellen und triggers legt migrations.py an (migration 4, posts_fts neu in migration 6, triggers neu in 10)
+
+_fts_enabled = False #wird von detect_search_index gesetzt, ohne FTS5 fällt alles auf ilike zurück
+
+
+def fts_enabled() -> bool:
+    return _fts_enabled
+
+
+def detect_search_index(conn) -> bool:
+    #gibt es die FTS tabellen? (fehlen wenn das sqlite beim migrieren kein FTS5 hatte)
+    global _fts_enabled
+    _fts_enabled = conn.exec_driver_sql(
+        "SELECT count(*) FROM sqlite_master WHERE name IN ('users_fts', 'posts_fts')"
+    ).scalar() == 2
+    return _fts_enabled
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"' #als phrase, damit AND/OR/NEAR/* im suchtext keine FTS-befehle sind
+
+
+def user_match_query(q: str):
+    terms = [t for t in q.split() if len(t) >= MIN_TRIGRAM]
+    if not terms:
+        return None
+    return " ".join(_quote(t) for t in terms) #leerzeichen = AND
+
+
+def post_match_query(q: str):
+    terms = q.split()
+    if not terms:
+        return None
+    return " ".join(_quote(t) + "*" for t in terms)
+
+
+def name_filter_clause(name_filter: str):
+    #für get_all_users(name_filter=...): mit FTS über den trigram index, sonst (oder bei < 3 zeichen) wie früher ilike
+    if _fts_enabled and len(name_filter) >= MIN_TRIGRAM:
+        matching_ids = text("SELECT rowid FROM users_fts WHERE users_fts MATCH :q").bindparams(q=_quote(name_filter))
+        return UserModel.id.in_(matching_ids.columns(column("rowid")))
+    return UserModel.name.ilike(f'%{name_filter}%')
+
+
+# ----------------------------------------------------
+# REPOSITORY FÜR DIE SUCHE (ranked mit bm25, keyset über (rank, id))
+# ----------------------------------------------------
+#bm25 ist bei FTS5 negativ, kleiner = besser, also sortieren wir aufsteigend nach rank und dann nach id.
+#der rank wird auf RANK_DIGITS stellen gerundet, sortiert und verglichen wird nur der gerundete wert: genau der steht
+#im cursor (pagination.encode_rank_cursor), die nächste seite vergleicht also mit der gleichen zahl wie ORDER BY und
+#fast gleiche scores (rundungsrauschen) werden über die id entschieden statt zufällig über die letzte stelle.
+#grenze: bm25 hängt von den wort-häufigkeiten aller zeilen ab. kommen zwischen zwei seiten posts dazu oder fallen weg,
+#verschieben sich die ranks und ein treffer kann doppelt kommen oder fehlen. einen snapshot über mehrere requests gibt
+#es nicht, für eine suche ist das hinnehmbar
+
+RANK_DIGITS = 6
+_USER_RANK = f"round(bm25(users_fts), {RANK_DIGITS})"
+_POST_RANK = f"round(bm25(posts_fts, 2.0, 1.0), {RANK_DIGITS})" #titel zählt doppelt so viel wie der inhalt
+
+_USER_SEARCH = text(f"""
+    SELECT u.id, u.name, u.email, {_USER_RANK} AS rank
+    FROM users_fts JOIN users u ON u.id = users_fts.rowid
+    WHERE users_fts MATCH :q
+      AND (:after_rank IS NULL OR {_USER_RANK} > :after_rank
+           OR ({_USER_RANK} = :after_rank AND u.id > :after_id))
+    ORDER BY rank, u.id
+    LIMIT :limit
+""")
+
+_POST_SEARCH = text(f"""
+    SELECT p.id, p.title, p.user_id, {_POST_RANK} AS rank,
+           snippet(posts_fts, 1, '[', ']', '…', 12) AS snippet
+    FROM posts_fts JOIN posts p ON p.id = posts_fts.rowid
+    WHERE posts_fts MATCH :q
+      AND (:after_rank IS NULL OR {_POST_RANK} > :after_rank
+           OR ({_POST_RANK} = :after_rank AND p.id > :after_id))
+    ORDER BY rank, p.id
+    LIMIT :limit
+""")
+
+
+class SearchRepository:
+    def __init__(self, db):
+        self.session = db
+
+    def search_users(self, q: str, limit: int, after=None):
+        match = user_match_query(q)
+        if match is None:
+            return []
+        after_rank, after_id = after or (None, None)
+        rows = self.session.execute(_USER_SEARCH, {
+            "q": match, "after_rank": after_rank, "after_id": after_id, "limit": limit,
+        })
+        return [
+            {"type": "user", "id": r.id, "title": r.name, "email": r.email, "rank": r.rank}
+            for r in rows
+        ]
+
+    def search_posts(self, q: str, limit: int, after=None):
+        match = post_match_query(q)
+        if match is None:
+            return []
+        after_rank, after_id = after or (None, None)
+        rows = self.session.execute(_POST_SEARCH, {
+            "q": match, "after_rank": after_rank, "after_id": after_id, "limit": limit,
+        })
+        return [
+            {"type": "post", "id": r.id, "title": r.title, "user_id": r.user_id, "rank": r.rank, "snippet": r.snippet}
+            for r in rows
+        ]
@@ -0,0 +1,137 @@
+"""
+Startet die app mit mehreren prozessen, jeder worker bekommt einen eigenen cpu kern.
+
+    python serve.py --workers 4 --port 8000
+
+Ein uvicorn prozess kann nur einen kern nutzen, pydantic validierung und json serialisierung laufen alle darauf.
+Mehrere worker teilen sich eine sqlite datei (WAL: beliebig viele leser gleichzeitig, schreiben geht reihum).
+
+Ablauf (pre-fork):
+  1. hier im elternprozess: WORKERS setzen (pool größen, siehe config.py), main importieren. dabei laufen die
+     migrationen genau einmal, die worker sehen danach nur noch den schnellen weg
+  2. den port einmal öffnen, dann N mal fork(). jeder worker wirft nach dem fork die geerbten pools weg
+     (os.register_at_fork in datenbase.py, datenbase_async.py, write_queue.py, cache.py) und öffnet eigene verbindungen
+  3. der elternprozess bedient selber keine requests, er startet abgestürzte worker neu und gibt SIGTERM/SIGINT weiter
+
+Pro worker: eigener cache (bei mehr als einem worker standardmäßig aus, siehe cache.py), eigener group-commit writer,
+eigene /metrics zahlen (ein scrape sieht immer nur den worker der gerade antwortet).
+Geteilt über die db: der status von imports (import_jobs, post_import.py) und die löschaufträge (user_purges, purge.py),
+GET /posts/posts/import/{job_id} kann also jeder worker beantworten.
+Ohne fork (windows) startet uvicorn die worker selber mit spawn, jeder importiert main dann neu.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import time
+
+logger = logging.getLogger("serve")
+
+
+class Supervisor:
+    def __init__(self, app, sock: socket.socket, workers: int, log_level: str, access_log: bool):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.access_log = access_log
+        self.children = {} #pid -> nummer des workers
+        self.stopping = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0: #im worker
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL) #uvicorn setzt gleich seine eigenen handler
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                self._serve()
+            except BaseException:
+                logger.exception("Worker %d abgestürzt", index)
+                code = 1
+            finally:
+                os._exit(code) #nie zurück in den code des elternprozesses
+        self.children[pid] = index
+        logger.info("Worker %d gestartet (pid %d)", index, pid)
+
+    def _serve(self):
+        import uvicorn
+
+        config = uvicorn.Config(self.app, log_level=self.log_level, access_log=self.access_log)
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def _shutdown(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM) #ein zweites SIGTERM bricht bei uvicorn nichts ab, die worker fahren sauber runter
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        for index in range(self.workers):
+            self.spawn(index)
+        signal.signal(signal.SIGTERM, self._shutdown)
+        signal.signal(signal.SIGINT, self._shutdown)
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            logger.warning("Worker %d (pid %d) beendet mit status %d, starte neu", index, pid, os.waitstatus_to_exitcode(status))
+            time.sleep(1) #falls er gleich wieder abstürzt nicht im kreis forken
+            self.spawn(index)
+        logger.info("Alle worker beendet")
+
+
+def _listen(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="App mit mehreren worker prozessen starten")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", action="store_true")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers muss mindestens 1 sein")
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(name)s: %(message)s")
+    #vor dem ersten import von config, die pool größen hängen an der worker zahl
+    os.environ["WORKERS"] = str(args.workers)
+    if args.workers > 1 and "CACHE_ENABLED" not in os.environ:
+        os.environ["CACHE_ENABLED"] = "0"
+        logger.info("Cache aus: jeder worker hätte einen eigenen und würde die änderungen der anderen nicht sehen")
+
+    if not hasattr(os, "fork"):
+        import uvicorn
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers,
+                    log_level=args.log_level, access_log=not args.no_access_log)
+        return
+
+    from main import app #migrationen + schema prüfung, einmal für alle worker
+    from datenbase import engine
+    engine.dispose() #der elternprozess braucht keine verbindungen mehr, die worker öffnen ihre eigenen
+
+    sock = _listen(args.host, args.port)
+    logger.info("Höre auf http://%s:%d mit %d workern", args.host, args.port, args.workers)
+    Supervisor(app, sock, args.workers, args.log_level, not args.no_access_log).run()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
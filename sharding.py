@@ -0,0 +1,711 @@
+"""
+Users und ihre posts verteilt auf mehrere SQLite dateien (shards).
+
+    SHARDS=4 uvicorn main:app                                  # app mit 4 shards in SHARD_DIR (standard ./shards)
+    python sharding.py status                                  # anzahl shards, zeilen pro shard
+    python sharding.py rebalance --to 4 --from userdaten.db    # eine bestehende db einmalig auf 4 shards verteilen
+    python sharding.py rebalance --to 8                        # anzahl ändern (app vorher stoppen!)
+
+Eine datei heißt: eine schreibsperre und alles auf einer platte. Mit shards hat jede datei ihre eigene sperre.
+"""
+import argparse
+import heapq
+import logging
+import os
+import threading
+from itertools import islice
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import config
+import migrations
+import purge
+import search
+import stats
+from cache import get_cache
+from repositories import UserRepository, PostRepository
+from storage import apply_profile, WalCheckpointScheduler
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------
+# VERTEILUNG: id -> bucket -> shard
+# ----------------------------------------------------
+#jede id fällt in einen von BUCKETS festen buckets (id % BUCKETS), jeder bucket liegt komplett in einem shard.
+#welcher shard sagt jump_hash: von N auf N+1 shards wandert nur jeder (N+1)-te bucket, bei "bucket % N" fast alle.
+#BUCKETS darf sich nie ändern, die post ids hängen daran
+#
+#ein post liegt beim shard seines users, so bleibt get_user_by_id mit joinedload(posts) EINE abfrage auf EINER datei.
+#damit man den post auch nur mit seiner id findet, bekommt er eine id im bucket seines users:
+#post_id = laufende nummer * BUCKETS + bucket(user_id). posts von vor dem sharding haben das nicht, die stehen
+#in global.db in post_owners (post_id -> user_id)
+
+BUCKETS = 1024
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    #jump consistent hash (Lamping & Veach 2014)
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def make_post_id(seq: int, user_id: int) -> int:
+    return seq * BUCKETS + user_id % BUCKETS
+
+
+# ----------------------------------------------------
+# GLOBAL.DB: shard anzahl, id zähler, email verzeichnis
+# ----------------------------------------------------
+#emails müssen über ALLE shards eindeutig sein, der UNIQUE index in einer datei sieht nur seine eigenen users.
+#deshalb wird jede email erst in user_emails reserviert und dann erst im shard gespeichert
+
+_GLOBAL_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS shard_meta (key VARCHAR PRIMARY KEY, value INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS id_sequences (name VARCHAR PRIMARY KEY, next INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS user_emails (email VARCHAR PRIMARY KEY, user_id INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_user_emails_user_id ON user_emails (user_id)",
+    "CREATE TABLE IF NOT EXISTS post_owners (post_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL)",
+]
+
+
+class IdAllocator:
+    #global eindeutige ids aus id_sequences. pro prozess wird ein block von block_size ids reserviert (ein UPDATE),
+    #die ids daraus gibt es dann ohne db zugriff. nach einem neustart ist der rest des blocks verloren (lücken sind egal)
+    def __init__(self, engine, block_size: int):
+        self.engine = engine
+        self.block_size = block_size
+        self._blocks = {} #name -> (nächste id, ende exklusiv)
+        self._lock = threading.Lock()
+
+    def next_ids(self, name: str, count: int = 1) -> list:
+        ids = []
+        with self._lock:
+            while len(ids) < count:
+                start, end = self._blocks.get(name, (0, 0))
+                if start >= end:
+                    start, end = self._reserve(name, max(self.block_size, count - len(ids)))
+                take = min(end - start, count - len(ids))
+                ids.extend(range(start, start + take))
+                self._blocks[name] = (start + take, end)
+        return ids
+
+    def _reserve(self, name: str, size: int) -> tuple:
+        with self.engine.begin() as conn:
+            end = conn.exec_driver_sql(
+                "UPDATE id_sequences SET next = next + ? WHERE name = ? RETURNING next", (size, name)
+            ).scalar()
+        return end - size, end
+
+    def after_fork(self):
+        #sonst würden zwei worker die ids aus dem gleichen geerbten block vergeben
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+
+def _create_engine(path: str, **kwargs):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, **kwargs)
+    apply_profile(engine, config.DB_PROFILE)
+    return engine
+
+
+class ShardMap:
+    def __init__(self, count: int, directory: str):
+        self.count = count
+        self.directory = directory
+        self.engines = [
+            _create_engine(self.shard_path(i), pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW)
+            for i in range(count)
+        ]
+        self.sessionmakers = [sessionmaker(bind=engine) for engine in self.engines]
+        self.global_engine = _create_engine(os.path.join(directory, "global.db"))
+        self.ids = IdAllocator(self.global_engine, config.ID_BLOCK_SIZE)
+        self.checkpointers = [
+            WalCheckpointScheduler(engine, config.WAL_CHECKPOINT_INTERVAL, config.WAL_TRUNCATE_BYTES) for engine in self.engines
+        ]
+        self.backfill_runners = [] #setzt startup(), nur für shards mit offener batch-arbeit
+        #löschaufträge (purge.py) pro shard, ist ein user ganz weg wird seine email im verzeichnis frei
+        self.purge_runners = [
+            purge.PurgeRunner(engine, config.PURGE_BATCH_SIZE, config.PURGE_PAUSE_MS / 1000, on_done=self.forget_user)
+            for engine in self.engines
+        ]
+        self._shard_of_bucket = [jump_hash(bucket, count) for bucket in range(BUCKETS)] #einmal ausrechnen statt pro request
+
+    def shard_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"userdaten_{index}.db")
+
+    def shard_for_user(self, user_id: int) -> int:
+        return self._shard_of_bucket[user_id % BUCKETS]
+
+    def home_shard_for_post(self, post_id: int) -> int:
+        return self._shard_of_bucket[post_id % BUCKETS] #stimmt für alle posts mit make_post_id
+
+    # --- email verzeichnis ---
+
+    def reserve_emails(self, pairs) -> set:
+        #[(email, user_id)] -> die paare die reserviert wurden, die anderen emails gehören schon jemandem
+        reserved = set()
+        with self.global_engine.begin() as conn:
+            for email, user_id in pairs:
+                row = conn.exec_driver_sql(
+                    "INSERT INTO user_emails (email, user_id) VALUES (?, ?) ON CONFLICT DO NOTHING RETURNING email",
+                    (email, user_id),
+                ).first()
+                if row is not None:
+                    reserved.add((email, user_id))
+        return reserved
+
+    def release_emails(self, pairs):
+        pairs = list(pairs)
+        if pairs:
+            with self.global_engine.begin() as conn:
+                conn.exec_driver_sql("DELETE FROM user_emails WHERE email = ? AND user_id = ?", pairs)
+
+    def email_owner(self, email: str):
+        with self.global_engine.connect() as conn:
+            return conn.exec_driver_sql("SELECT user_id FROM user_emails WHERE email = ?", (email,)).scalar()
+
+    def forget_user(self, user_id: int):
+        with self.global_engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM user_emails WHERE user_id = ?", (user_id,))
+            conn.exec_driver_sql("DELETE FROM post_owners WHERE user_id = ?", (user_id,))
+
+    def post_owner(self, post_id: int):
+        with self.global_engine.connect() as conn:
+            return conn.exec_driver_sql("SELECT user_id FROM post_owners WHERE post_id = ?", (post_id,)).scalar()
+
+    # --- start / stop ---
+
+    def start(self):
+        for checkpointer in self.checkpointers:
+            checkpointer.start()
+        for runner in self.backfill_runners:
+            runner.start()
+        for runner in self.purge_runners:
+            runner.start()
+
+    def stop(self):
+        for runner in self.purge_runners:
+            runner.stop()
+        for runner in self.backfill_runners:
+            runner.stop()
+        for checkpointer in self.checkpointers:
+            checkpointer.stop()
+
+    def after_fork(self):
+        for engine in self.engines + [self.global_engine]:
+            engine.dispose(close=False) #wie in datenbase.py
+        for checkpointer in self.checkpointers:
+            checkpointer.after_fork()
+        self.ids.after_fork()
+
+
+shard_map = ShardMap(config.SHARDS, config.SHARD_DIR) if config.SHARDS > 1 else None
+
+if shard_map is not None and hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=shard_map.after_fork)
+
+
+def _read_meta(conn) -> dict:
+    return dict(conn.exec_driver_sql("SELECT key, value FROM shard_meta").all())
+
+
+def startup(shards: ShardMap, legacy_engine):
+    #beim app-start (main.py): global.db anlegen, prüfen ob die anzahl der shards passt und jeden shard migrieren
+    os.makedirs(shards.directory, exist_ok=True)
+    admin = migrations._migration_engine(shards.global_engine.url) #BEGIN IMMEDIATE, mehrere worker starten gleichzeitig
+    try:
+        with admin.begin() as conn:
+            for ddl in _GLOBAL_SCHEMA:
+                conn.exec_driver_sql(ddl)
+            meta = _read_meta(conn)
+            if "rebalancing_to" in meta:
+                raise RuntimeError(f"'python sharding.py rebalance --to {meta['rebalancing_to']}' ist nicht fertig geworden, bitte nochmal starten.")
+            if "shard_count" not in meta:
+                with legacy_engine.connect() as legacy:
+                    if legacy.exec_driver_sql("SELECT EXISTS (SELECT 1 FROM users)").scalar():
+                        raise RuntimeError(
+                            f"userdaten.db enthält schon daten. Erst 'python sharding.py rebalance --to {shards.count} "
+                            "--from userdaten.db' ausführen, sonst sind sie mit SHARDS nicht mehr sichtbar."
+                        )
+                conn.exec_driver_sql("INSERT INTO shard_meta (key, value) VALUES ('shard_count', ?)", (shards.count,))
+            elif meta["shard_count"] != shards.count:
+                raise RuntimeError(
+                    f"{shards.directory} ist auf {meta['shard_count']} shards verteilt, SHARDS={shards.count}. "
+                    f"Zum ändern: 'python sharding.py rebalance --to {shards.count}'."
+                )
+            conn.exec_driver_sql("INSERT OR IGNORE INTO id_sequences (name, next) VALUES ('users', 1), ('posts', 1)")
+    finally:
+        admin.dispose()
+
+    pause = config.MIGRATION_BATCH_PAUSE_MS / 1000
+    for engine in shards.engines:
+        if migrations.startup(engine):
+            shards.backfill_runners.append(migrations.BackfillRunner(engine, pause))
+
+
+# ----------------------------------------------------
+# REPOSITORIES ÜBER ALLE SHARDS
+# ----------------------------------------------------
+#gleiche methoden wie UserRepository/PostRepository. alles was nur einen user betrifft geht an die normalen
+#repositories des richtigen shards, listen fragen alle shards (scatter) und mischen das ergebnis nach id (gather).
+#pro request und shard gibt es eine session, aber erst wenn der shard wirklich gebraucht wird
+
+class _ShardedRepository:
+    repository_class = None
+
+    def __init__(self, shards: ShardMap, cache=None):
+        self.shards = shards
+        self.cache = cache
+        self._repos = {} #shard -> repository mit eigener session
+
+    def _on(self, index: int):
+        repo = self._repos.get(index)
+        if repo is None:
+            #kein group-commit writer: der schreibt nur in userdaten.db
+            repo = self._repos[index] = self.repository_class(self.shards.sessionmakers[index](), cache=self.cache)
+        return repo
+
+    def _all(self) -> list:
+        return [self._on(index) for index in range(self.shards.count)]
+
+    def close(self):
+        for repo in self._repos.values():
+            repo.close()
+
+
+class ShardedUserRepository(_ShardedRepository):
+    repository_class = UserRepository
+
+    def _for_user(self, user_id: int) -> UserRepository:
+        return self._on(self.shards.shard_for_user(user_id))
+
+    def save_user(self, user_obj):
+        user_obj.id = self.shards.ids.next_ids("users")[0]
+        pair = (user_obj.email, user_obj.id)
+        if not self.shards.reserve_emails([pair]):
+            return None #email gibt es schon (in irgendeinem shard)
+        saved = self._for_user(user_obj.id).save_user(user_obj)
+        if saved is None:
+            self.shards.release_emails([pair])
+        return saved
+
+    def save_users_bulk(self, user_objs: list, chunk_size: int = 500):
+        for user_obj, user_id in zip(user_objs, self.shards.ids.next_ids("users", len(user_objs))):
+            user_obj.id = user_id
+        reserved = self.shards.reserve_emails([(u.email, u.id) for u in user_objs]) #doppelte in der anfrage: nur die erste
+        conflicts = []
+        by_shard = {} #shard -> [(index in user_objs, user)]
+        for index, user_obj in enumerate(user_objs):
+            if (user_obj.email, user_obj.id) in reserved:
+                by_shard.setdefault(self.shards.shard_for_user(user_obj.id), []).append((index, user_obj))
+            else:
+                conflicts.append((index, user_obj.email))
+
+        created = []
+        for shard, items in by_shard.items():
+            shard_created, shard_conflicts = self._on(shard).save_users_bulk([u for _, u in items], chunk_size)
+            created += [(items[i][0], user_obj) for i, user_obj in shard_created]
+            conflicts += [(items[i][0], email) for i, email in shard_conflicts]
+            self.shards.release_emails((email, items[i][1].id) for i, email in shard_conflicts)
+        created.sort(key=lambda item: item[0])
+        conflicts.sort()
+        return created, conflicts
+
+    def get_all_users(self, name_filter=None, limit: int = None, after_id: int = None, fields=None):
+        #jeder shard liefert seine ersten limit users nach id, heapq.merge mischt die sortierten listen
+        per_shard = [
+            repo.get_all_users(name_filter=name_filter, limit=limit, after_id=after_id, fields=fields) for repo in self._all()
+        ]
+        merged = heapq.merge(*per_shard, key=lambda user: user.id)
+        return list(merged if limit is None else islice(merged, limit))
+
+    def get_user_by_id(self, user_id: int, fields=None):
+        return self._for_user(user_id).get_user_by_id(user_id, fields=fields)
+
+    def get_existing_user_ids(self, user_ids) -> set:
+        by_shard = {}
+        for user_id in set(user_ids):
+            by_shard.setdefault(self.shards.shard_for_user(user_id), []).append(user_id)
+        existing = set()
+        for shard, ids in by_shard.items():
+            existing |= self._on(shard).get_existing_user_ids(ids)
+        return existing
+
+    def update_user(self, user_obj, expected_versions=None):
+        pair = (user_obj.email, user_obj.id)
+        new_email = bool(self.shards.reserve_emails([pair]))
+        if not new_email and self.shards.email_owner(user_obj.email) != user_obj.id:
+            return None #email gehört einem anderen user
+        try:
+            updated = self._for_user(user_obj.id).update_user(user_obj, expected_versions)
+        except Exception:
+            if new_email:
+                self.shards.release_emails([pair])
+            raise
+        if updated is None:
+            if new_email:
+                self.shards.release_emails([pair])
+            return None
+        if new_email: #die alte email ist jetzt wieder frei
+            with self.shards.global_engine.begin() as conn:
+                conn.exec_driver_sql("DELETE FROM user_emails WHERE user_id = ? AND email != ?", (user_obj.id, user_obj.email))
+        return updated
+
+    def get_user_version(self, user_id: int):
+        return self._for_user(user_id).get_user_version(user_id)
+
+    def user_exists(self, user_id: int) -> bool:
+        return self._for_user(user_id).user_exists(user_id)
+
+    def delete_user(self, user_id):
+        result = self._for_user(user_id).delete_user(user_id)
+        if result is not None and result["status"] == "done": #sonst gibt der PurgeRunner die email am ende frei
+            self.shards.forget_user(user_id)
+        return result
+
+    def get_purge_status(self, user_id: int):
+        return self._for_user(user_id).get_purge_status(user_id)
+
+
+class ShardedPostRepository(_ShardedRepository):
+    repository_class = PostRepository
+
+    def _post_shards(self, post_id: int):
+        #erst der shard aus der post id, nur wenn der post dort nicht ist (von vor dem sharding) der shard des autors
+        home = self.shards.home_shard_for_post(post_id)
+        yield self._on(home)
+        owner = self.shards.post_owner(post_id)
+        if owner is not None and self.shards.shard_for_user(owner) != home:
+            yield self._on(self.shards.shard_for_user(owner))
+
+    def _assign_id(self, post_obj):
+        post_obj.id = make_post_id(self.shards.ids.next_ids("posts")[0], post_obj.user_id)
+
+    def save_post(self, post_obj):
+        self._assign_id(post_obj)
+        return self._on(self.shards.shard_for_user(post_obj.user_id)).save_post(post_obj)
+
+    def save_posts_bulk(self, post_objs: list) -> int:
+        by_shard = {}
+        for post_obj, seq in zip(post_objs, self.shards.ids.next_ids("posts", len(post_objs))):
+            post_obj.id = make_post_id(seq, post_obj.user_id)
+            by_shard.setdefault(self.shards.shard_for_user(post_obj.user_id), []).append(post_obj)
+        return sum(self._on(shard).save_posts_bulk(posts) for shard, posts in by_shard.items())
+
+    def get_post_by_id(self, post_id: int, fields=None):
+        for repo in self._post_shards(post_id):
+            post = repo.get_post_by_id(post_id, fields=fields)
+            if post is not None:
+                return post
+        return None
+
+    def get_posts_by_user_id(self, user_id: int, limit: int = None, after_id: int = None, fields=None):
+        return self._on(self.shards.shard_for_user(user_id)).get_posts_by_user_id(
+            user_id, limit=limit, after_id=after_id, fields=fields
+        )
+
+    def update_post(self, post_obj, expected_versions=None):
+        for repo in self._post_shards(post_obj.id):
+            updated = repo.update_post(post_obj, expected_versions)
+            if updated is not None:
+                return updated
+        return None
+
+    def get_post_version(self, post_id: int):
+        for repo in self._post_shards(post_id):
+            version = repo.get_post_version(post_id)
+            if version is not None:
+                return version
+        return None
+
+    def delete_post(self, post_id: int):
+        return any(repo.delete_post(post_id) for repo in self._post_shards(post_id))
+
+    def get_all_users_with_posts(self):
+        return [user for repo in self._all() for user in repo.get_all_users_with_posts()]
+
+
+class ShardedSearchRepository(_ShardedRepository):
+    #bm25 rechnet mit den wort-häufigkeiten des eigenen shards, über shards gemischt ist der rank nur ungefähr vergleichbar
+    def _on(self, index: int):
+        repo = self._repos.get(index)
+        if repo is None:
+            repo = self._repos[index] = search.SearchRepository(self.shards.sessionmakers[index]())
+        return repo
+
+    def close(self):
+        for repo in self._repos.values():
+            repo.session.close()
+
+    def _gather(self, method: str, q: str, limit: int, after):
+        per_shard = [getattr(repo, method)(q, limit, after) for repo in self._all()]
+        return list(islice(heapq.merge(*per_shard, key=lambda hit: (hit["rank"], hit["id"])), limit))
+
+    def search_users(self, q: str, limit: int, after=None):
+        return self._gather("search_users", q, limit, after)
+
+    def search_posts(self, q: str, limit: int, after=None):
+        return self._gather("search_posts", q, limit, after)
+
+
+class ShardedStatsRepository(_ShardedRepository):
+    #die zähler eines users stehen in seinem shard, summen und histogramm werden addiert, top-N gemischt
+    def _on(self, index: int):
+        repo = self._repos.get(index)
+        if repo is None:
+            repo = self._repos[index] = stats.StatsRepository(self.shards.sessionmakers[index]())
+        return repo
+
+    def close(self):
+        for repo in self._repos.values():
+            repo.session.close()
+
+    def totals(self) -> dict:
+        per_shard = [repo.totals() for repo in self._all()]
+        return stats.make_totals(*(sum(t[key] for t in per_shard) for key in ("users", "posts", "content_bytes")))
+
+    def top_authors(self, limit: int, by: str = "posts") -> list:
+        column = stats.TOP_ORDER[by]
+        per_shard = [repo.top_authors(limit, by) for repo in self._all()]
+        return list(islice(heapq.merge(*per_shard, key=lambda author: (-author[column], author["id"])), limit))
+
+    def post_lengths(self) -> list:
+        counts = {}
+        for repo in self._all():
+            for bucket, (posts, content_bytes) in repo.histogram_counts().items():
+                total_posts, total_bytes = counts.get(bucket, (0, 0))
+                counts[bucket] = (total_posts + posts, total_bytes + content_bytes)
+        return stats.make_histogram(counts)
+
+
+# dependencies für die router (statt get_user_repo usw. wenn SHARDS > 1)
+def get_user_repo():
+    repo = ShardedUserRepository(shard_map, cache=get_cache())
+    try:
+        yield repo
+    finally:
+        repo.close()
+
+
+def get_post_repo():
+    repo = ShardedPostRepository(shard_map, cache=get_cache())
+    try:
+        yield repo
+    finally:
+        repo.close()
+
+
+def get_search_repo():
+    repo = ShardedSearchRepository(shard_map)
+    try:
+        yield repo
+    finally:
+        repo.close()
+
+
+def get_stats_repo():
+    repo = ShardedStatsRepository(shard_map)
+    try:
+        yield repo
+    finally:
+        repo.close()
+
+
+# ----------------------------------------------------
+# REBALANCING (offline, app muss gestoppt sein)
+# ----------------------------------------------------
+#verschiebt jeden user, dessen bucket mit der neuen anzahl woanders hin gehört, zusammen mit seinen posts.
+#pro stück: users + posts ins ziel kopieren (INSERT OR IGNORE), danach erst im alten shard löschen. bricht es ab,
+#steht in shard_meta "rebalancing_to", die app startet nicht und ein zweiter lauf macht einfach weiter.
+#die versionen der verschobenen users steigen dabei (triggers auf posts), die clients laden sie einmal neu.
+#am ende werden email verzeichnis, post_owners und id zähler aus den shards neu aufgebaut
+
+_USER_COLUMNS = "id, name, email, version"
+_POST_COLUMNS = "id, title, content, search_text, content_bytes, user_id, version"
+
+
+def _copy(by_target: dict, table: str, columns: str):
+    #by_target: ziel engine -> zeilen. INSERT OR IGNORE, falls ein abgebrochener lauf sie schon kopiert hatte
+    for engine, rows in by_target.items():
+        placeholders = ", ".join("?" * len(rows[0]))
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"INSERT OR IGNORE INTO {table} ({columns}) VALUES ({placeholders})", rows)
+
+
+def _delete(source, table: str, rows: list):
+    if rows:
+        with source.begin() as conn:
+            conn.exec_driver_sql(f"DELETE FROM {table} WHERE id = ?", [(row[0],) for row in rows])
+
+
+def _group(rows: list, targets: list, shards: ShardMap, user_column: int) -> dict:
+    by_target = {}
+    for row in rows:
+        by_target.setdefault(targets[shards.shard_for_user(row[user_column])], []).append(tuple(row))
+    return by_target
+
+
+def rebalance(directory: str, target: int, legacy_path: str = None, batch: int = 1000, verbose: bool = True):
+    os.makedirs(directory, exist_ok=True)
+    new_map = ShardMap(target, directory)
+    admin = migrations._migration_engine(new_map.global_engine.url)
+    engines = {} #pfad -> migration engine, eine pro datei auch wenn sie quelle und ziel ist
+
+    def engine_for(path):
+        if path not in engines:
+            engines[path] = migrations._migration_engine(f"sqlite:///{path}")
+        return engines[path]
+
+    try:
+        with admin.begin() as conn:
+            for ddl in _GLOBAL_SCHEMA:
+                conn.exec_driver_sql(ddl)
+            meta = _read_meta(conn)
+            conn.exec_driver_sql("INSERT OR REPLACE INTO shard_meta (key, value) VALUES ('rebalancing_to', ?)", (target,))
+        current = meta.get("shard_count", 0)
+        if legacy_path is not None and current:
+            raise ValueError(f"{directory} hat schon {current} shards, --from geht nur beim ersten verteilen")
+
+        #quellen: die bisherigen shards und evtl. die alte einzelne db (die wird nur gelesen, nie gelöscht)
+        sources = [(i, new_map.shard_path(i)) for i in range(max(current, meta.get("rebalancing_to", 0)))
+                   if os.path.exists(new_map.shard_path(i))]
+        if legacy_path is not None:
+            sources.append((None, legacy_path))
+        targets = [engine_for(new_map.shard_path(i)) for i in range(target)]
+        for _, path in sources:
+            migrations.upgrade(engine_for(path))
+        for engine in targets:
+            migrations.upgrade(engine)
+
+        moved_users = moved_posts = 0
+        for index, path in sources:
+            source = engine_for(path)
+            keep_source = index is None
+            last_id = 0
+            while True:
+                with source.begin() as conn:
+                    users = conn.exec_driver_sql(
+                        f"SELECT {_USER_COLUMNS} FROM users WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch)
+                    ).all()
+                if not users:
+                    break
+                last_id = users[-1][0]
+                moving = [u for u in users if new_map.shard_for_user(u[0]) != index]
+                if not moving:
+                    continue
+                with source.begin() as conn:
+                    posts = conn.exec_driver_sql(
+                        f"SELECT {_POST_COLUMNS} FROM posts WHERE user_id IN ({', '.join('?' * len(moving))})",
+                        tuple(u[0] for u in moving),
+                    ).all()
+                #erst alles ins ziel, dann posts und zuletzt die users aus der quelle löschen (passt auch mit foreign keys)
+                _copy(_group(moving, targets, new_map, 0), "users", _USER_COLUMNS)
+                _copy(_group(posts, targets, new_map, 5), "posts", _POST_COLUMNS) #5 = user_id
+                if not keep_source:
+                    _delete(source, "posts", posts)
+                    _delete(source, "users", moving)
+                moved_users += len(moving)
+                moved_posts += len(posts)
+
+            #posts ohne user (aus der zeit ohne foreign keys) bleiben wo sie sind: im ziel würde der foreign key sie
+            #ablehnen. aufräumen mit "python purge.py orphans --delete"
+            if verbose:
+                with source.connect() as conn:
+                    orphans, _ = purge.count_orphans(conn, 0)
+                if orphans:
+                    print(f"{path}: {orphans} posts ohne user bleiben hier liegen (python purge.py orphans)")
+            if verbose:
+                print(f"{path}: fertig")
+
+        #verzeichnisse und zähler aus dem was jetzt wirklich in den shards steht
+        max_user = max_post = 0
+        with admin.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM user_emails")
+            conn.exec_driver_sql("DELETE FROM post_owners")
+            for engine in targets:
+                with engine.begin() as shard:
+                    emails = [tuple(row) for row in shard.exec_driver_sql("SELECT email, id FROM users")]
+                    owners = [tuple(row) for row in shard.exec_driver_sql(
+                        "SELECT id, user_id FROM posts WHERE id % ? != user_id % ?", (BUCKETS, BUCKETS)
+                    )]
+                    max_user = max(max_user, shard.exec_driver_sql("SELECT coalesce(max(id), 0) FROM users").scalar())
+                    max_post = max(max_post, shard.exec_driver_sql("SELECT coalesce(max(id), 0) FROM posts").scalar())
+                if emails:
+                    conn.exec_driver_sql("INSERT OR IGNORE INTO user_emails (email, user_id) VALUES (?, ?)", emails)
+                if owners:
+                    conn.exec_driver_sql("INSERT INTO post_owners (post_id, user_id) VALUES (?, ?)", owners)
+            conn.exec_driver_sql("INSERT OR IGNORE INTO id_sequences (name, next) VALUES ('users', 1), ('posts', 1)")
+            conn.exec_driver_sql("UPDATE id_sequences SET next = max(next, ?) WHERE name = 'users'", (max_user + 1,))
+            conn.exec_driver_sql("UPDATE id_sequences SET next = max(next, ?) WHERE name = 'posts'", (max_post // BUCKETS + 1,))
+            conn.exec_driver_sql("INSERT OR REPLACE INTO shard_meta (key, value) VALUES ('shard_count', ?)", (target,))
+            conn.exec_driver_sql("DELETE FROM shard_meta WHERE key = 'rebalancing_to'")
+        if verbose:
+            print(f"{moved_users} users und {moved_posts} posts verschoben, jetzt {target} shards")
+            for index, path in sources:
+                if index is not None and index >= target:
+                    print(f"  {path} ist jetzt leer und kann gelöscht werden")
+    finally:
+        for engine in list(engines.values()) + [admin]:
+            engine.dispose()
+        for engine in new_map.engines + [new_map.global_engine]:
+            engine.dispose()
+
+
+def status(directory: str):
+    global_path = os.path.join(directory, "global.db")
+    if not os.path.exists(global_path):
+        print(f"{directory}: noch keine shards")
+        return
+    engine = _create_engine(global_path)
+    with engine.connect() as conn:
+        meta = _read_meta(conn)
+        emails = conn.exec_driver_sql("SELECT count(*) FROM user_emails").scalar()
+        owners = conn.exec_driver_sql("SELECT count(*) FROM post_owners").scalar()
+    engine.dispose()
+    count = meta.get("shard_count", 0)
+    print(f"{count} shards in {directory}" + (f", rebalancing auf {meta['rebalancing_to']} nicht fertig" if "rebalancing_to" in meta else ""))
+    print(f"  global.db: {emails} emails, {owners} posts von vor dem sharding")
+    shards = ShardMap(count, directory) if count else None
+    for i in range(count):
+        path = shards.shard_path(i)
+        if not os.path.exists(path):
+            print(f"  {i:>3}  fehlt: {path}")
+            continue
+        with shards.engines[i].connect() as conn:
+            n_users = conn.exec_driver_sql("SELECT count(*) FROM users").scalar()
+            n_posts = conn.exec_driver_sql("SELECT count(*) FROM posts").scalar()
+        print(f"  {i:>3}  {n_users:>10} users {n_posts:>10} posts")
+    if shards is not None:
+        for engine in shards.engines + [shards.global_engine]:
+            engine.dispose()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Users und posts auf mehrere SQLite dateien verteilen")
+    parser.add_argument("--dir", default=config.SHARD_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status")
+    rebalance_parser = sub.add_parser("rebalance")
+    rebalance_parser.add_argument("--to", type=int, required=True, help="neue anzahl shards")
+    rebalance_parser.add_argument("--from", dest="legacy", help="einzelne db (userdaten.db) die einmalig verteilt wird, bleibt unverändert")
+    rebalance_parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.command == "rebalance":
+        if args.to < 2:
+            parser.error("--to muss mindestens 2 sein (ohne shards: SHARDS=1 und userdaten.db)")
+        try:
+            rebalance(args.dir, args.to, args.legacy, args.batch)
+        except ValueError as exc:
+            parser.error(str(exc))
+    status(args.dir)
+
+
+if __name__ == "__main__":
+    main()
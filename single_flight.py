@@ -0,0 +1,179 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+
+from fastapi.responses import Response
+
+# ----------------------------------------------------
+# SINGLE-FLIGHT: GLEICHE LESENDE REQUESTS TEILEN SICH EINE ABFRAGE
+# ----------------------------------------------------
+#hunderte clients fragen gleichzeitig nach dem gleichen heißen user: ohne cache, beim cache-miss oder direkt nach einer
+#invalidierung läuft hunderte mal die gleiche abfrage mit joinedload und hunderte mal die gleiche json serialisierung.
+#mit single-flight macht das nur der erste request (leader), alle die kommen solange er noch läuft (follower) warten
+#auf sein ergebnis: die fertige antwort (json body + ETag). ist der leader fertig, ist der key wieder frei, gemerkt
+#wird nichts (dafür gibt es den cache)
+#
+#frische: jede schreibende anfrage erhöht die generation, sobald ihre antwort rausgeht (SingleFlightMiddleware).
+#ein flug gehört zur generation in der er gestartet ist und neue requests hängen sich nur an flüge der aktuellen
+#generation. wer nach einem erfolgreichen PUT liest bekommt also nie das ergebnis einer abfrage von vor dem PUT.
+#mit mehreren workern (serve.py) gilt das nur im eigenen prozess: ein schreiben im anderen worker sieht man dann
+#höchstens eine abfrage-dauer zu spät
+#
+#sync routen laufen im threadpool, ihre follower warten mit concurrent.futures.Future.result() (blockiert einen
+#threadpool platz, aber keine db verbindung). async routen laufen alle im event loop, ihre follower warten mit await auf
+#einen asyncio.Future. eine exception des leaders (404, db fehler) bekommen alle. wird der async leader abgebrochen
+#(client weg), rechnen die follower selber
+
+
+class _LeaderCancelled(Exception):
+    pass
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {} #(group, key, generation) -> concurrent.futures.Future (sync routen)
+        self._async_calls = {} #(group, key, generation) -> asyncio.Future (nur aus dem event loop, braucht keinen lock)
+        self.generation = 0
+        self.leaders = {} #group -> anzahl requests die wirklich gerechnet haben
+        self.followers = {} #group -> anzahl requests die ein ergebnis mitbenutzt haben
+
+    def invalidate(self):
+        #nach jedem schreiben: laufende flüge bekommen keine neuen follower mehr
+        with self._lock:
+            self.generation += 1
+
+    def _count(self, counts: dict, group: str):
+        counts[group] = counts.get(group, 0) + 1
+
+    # --- sync ---
+
+    def do(self, group: str, key, fn):
+        call_key = (group, key, self.generation)
+        with self._lock:
+            call = self._calls.get(call_key)
+            leader = call is None
+            if leader:
+                call = self._calls[call_key] = Future()
+            self._count(self.leaders if leader else self.followers, group)
+        if not leader:
+            return call.result()
+        try:
+            result = fn()
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[call_key]
+
+    # --- async ---
+
+    async def do_async(self, group: str, key, fn):
+        #fn ist eine async funktion ohne argumente
+        call_key = (group, key, self.generation)
+        call = self._async_calls.get(call_key)
+        if call is not None:
+            with self._lock:
+                self._count(self.followers, group)
+            try:
+                return await asyncio.shield(call) #shield: bricht ein follower ab, bleibt der flug für die anderen
+            except _LeaderCancelled:
+                return await fn()
+        call = self._async_calls[call_key] = asyncio.get_running_loop().create_future()
+        call.add_done_callback(_retrieve) #sonst meckert asyncio über exceptions die kein follower abgeholt hat
+        with self._lock:
+            self._count(self.leaders, group)
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            call.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            del self._async_calls[call_key]
+
+    # --- zahlen ---
+
+    def stats(self) -> dict:
+        #coalescing ratio: anteil der requests die keine eigene abfrage gebraucht haben
+        with self._lock:
+            groups = sorted(set(self.leaders) | set(self.followers))
+            result = {}
+            for group in groups:
+                leaders, followers = self.leaders.get(group, 0), self.followers.get(group, 0)
+                result[group] = {
+                    "leaders": leaders,
+                    "followers": followers,
+                    "coalesced_ratio": followers / (leaders + followers),
+                }
+            return result
+
+    def after_fork(self):
+        #ein fremder thread könnte den lock im moment vom fork gehalten haben, laufende flüge gibt es im worker nicht
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+
+
+def _retrieve(call):
+    if not call.cancelled():
+        call.exception()
+
+
+flights = SingleFlight()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=flights.after_fork)
+
+
+# ----------------------------------------------------
+# FÜR DIE ROUTEN
+# ----------------------------------------------------
+#build() baut die komplette antwort (abfrage + json). geteilt werden body, status und headers, jeder request bekommt
+#daraus seine eigene Response
+
+def _freeze(response: Response) -> tuple:
+    headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+    return response.body, response.status_code, headers, response.media_type
+
+
+def _thaw(frozen: tuple) -> Response:
+    body, status_code, headers, media_type = frozen
+    return Response(body, status_code=status_code, headers=headers, media_type=media_type)
+
+
+def shared_response(group: str, key, build) -> Response:
+    return _thaw(flights.do(group, key, lambda: _freeze(build())))
+
+
+async def shared_response_async(group: str, key, build) -> Response:
+    async def frozen():
+        return _freeze(await build())
+    return _thaw(await flights.do_async(group, key, frozen))
+
+
+class SingleFlightMiddleware:
+    #reine ASGI middleware: bei POST/PUT/PATCH/DELETE wird die generation erhöht bevor die antwort an den client geht.
+    #da ist das schreiben schon committed, ein GET danach startet also sicher einen neuen flug
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            return await self.app(scope, receive, send)
+
+        async def send_after_write(message):
+            if message["type"] == "http.response.start":
+                flights.invalidate()
+            await send(message)
+
+        await self.app(scope, receive, send_after_write)
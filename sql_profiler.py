@@ -0,0 +1,168 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------
+# SQL PROFILER PRO REQUEST (config.SQL_PROFILER)
+# ----------------------------------------------------
+#hängt sich an before_cursor_execute/after_cursor_execute der engine und zählt für jeden request mit:
+#  - wie viele statements, wie lange sie in sqlite gebraucht haben, wie viele zeilen gelesen wurden
+#  - welches statement wie oft kam: das gleiche SQL 10x in einem request ist fast immer ein N+1 (schleife mit einer abfrage pro element)
+#die middleware schreibt das als Server-Timing/X-SQL-* header in die antwort (sieht man direkt in den browser devtools)
+#und loggt eine warnung bei N+1 und wenn ein request mehr als SQL_QUERY_BUDGET statements braucht
+#langsame statements (über SQL_SLOW_MS) werden mit ihrem EXPLAIN QUERY PLAN geloggt
+#
+#welcher request gerade läuft steht in einer ContextVar, die wird auch in den threadpool (sync routen) mitgenommen
+#was im group-commit thread (write_queue.py) läuft gehört zu keinem request und wird nicht mitgezählt
+
+_current: ContextVar["RequestProfile | None"] = ContextVar("sql_profile", default=None)
+
+
+class RequestProfile:
+    __slots__ = ("statements", "count", "sql_time", "rows")
+
+    def __init__(self):
+        self.statements = Counter() #sql text -> wie oft
+        self.count = 0
+        self.sql_time = 0.0 #sekunden
+        self.rows = 0
+
+    def repeated(self, threshold: int) -> list:
+        #statements die mindestens threshold mal im gleichen request liefen (N+1 verdacht)
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+class _CountingCursor:
+    #zählt die zeilen die aus dem DBAPI cursor geholt werden, alles andere geht unverändert an den echten cursor
+    #(sqlite kennt die anzahl gelesener zeilen erst beim fetchen, rowcount ist bei SELECT immer -1)
+    __slots__ = ("_cursor", "_profile")
+
+    def __init__(self, cursor, profile: RequestProfile):
+        self._cursor = cursor
+        self._profile = profile
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._profile.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._profile.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._profile.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._profile.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _explain(conn, statement, parameters) -> list:
+    #eigener cursor auf der gleichen verbindung, der cursor des langsamen statements wird noch gelesen
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def install(engine):
+    #engine ist eine normale Engine, bei der AsyncEngine die engine.sync_engine übergeben
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info["sql_profiler_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        start = conn.info.pop("sql_profiler_start", None)
+        if profile is None or start is None:
+            return
+        elapsed = time.perf_counter() - start
+        profile.count += 1
+        profile.sql_time += elapsed
+        profile.statements[statement] += 1
+        if context is not None and cursor.description is not None:
+            context.cursor = _CountingCursor(cursor, profile) #das CursorResult wird erst danach aus context.cursor gebaut
+
+        if elapsed * 1000 >= config.SQL_SLOW_MS and not executemany:
+            plan = []
+            if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+                try:
+                    plan = _explain(conn, statement, parameters)
+                except Exception as exc: #der plan ist nur zur info, der eigentliche request soll nicht daran scheitern
+                    plan = [f"EXPLAIN fehlgeschlagen: {exc}"]
+            logger.warning(
+                "Langsames SQL (%.1f ms): %s\n    plan: %s",
+                elapsed * 1000, " ".join(statement.split()), " | ".join(plan) or "-",
+            )
+
+
+class SQLProfilerMiddleware:
+    #reine ASGI middleware (kein BaseHTTPMiddleware), die header werden beim "http.response.start" angehängt
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + _headers(profile)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            _report(scope, profile)
+
+
+def _headers(profile: RequestProfile) -> list:
+    ms = profile.sql_time * 1000
+    headers = [
+        (b"server-timing", f'db;dur={ms:.2f};desc="{profile.count} queries"'.encode()),
+        (b"x-sql-queries", str(profile.count).encode()),
+        (b"x-sql-time-ms", f"{ms:.2f}".encode()),
+        (b"x-sql-rows", str(profile.rows).encode()),
+    ]
+    repeated = profile.repeated(config.SQL_N_PLUS_ONE_THRESHOLD)
+    if repeated:
+        headers.append((b"x-sql-repeated", str(max(n for _, n in repeated)).encode()))
+    if profile.count > config.SQL_QUERY_BUDGET:
+        headers.append((b"x-sql-over-budget", b"1"))
+    return headers
+
+
+def _report(scope, profile: RequestProfile):
+    route = f"{scope.get('method')} {scope.get('path')}"
+    for statement, n in profile.repeated(config.SQL_N_PLUS_ONE_THRESHOLD):
+        logger.warning("N+1 Verdacht in %s: %dx das gleiche SQL: %s", route, n, " ".join(statement.split()))
+    if profile.count > config.SQL_QUERY_BUDGET:
+        logger.warning(
+            "%s braucht %d statements (budget %d, %.1f ms SQL, %d zeilen)",
+            route, profile.count, config.SQL_QUERY_BUDGET, profile.sql_time * 1000, profile.rows,
+        )
@@ -0,0 +1,228 @@
+"""
+Materialisierte zähler pro user und das längen-histogramm der posts (GET /stats).
+
+    python stats.py check      # zähler gegen eine echte zählung über posts prüfen (exit code 1 bei abweichungen)
+    python stats.py rebuild    # zähler aus posts neu rechnen
+"""
+import sys
+
+from sqlalchemy import text
+
+from content_codec import plain_bytes_sql
+
+# ----------------------------------------------------
+# MATERIALISIERTE ZÄHLER
+# ----------------------------------------------------
+#"wie viele posts hat jeder user" hieß bisher get_all_users_with_posts und in python zählen: alle users, alle posts,
+#jeder content im speicher. jetzt stehen die zahlen fertig in der db:
+#  users.post_count, users.content_bytes   pro user (bytes = utf-8 länge des ausgepackten texts, siehe content_codec.py)
+#  post_length_histogram                   pro längen-stufe anzahl posts und summe der bytes
+#die triggers von migration 7 (seit migration 10 ohne post_text()) ändern sie in der gleichen transaktion wie jedes
+#insert/update/delete auf posts, egal ob das über das ORM, den bulk insert, den import, den memory store oder das rebalance kommt.
+#GET /stats liest nur diese zahlen: summen aus dem histogramm (eine handvoll zeilen), top-N über den index
+#(post_count DESC, id), die zahl der users über den kleinsten index. kein einziger post wird gelesen
+#
+#posts ohne user (aus der zeit vor foreign_keys=ON, siehe purge.py) zählen im histogramm und in den summen mit,
+#bei keinem user mehr. "python purge.py orphans --delete" räumt sie weg, die triggers ziehen sie dabei wieder ab
+
+#obergrenzen (exklusiv) der stufen in bytes, die letzte stufe ist alles darüber.
+#die stehen so in den triggers von migration 7 und 10, ändern also nur zusammen mit einer neuen migration
+HISTOGRAM_EDGES = (64, 256, 1024, 4096, 16384, 65536)
+
+TOP_ORDER = {"posts": "post_count", "bytes": "content_bytes"} #?by=... -> spalte, beide haben einen index (models.py)
+
+
+def content_bytes_sql(row: str = "") -> str:
+    #ohne post_text(): bei komprimierten posts steht die länge in posts.content_bytes (content_codec.py)
+    return plain_bytes_sql(row)
+
+
+def bucket_sql(length: str) -> str:
+    cases = " ".join(f"WHEN {length} < {edge} THEN {index}" for index, edge in enumerate(HISTOGRAM_EDGES))
+    return f"CASE {cases} ELSE {len(HISTOGRAM_EDGES)} END"
+
+
+def bucket_bounds(bucket: int) -> tuple:
+    #(min_bytes, max_bytes exklusiv oder None)
+    low = 0 if bucket == 0 else HISTOGRAM_EDGES[bucket - 1]
+    return low, HISTOGRAM_EDGES[bucket] if bucket < len(HISTOGRAM_EDGES) else None
+
+
+# ----------------------------------------------------
+# REPOSITORY FÜR GET /stats
+# ----------------------------------------------------
+_TOTALS = text("""
+    SELECT (SELECT count(*) FROM users) AS users,
+           coalesce(sum(posts), 0) AS posts,
+           coalesce(sum(bytes), 0) AS content_bytes
+    FROM post_length_histogram
+""")
+
+_HISTOGRAM = text("SELECT bucket, posts, bytes FROM post_length_histogram ORDER BY bucket")
+
+
+def _top_query(by: str):
+    column = TOP_ORDER[by]
+    return text(f"""
+        SELECT id, name, post_count, content_bytes FROM users
+        ORDER BY {column} DESC, id
+        LIMIT :limit
+    """)
+
+
+def make_totals(users: int, posts: int, content_bytes: int) -> dict:
+    return {
+        "users": users,
+        "posts": posts,
+        "content_bytes": content_bytes,
+        "avg_posts_per_user": posts / users if users else 0.0,
+        "avg_post_bytes": content_bytes / posts if posts else 0.0,
+    }
+
+
+def make_histogram(counts: dict) -> list:
+    #counts: bucket -> (posts, bytes). leere stufen kommen mit 0 vor, damit die liste immer gleich lang ist
+    buckets = []
+    for bucket in range(len(HISTOGRAM_EDGES) + 1):
+        low, high = bucket_bounds(bucket)
+        posts, content_bytes = counts.get(bucket, (0, 0))
+        buckets.append({"min_bytes": low, "max_bytes": high, "posts": posts, "content_bytes": content_bytes})
+    return buckets
+
+
+class StatsRepository:
+    def __init__(self, db):
+        self.session = db
+
+    def totals(self) -> dict:
+        row = self.session.execute(_TOTALS).one()
+        return make_totals(row.users, row.posts, row.content_bytes)
+
+    def top_authors(self, limit: int, by: str = "posts") -> list:
+        rows = self.session.execute(_top_query(by), {"limit": limit})
+        return [
+            {"id": r.id, "name": r.name, "post_count": r.post_count, "content_bytes": r.content_bytes}
+            for r in rows
+        ]
+
+    def histogram_counts(self) -> dict:
+        return {r.bucket: (r.posts, r.bytes) for r in self.session.execute(_HISTOGRAM)}
+
+    def post_lengths(self) -> list:
+        return make_histogram(self.histogram_counts())
+
+
+# ----------------------------------------------------
+# PRÜFEN UND NEU RECHNEN
+# ----------------------------------------------------
+#beides liest jeden post einmal (und packt ihn aus), also O(posts). die länge jedes posts landet einmal in einer
+#temporären tabelle, daraus werden die zähler pro user und das histogramm gerechnet.
+#conn muss in einer transaktion mit schreibsperre sein (migrations._migration_engine: BEGIN IMMEDIATE), sonst könnte
+#zwischen zählen und schreiben ein post dazukommen
+
+def _count_posts(conn, bytes_sql: str = None):
+    #bytes_sql: nur für migration 7, die noch keine spalte content_bytes kennt
+    conn.exec_driver_sql("DROP TABLE IF EXISTS temp.post_bytes")
+    conn.exec_driver_sql(
+        f"CREATE TEMP TABLE post_bytes AS SELECT user_id, {bytes_sql or content_bytes_sql()} AS b FROM posts"
+    )
+    conn.exec_driver_sql("CREATE INDEX temp.ix_post_bytes_user_id ON post_bytes (user_id, b)")
+
+
+def _expected_histogram(conn) -> dict:
+    rows = conn.exec_driver_sql(f"SELECT {bucket_sql('b')} AS bucket, count(*), sum(b) FROM temp.post_bytes GROUP BY 1")
+    return {bucket: (posts, content_bytes) for bucket, posts, content_bytes in rows}
+
+
+def rebuild(conn, bytes_sql: str = None):
+    _count_posts(conn, bytes_sql)
+    try:
+        conn.exec_driver_sql("""
+            UPDATE users SET
+                post_count = coalesce((SELECT count(*) FROM temp.post_bytes WHERE user_id = users.id), 0),
+                content_bytes = coalesce((SELECT sum(b) FROM temp.post_bytes WHERE user_id = users.id), 0)
+        """)
+        expected = _expected_histogram(conn)
+        conn.exec_driver_sql("DELETE FROM post_length_histogram")
+        if expected:
+            conn.exec_driver_sql(
+                "INSERT INTO post_length_histogram (bucket, posts, bytes) VALUES (?, ?, ?)",
+                [(bucket, posts, content_bytes) for bucket, (posts, content_bytes) in expected.items()],
+            )
+    finally:
+        conn.exec_driver_sql("DROP TABLE temp.post_bytes")
+
+
+def check(conn, max_users: int = 20) -> dict:
+    #gibt die abweichungen zurück (leere listen = alles stimmt), ändert nichts
+    _count_posts(conn)
+    try:
+        users = conn.exec_driver_sql("""
+            SELECT u.id, u.post_count, u.content_bytes, coalesce(s.posts, 0), coalesce(s.bytes, 0)
+            FROM users u LEFT JOIN (
+                SELECT user_id, count(*) AS posts, sum(b) AS bytes FROM temp.post_bytes GROUP BY user_id
+            ) s ON s.user_id = u.id
+            WHERE u.post_count != coalesce(s.posts, 0) OR u.content_bytes != coalesce(s.bytes, 0)
+            ORDER BY u.id
+            LIMIT ?
+        """, (max_users,)).all()
+        expected = _expected_histogram(conn)
+    finally:
+        conn.exec_driver_sql("DROP TABLE temp.post_bytes")
+    stored = {bucket: (posts, content_bytes) for bucket, posts, content_bytes in conn.exec_driver_sql(
+        "SELECT bucket, posts, bytes FROM post_length_histogram WHERE posts != 0 OR bytes != 0"
+    )}
+    return {
+        "users": [
+            {"id": r[0], "post_count": r[1], "content_bytes": r[2], "expected_post_count": r[3], "expected_content_bytes": r[4]}
+            for r in users
+        ],
+        "histogram": [
+            {"bucket": bucket, "stored": stored.get(bucket, (0, 0)), "expected": expected.get(bucket, (0, 0))}
+            for bucket in sorted(set(stored) | set(expected))
+            if stored.get(bucket, (0, 0)) != expected.get(bucket, (0, 0))
+        ],
+    }
+
+
+# CLI
+def main(argv=None):
+    import argparse
+    import migrations
+    from datenbase import engine
+    from sharding import shard_map
+
+    parser = argparse.ArgumentParser(description="Materialisierte zähler für GET /stats prüfen oder neu rechnen")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--show", type=int, default=20, help="so viele falsche users höchstens anzeigen")
+    args = parser.parse_args(argv)
+
+    #mit SHARDS jeder shard für sich, die zähler eines users stehen immer in seinem shard
+    urls = [shard_engine.url for shard_engine in shard_map.engines] if shard_map is not None else [engine.url]
+    broken = False
+    for url in urls:
+        admin = migrations._migration_engine(url) #BEGIN IMMEDIATE: niemand schreibt während gezählt wird
+        try:
+            with admin.begin() as conn:
+                if args.command == "rebuild":
+                    rebuild(conn)
+                    print(f"{url.database}: neu gerechnet")
+                    continue
+                problems = check(conn, args.show)
+        finally:
+            admin.dispose()
+        for user in problems["users"]:
+            print(f"{url.database}: user {user['id']} hat post_count={user['post_count']} content_bytes={user['content_bytes']}, "
+                  f"richtig wäre {user['expected_post_count']} / {user['expected_content_bytes']}")
+        for row in problems["histogram"]:
+            low, high = bucket_bounds(row["bucket"])
+            print(f"{url.database}: histogramm {low}-{high or ''} bytes: {row['stored']} statt {row['expected']}")
+        if problems["users"] or problems["histogram"]:
+            broken = True
+        else:
+            print(f"{url.database}: alles stimmt")
+    return 1 if broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
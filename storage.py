@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+
+from sqlalchemy import event
+
+from content_codec import register_functions
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------
+# SQLITE SPEICHER-PROFILE (PRAGMAS)
+# ----------------------------------------------------
+#ohne pragmas läuft sqlite im rollback-journal modus: leser warten auf schreiber und jeder commit macht einen vollen sync
+#ein profil ist eine liste von pragmas die bei JEDER neuen verbindung im pool gesetzt werden (connect event)
+#
+#journal_mode=WAL   leser und ein schreiber blockieren sich nicht mehr gegenseitig
+#synchronous=NORMAL im WAL modus sicher gegen absturz der app, nur ein stromausfall kann die letzten commits kosten
+#cache_size         negativ = KiB, also -65536 = 64 MiB page cache pro verbindung
+#mmap_size          bytes die sqlite direkt aus dem page cache des OS liest statt sie zu kopieren
+#busy_timeout       ms die auf die schreibsperre gewartet wird bevor "database is locked" kommt
+#temp_store=MEMORY  temporäre tabellen/indizes (z.b. für ORDER BY) im RAM statt auf der platte
+#foreign_keys=ON    ein post braucht einen existierenden user (sqlite prüft das sonst gar nicht). gelöscht werden die
+#                   posts trotzdem immer selber und zuerst (purge.py), nicht per ON DELETE CASCADE in einem rutsch
+
+PROFILES = {
+    "legacy": {}, #verhalten wie früher, sqlite standardwerte
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+    "durable": { #wie wal, aber jeder commit wird wirklich auf die platte gesynct
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "busy_timeout": 10000,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+}
+
+
+def get_profile(name: str) -> dict:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unbekanntes DB-Profil '{name}', erlaubt: {', '.join(PROFILES)}")
+
+
+def apply_profile(engine, name: str):
+    pragmas = get_profile(name)
+
+    #bei der async engine hängt das event an der darunterliegenden sync engine
+    target = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(target, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        register_functions(dbapi_connection) #post_text() für die migrationen 6 und 7 auf alten dbs (content_codec.py)
+        if not pragmas:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for key, value in pragmas.items():
+                cursor.execute(f"PRAGMA {key}={value}")
+        finally:
+            cursor.close()
+
+
+# ----------------------------------------------------
+# WAL CHECKPOINTS IM HINTERGRUND
+# ----------------------------------------------------
+#im WAL modus landen alle commits erst in der -wal datei, sqlite schreibt sie nur zurück (checkpoint) wenn gerade
+#kein leser mehr alte seiten braucht. unter dauerlast passiert das nie und die datei wächst ohne ende.
+#der scheduler macht regelmäßig einen PASSIVE checkpoint (blockiert niemanden) und wenn die datei zu groß ist
+#einen TRUNCATE checkpoint (wartet kurz auf leser/schreiber und setzt die datei danach auf 0 bytes)
+
+class WalCheckpointScheduler:
+    def __init__(self, engine, interval: float, truncate_bytes: int):
+        self.engine = engine
+        self.interval = interval
+        self.truncate_bytes = truncate_bytes
+        self.checkpoints = 0
+        self.truncates = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def wal_path(self):
+        database = self.engine.url.database
+        if not database or database == ":memory:":
+            return None
+        return f"{database}-wal"
+
+    def checkpoint(self, mode: str = "PASSIVE"):
+        with self.engine.connect() as conn:
+            busy, log_pages, checkpointed = conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one()
+        self.checkpoints += 1
+        if mode == "TRUNCATE":
+            self.truncates += 1
+        return busy, log_pages, checkpointed
+
+    def run_once(self):
+        path = self.wal_path()
+        if path is None or not os.path.exists(path):
+            return None
+        mode = "TRUNCATE" if os.path.getsize(path) > self.truncate_bytes else "PASSIVE"
+        return self.checkpoint(mode)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception: #ein fehlgeschlagener checkpoint darf den thread nicht beenden, nächste runde klappt es meistens
+                logger.exception("WAL checkpoint fehlgeschlagen")
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="wal-checkpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def after_fork(self):
+        #threads überleben keinen fork: im worker gibt es den thread nicht, nur die variable. lifespan startet ihn neu
+        self._stop = threading.Event()
+        self._thread = None
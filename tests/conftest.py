@@ -0,0 +1,58 @@
+"""
+Gemeinsame fixtures für die tests.
+
+Die module lesen config.py beim import und öffnen ./userdaten.db relativ zum arbeitsverzeichnis. Darum importieren die
+tests nichts aus der app oben in der datei, sondern holen sich alles über app_env: eigenes verzeichnis (tmp_path),
+eigene umgebungsvariablen und frisch importierte module, die echte userdaten.db wird nie angefasst.
+"""
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+REPO = Path(__file__).resolve().parent.parent
+#alle module der app (flach im repo) und das routers paket
+_APP_MODULES = {path.stem for path in REPO.glob("*.py")} | {"routers"}
+
+
+def _forget_app_modules():
+    for name in list(sys.modules):
+        if name.split(".")[0] in _APP_MODULES:
+            del sys.modules[name]
+
+
+@pytest.fixture
+def app_env(tmp_path, monkeypatch):
+    #app_env("main", GROUP_COMMIT="1") -> das frisch importierte modul, mit genau diesen einstellungen
+    monkeypatch.chdir(tmp_path)
+
+    def load(module="main", **env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        _forget_app_modules()
+        return importlib.import_module(module)
+
+    yield load
+    datenbase = sys.modules.get("datenbase")
+    if datenbase is not None:
+        datenbase.engine.dispose()
+    _forget_app_modules()
+
+
+@pytest.fixture
+def make_client(app_env):
+    #make_client(MEMORY_STORE="1") -> TestClient mit lifespan (die hintergrund-threads laufen), am ende wieder zu
+    clients = []
+
+    def start(**env):
+        main = app_env("main", **env)
+        client = TestClient(main.app)
+        client.__enter__()
+        clients.append(client)
+        return client
+
+    yield start
+    for client in reversed(clients):
+        client.__exit__(None, None, None)
@@ -0,0 +1,31 @@
+def _scenario(client):
+    #die gleichen requests auf beiden stacks, alles was zurückkommt wird verglichen
+    seen = []
+    users = client.post("/users/users/bulk", json=[
+        {"name": f"Nutzer {i}", "email": f"nutzer{i}@example.com"} for i in range(4)
+    ]).json()
+    seen.append(users)
+    first = users["created"][0]["id"]
+    for i in range(3):
+        seen.append(client.post("/posts/posts", json={"title": f"Titel {i}", "content": "inhalt " * i + "x",
+                                                     "user_id": first}).json())
+    seen.append(client.get("/users/users", params={"limit": 2}).json())
+    seen.append(client.get("/users/users", params={"name": "Nutzer 3"}).json())
+    seen.append(client.get(f"/users/users/{first}").json())
+    seen.append(client.get(f"/users/users/{first}", params={"fields": "name,posts.title"}).json())
+    seen.append(client.get(f"/posts/users/{first}/posts", params={"limit": 2}).json())
+    seen.append(client.get("/posts/posts/2", params={"fields": "title"}).json())
+    etag = client.get("/posts/posts/1").headers["etag"]
+    seen.append(etag)
+    seen.append(client.get("/posts/posts/1", headers={"If-None-Match": etag}).status_code)
+    seen.append(client.get("/users/users/999").status_code)
+    seen.append(client.post("/posts/posts", json={"title": "Ohne User", "content": "x", "user_id": 999}).status_code)
+    return seen
+
+
+def test_sync_und_async_antworten_gleich(make_client, tmp_path, monkeypatch):
+    sync = _scenario(make_client())
+    (tmp_path / "async").mkdir()
+    monkeypatch.chdir(tmp_path / "async") #eigene leere db
+    async_ = _scenario(make_client(USE_ASYNC_DB="1"))
+    assert sync == async_
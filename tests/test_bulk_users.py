@@ -0,0 +1,54 @@
+import pytest
+
+
+@pytest.mark.parametrize("env", [{}, {"USE_ASYNC_DB": "1"}], ids=["sync", "async"])
+def test_bulk_meldet_konflikte_ohne_abbruch(make_client, env):
+    client = make_client(**env)
+    assert client.post("/users/users", json={"name": "Vorher", "email": "alt@example.com"}).status_code == 200
+
+    response = client.post("/users/users/bulk", json=[
+        {"name": "Anna", "email": "anna@example.com"},
+        {"name": "Alt", "email": "alt@example.com"},     #gibt es schon in der db
+        {"name": "Bernd", "email": "bernd@example.com"},
+        {"name": "Anna 2", "email": "anna@example.com"}, #doppelt in der anfrage
+    ])
+    assert response.status_code == 200
+    body = response.json()
+    assert [(row["index"], row["email"]) for row in body["created"]] == [(0, "anna@example.com"), (2, "bernd@example.com")]
+    assert body["conflicts"] == [{"index": 1, "email": "alt@example.com"}, {"index": 3, "email": "anna@example.com"}]
+
+    for row in body["created"]:
+        user = client.get(f"/users/users/{row['id']}").json()
+        assert user["email"] == row["email"]
+    names = [user["name"] for user in client.get("/users/users").json()["items"]]
+    assert names == ["Vorher", "Anna", "Bernd"]
+
+
+def test_ungueltige_zeile_lehnt_alles_ab(make_client):
+    client = make_client()
+    response = client.post("/users/users/bulk", json=[
+        {"name": "Anna", "email": "anna@example.com"},
+        {"name": "Bernd", "email": "keine-email"},
+    ])
+    assert response.status_code == 422
+    assert client.get("/users/users").json()["items"] == []
+
+
+def test_konflikte_ueber_chunk_grenzen(app_env):
+    app_env("main")
+    from datenbase import SessionLocal
+    from models import User
+    from repositories import UserRepository
+
+    session = SessionLocal()
+    try:
+        repo = UserRepository(session)
+        repo.save_users_bulk([User(name="Alt", email="u3@example.com")])
+        users = [User(name=f"User {i}", email=f"u{i}@example.com") for i in range(7)]
+        created, conflicts = repo.save_users_bulk(users, chunk_size=2)
+        assert [index for index, _ in created] == [0, 1, 2, 4, 5, 6]
+        assert conflicts == [(3, "u3@example.com")]
+        assert all(user.id is not None for _, user in created)
+        assert len({user.id for _, user in created}) == 6
+    finally:
+        session.close()
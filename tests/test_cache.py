@@ -0,0 +1,68 @@
+import pytest
+
+
+@pytest.fixture
+def cache_module(app_env):
+    return app_env("cache")
+
+
+def test_laden_wird_nur_von_eigenen_invalidierungen_verworfen(cache_module):
+    cache = cache_module.EntityCache()
+    user, post = cache_module.user_key(1), cache_module.post_key(7)
+
+    token = cache.begin_load()
+    cache.invalidate(cache_module.user_key(2), tags=[cache_module.user_key(3)]) #andere einträge
+    assert cache.put(user, "user 1", 10, token=token)
+    assert cache.get(user) == "user 1"
+
+    token = cache.begin_load()
+    cache.invalidate(user) #genau dieser key, während wir noch lesen
+    assert not cache.put(user, "alter stand", 10, token=token)
+    assert cache.get(user) is None
+
+    token = cache.begin_load()
+    cache.invalidate(tags=[cache_module.user_key(1)]) #delete_user: der tag des posts
+    assert not cache.put(post, "post 7", 10, tags=[cache_module.user_key(1)], token=token)
+
+    token = cache.begin_load() #nach der invalidierung angefangen: darf rein
+    assert cache.put(post, "post 7", 10, tags=[cache_module.user_key(1)], token=token)
+
+
+def test_zu_viele_invalidierungen_verwerfen_sicherheitshalber(cache_module, monkeypatch):
+    monkeypatch.setattr(cache_module, "MAX_TRACKED_INVALIDATIONS", 3)
+    cache = cache_module.EntityCache()
+    token = cache.begin_load()
+    for post_id in range(4): #der erste fällt aus der liste, wir wissen nicht mehr ob er uns betraf
+        cache.invalidate(cache_module.post_key(post_id))
+    assert not cache.put(cache_module.user_key(1), "user", 10, token=token)
+    assert cache.put(cache_module.user_key(1), "user", 10, token=cache.begin_load())
+
+
+def test_clear_verwirft_laufendes_laden(cache_module):
+    cache = cache_module.EntityCache()
+    token = cache.begin_load()
+    cache.clear()
+    assert not cache.put(cache_module.user_key(1), "user", 10, token=token)
+
+
+def test_lru_und_bytes_grenze(cache_module):
+    cache = cache_module.EntityCache(max_entries=2, max_bytes=100)
+    cache.put("a", 1, 10)
+    cache.put("b", 2, 10)
+    cache.get("a") #a ist jetzt frischer als b
+    cache.put("c", 3, 10)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    cache.put("d", 4, 95) #über max_bytes: alles ältere fliegt raus
+    assert (cache.get("a"), cache.get("c"), cache.get("d")) == (None, None, 4)
+    assert cache.stats()["evictions"] == 3
+
+
+def test_schreiben_invalidiert_ueber_http(make_client):
+    client = make_client(CACHE_ENABLED="1")
+    user_id = client.post("/users/users", json={"name": "Anna", "email": "anna@example.com"}).json()["id"]
+    client.get(f"/users/users/{user_id}")
+    assert client.get(f"/users/users/{user_id}").json()["posts"] == [] #jetzt aus dem cache
+    client.post("/posts/posts", json={"title": "Neuer Post", "content": "x", "user_id": user_id})
+    assert [p["title"] for p in client.get(f"/users/users/{user_id}").json()["posts"]] == ["Neuer Post"]
+    stats = client.get("/cache/stats").json()
+    assert stats["hits"] >= 1 and stats["invalidations"] >= 1
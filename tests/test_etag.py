@@ -0,0 +1,104 @@
+import sys
+
+
+def _user(client, name, email):
+    response = client.post("/users/users", json={"name": name, "email": email})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def _body(user_id, name, email):
+    #PUT nimmt die ganze UserResponse
+    return {"id": user_id, "name": name, "email": email, "posts": []}
+
+
+def test_if_none_match_und_if_match(make_client):
+    client = make_client()
+    user_id = _user(client, "Anna", "anna@example.com")
+    etag = client.get(f"/users/users/{user_id}").headers["ETag"]
+
+    response = client.get(f"/users/users/{user_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.put(f"/users/users/{user_id}", json=_body(user_id, "Anna B", "anna@example.com"),
+                          headers={"If-Match": etag})
+    assert response.status_code == 200
+    new_etag = response.headers["ETag"]
+    assert new_etag != etag
+    #der alte tag ist jetzt veraltet: kein 304 mehr und PUT mit ihm schlägt fehl
+    assert client.get(f"/users/users/{user_id}", headers={"If-None-Match": etag}).status_code == 200
+    response = client.put(f"/users/users/{user_id}", json=_body(user_id, "Anna C", "anna@example.com"),
+                          headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert client.get(f"/users/users/{user_id}").json()["name"] == "Anna B"
+
+
+def test_geloeschte_ids_werden_nicht_wieder_vergeben(make_client):
+    client = make_client()
+    _user(client, "Anna", "anna@example.com")
+    newest = _user(client, "Bernd", "bernd@example.com")
+    old_etag = client.get(f"/users/users/{newest}").headers["ETag"]
+    assert client.delete(f"/users/users/{newest}").status_code == 200
+
+    #ohne AUTOINCREMENT bekäme Clara die id von Bernd und mit version 1 auch genau seinen ETag
+    clara = _user(client, "Clara", "clara@example.com")
+    assert clara > newest
+    response = client.get(f"/users/users/{newest}", headers={"If-None-Match": old_etag})
+    assert response.status_code == 404
+    response = client.put(f"/users/users/{newest}", json=_body(newest, "Bernd", "bernd@example.com"),
+                          headers={"If-Match": old_etag})
+    assert response.status_code == 404
+    assert client.get(f"/users/users/{clara}").json()["name"] == "Clara"
+
+
+def test_ids_im_memory_store_nach_neustart(app_env):
+    from fastapi.testclient import TestClient
+
+    #der store zählt selber hoch, nach einem neustart muss er dort weitermachen wo sqlite_sequence steht
+    with TestClient(app_env("main", MEMORY_STORE="1").app) as client:
+        _user(client, "Anna", "anna@example.com")
+        newest = _user(client, "Bernd", "bernd@example.com")
+        assert client.delete(f"/users/users/{newest}").status_code == 200
+    sys.modules["datenbase"].engine.dispose()
+    with TestClient(app_env("main", MEMORY_STORE="1").app) as client:
+        assert _user(client, "Clara", "clara@example.com") > newest
+
+
+def test_migration_baut_tabellen_ohne_datenverlust_um(app_env):
+    from sqlalchemy import create_engine
+
+    migrations = app_env("migrations")
+    from storage import apply_profile
+
+    engine = create_engine("sqlite:///alt.db")
+    apply_profile(engine, "wal") #mit foreign_keys=ON, das DROP TABLE users darf trotzdem keine posts löschen
+    migrations.upgrade(engine, target=10)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, name, email) VALUES (1, 'Anna', 'a@x.de'), (2, 'Bernd', 'b@x.de')")
+        conn.exec_driver_sql("INSERT INTO posts (id, title, content, user_id) VALUES "
+                             "(1, 'erster', 'datenbank übung', 1), (2, 'zweiter', 'python übung', 2)")
+        conn.exec_driver_sql("DELETE FROM posts WHERE id = 2")
+        conn.exec_driver_sql("DELETE FROM users WHERE id = 2")
+        versions = conn.exec_driver_sql("SELECT id, version FROM users").all()
+
+    assert migrations.upgrade(engine) == [11]
+    with engine.begin() as conn:
+        tables = dict(conn.exec_driver_sql("SELECT name, sql FROM sqlite_master WHERE name IN ('users', 'posts')").all())
+        assert all("AUTOINCREMENT" in sql for sql in tables.values())
+        assert conn.exec_driver_sql("SELECT id, version FROM users").all() == versions
+        assert conn.exec_driver_sql("SELECT id, user_id FROM posts").all() == [(1, 1)]
+        assert conn.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+        #indizes und triggers sind wieder da: suche, stats und versionen laufen weiter
+        conn.exec_driver_sql("INSERT INTO posts (title, content, user_id) VALUES ('dritter', 'sqlite übung', 1)")
+        assert conn.exec_driver_sql("SELECT rowid FROM posts_fts WHERE posts_fts MATCH 'sqlite'").scalars().all() == [2]
+        assert conn.exec_driver_sql("SELECT post_count FROM users WHERE id = 1").scalar() == 2
+        assert conn.exec_driver_sql("SELECT version FROM users WHERE id = 1").scalar() > versions[0][1]
+        assert conn.exec_driver_sql("SELECT count(*) FROM sqlite_master WHERE name = 'ix_posts_user_id_id_title'").scalar() == 1
+        #die id 2 war schon vor der migration weg, die kennt sqlite nicht mehr. ab jetzt geht es aber nur noch aufwärts
+        conn.exec_driver_sql("INSERT INTO users (name, email) VALUES ('Clara', 'c@x.de')")
+        conn.exec_driver_sql("DELETE FROM users WHERE email = 'c@x.de'")
+        conn.exec_driver_sql("INSERT INTO users (name, email) VALUES ('Dora', 'd@x.de')")
+        assert conn.exec_driver_sql("SELECT max(id) FROM users").scalar() == 3
+    assert migrations.upgrade(engine) == [] #nochmal: nichts zu tun
+    engine.dispose()
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+
+@pytest.fixture
+def writer(app_env):
+    app_env("main") #migriert ./userdaten.db im temp ordner
+    import write_queue
+    from datenbase import DATABASE_URL
+
+    #lange wartezeit, damit alles was wir abschicken sicher in einer gruppe landet
+    group_writer = write_queue.GroupCommitWriter(DATABASE_URL, max_batch=10, max_delay=0.3)
+    yield group_writer
+    group_writer.stop()
+
+
+def _emails():
+    from datenbase import engine
+    with engine.connect() as conn:
+        return [row[0] for row in conn.exec_driver_sql("SELECT email FROM users ORDER BY id")]
+
+
+def test_fehler_trifft_nur_die_eigene_op(writer):
+    from repositories import _insert_user
+
+    def insert_then_fail(session):
+        _insert_user(session, "Halb", "halb@example.com") #steht schon im savepoint, muss mit zurückgerollt werden
+        raise ValueError("kaputt")
+
+    futures = [
+        writer.submit(_insert_user, "Anna", "anna@example.com"),
+        writer.submit(_insert_user, "Anna Doppelt", "anna@example.com"),
+        writer.submit(insert_then_fail),
+        writer.submit(_insert_user, "Bernd", "bernd@example.com"),
+    ]
+    anna_id = futures[0].result(timeout=5)
+    with pytest.raises(IntegrityError):
+        futures[1].result(timeout=5)
+    with pytest.raises(ValueError):
+        futures[2].result(timeout=5)
+    bernd_id = futures[3].result(timeout=5)
+
+    assert writer.batches == 1 and writer.ops == 4 #eine transaktion für alle
+    assert bernd_id > anna_id
+    assert _emails() == ["anna@example.com", "bernd@example.com"]
+
+
+def test_ergebnis_erst_nach_dem_commit(writer):
+    from repositories import _insert_user
+    from datenbase import engine
+
+    def insert_and_check(session):
+        user_id = _insert_user(session, "Carla", "carla@example.com")
+        with engine.connect() as conn: #andere verbindung: vor dem commit noch nicht sichtbar
+            assert conn.exec_driver_sql("SELECT count(*) FROM users").scalar() == 0
+        return user_id
+
+    user_id = writer.run(insert_and_check)
+    assert _emails() == ["carla@example.com"]
+    assert user_id == 1
+
+
+def test_group_commit_ueber_http(make_client):
+    client = make_client(GROUP_COMMIT="1", GROUP_COMMIT_MAX_DELAY_MS="50", ADMISSION_CONTROL="0")
+    statuses = {}
+
+    def create(i, email):
+        statuses[i] = client.post("/users/users", json={"name": f"Nutzer {i}", "email": email}).status_code
+
+    threads = [threading.Thread(target=create, args=(i, f"n{i % 4}@example.com")) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(statuses.values()) == [200] * 4 + [409] * 4
+    import write_queue
+    assert write_queue.writer.ops == 8
+    assert write_queue.writer.batches < 8
@@ -0,0 +1,109 @@
+import json
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _write_log(records, tail=b""):
+    with open("userdaten.wbl", "wb") as log:
+        log.write(b"".join(json.dumps(record).encode() + b"\n" for record in records) + tail)
+
+
+def _sqlite(sql):
+    with sys.modules["datenbase"].engine.connect() as conn:
+        return conn.exec_driver_sql(sql).all()
+
+
+def _fresh_db(app_env):
+    app_env("main").engine.dispose() #nur migrieren, der store soll das log erst beim nächsten start sehen
+
+
+def test_log_wird_nach_absturz_nachgeholt(app_env):
+    _fresh_db(app_env)
+    _write_log([
+        {"op": "insert_users", "rows": [[1, "Anna", "anna@example.com", 1], [2, "Bernd", "bernd@example.com", 1]], "seq": 1},
+        {"op": "insert_posts", "rows": [[1, "Erster Post", "inhalt", 1, 1]], "authors": [[1, 2]], "seq": 2},
+        {"op": "delete_user", "id": 2, "seq": 3},
+    ], tail=b'{"op": "insert_users", "rows": [[3, "Hal') #mitten im write abgestürzt, nie bestätigt
+
+    with TestClient(app_env("main", MEMORY_STORE="1").app) as client:
+        user = client.get("/users/users/1").json()
+        assert (user["name"], [post["title"] for post in user["posts"]]) == ("Anna", ["Erster Post"])
+        assert client.get("/users/users/2").status_code == 404
+        assert _sqlite("SELECT id, version FROM users") == [(1, 2)]
+        assert _sqlite("SELECT applied_seq FROM write_behind") == [(3,)]
+        #die nächste änderung bekommt die nummer nach dem nachgeholten stand
+        assert client.post("/users/users", json={"name": "Clara", "email": "clara@example.com"}).json()["id"] == 3
+    assert _sqlite("SELECT applied_seq FROM write_behind") == [(4,)]
+
+
+def test_konflikt_beim_start_laesst_das_log_stehen(app_env):
+    _fresh_db(app_env)
+    _write_log([
+        {"op": "insert_users", "rows": [[1, "Anna", "anna@example.com", 1]], "seq": 1},
+        {"op": "insert_users", "rows": [[2, "Anna Doppelt", "anna@example.com", 1]], "seq": 2},
+        {"op": "insert_users", "rows": [[3, "Bernd", "bernd@example.com", 1]], "seq": 3},
+    ])
+    with open("userdaten.wbl", "rb") as log:
+        before = log.read()
+
+    with pytest.raises(RuntimeError, match=r"insert_users \(nr. 2\) passt nicht zu sqlite"):
+        app_env("main", MEMORY_STORE="1")
+    #was vor dem konflikt kam ist übertragen, der rest nicht übersprungen sondern noch im log
+    assert _sqlite("SELECT id FROM users") == [(1,)]
+    assert _sqlite("SELECT applied_seq FROM write_behind") == [(1,)]
+    sys.modules["memory_store"].store.log.close()
+    with open("userdaten.wbl", "rb") as log:
+        assert log.read() == before
+
+
+def test_konflikt_im_betrieb_stoppt_das_schreiben(app_env):
+    main = app_env("main", MEMORY_STORE="1")
+    with TestClient(main.app) as client:
+        anna = client.post("/users/users", json={"name": "Anna", "email": "anna@example.com"}).json()["id"]
+        log = sys.modules["memory_store"].store.log
+        log.stop() #alles bis hier steht in sqlite
+        applied = log.applied_seq
+        #ein anderes programm schreibt an der app vorbei in die db, der store weiß nichts davon
+        with main.engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO users (name, email) VALUES ('Fremd', 'fremd@example.com')")
+
+        assert client.post("/users/users", json={"name": "Fremd 2", "email": "fremd@example.com"}).status_code == 200
+        log.stop()
+        assert isinstance(log.failed, sys.modules["memory_store"].ApplyConflict)
+        assert log.applied_seq == applied
+        assert _sqlite("SELECT applied_seq FROM write_behind") == [(applied,)]
+        with pytest.raises(RuntimeError, match="Write-behind log ist ausgefallen"):
+            client.put(f"/users/users/{anna}", json={"id": anna, "name": "Anna B", "email": "anna@example.com", "posts": []})
+    #beim nächsten start wird es wieder versucht und scheitert wieder, bis jemand aufräumt
+    main.engine.dispose()
+    with pytest.raises(RuntimeError, match="passt nicht zu sqlite"):
+        app_env("main", MEMORY_STORE="1")
+    sys.modules["memory_store"].store.log.close()
+
+
+def test_posts_eines_geloeschten_users_stueckweise(app_env, monkeypatch):
+    main = app_env("main", MEMORY_STORE="1", PURGE_BATCH_SIZE="3", PURGE_PAUSE_MS="0")
+    import purge
+
+    chunks = []
+    delete_posts = purge.delete_posts
+
+    def counting(conn, user_id, limit):
+        chunks.append(delete_posts(conn, user_id, limit))
+        return chunks[-1]
+
+    monkeypatch.setattr(purge, "delete_posts", counting)
+
+    with TestClient(main.app) as client:
+        user_id = client.post("/users/users", json={"name": "Anna", "email": "anna@example.com"}).json()["id"]
+        other = client.post("/users/users", json={"name": "Bernd", "email": "bernd@example.com"}).json()["id"]
+        for i in range(10):
+            client.post("/posts/posts", json={"title": f"Post {i}", "content": "x", "user_id": user_id})
+        client.post("/posts/posts", json={"title": "Bleibt", "content": "x", "user_id": other})
+        sys.modules["memory_store"].store.log.stop()
+        assert client.delete(f"/users/users/{user_id}").status_code == 200 #im speicher sofort weg, kein 202
+    assert chunks == [3, 3, 3, 1] #jedes stück eine eigene transaktion, der user erst danach
+    assert _sqlite("SELECT user_id, title FROM posts") == [(other, "Bleibt")]
+    assert _sqlite("SELECT id FROM users") == [(other,)]
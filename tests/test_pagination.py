@@ -0,0 +1,59 @@
+def _users(client, count):
+    response = client.post("/users/users/bulk", json=[
+        {"name": f"Nutzer {i}", "email": f"nutzer{i}@example.com"} for i in range(count)
+    ])
+    assert response.status_code == 200
+    return [row["id"] for row in response.json()["created"]]
+
+
+def _pages(client, url, limit):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": limit} if cursor is None else {"limit": limit, "after": cursor}
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= limit
+        ids.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_users_seitenweise(make_client):
+    client = make_client()
+    created = _users(client, 25)
+    assert _pages(client, "/users/users", 10) == sorted(created)
+
+
+def test_cursor_bleibt_stabil_wenn_davor_geloescht_wird(make_client):
+    client = make_client()
+    created = _users(client, 6)
+    first = client.get("/users/users", params={"limit": 3}).json()
+    assert client.delete(f"/users/users/{created[0]}").status_code == 200
+    second = client.get("/users/users", params={"limit": 3, "after": first["next_cursor"]}).json()
+    #mit OFFSET würde jetzt created[3] fehlen
+    assert [item["id"] for item in second["items"]] == created[3:6]
+
+
+def test_posts_eines_users_seitenweise(make_client):
+    client = make_client()
+    user_id, other_id = _users(client, 2)
+    posts = []
+    for i in range(7):
+        for owner in (user_id, other_id):
+            response = client.post("/posts/posts", json={"title": f"Titel {i}", "content": "inhalt", "user_id": owner})
+            assert response.status_code == 200
+            if owner == user_id:
+                posts.append(response.json()["id"])
+    assert _pages(client, f"/posts/users/{user_id}/posts", 3) == posts
+
+
+def test_ungueltiger_cursor(make_client):
+    client = make_client()
+    _users(client, 2)
+    response = client.get("/users/users", params={"after": "kein-cursor"})
+    assert response.status_code == 400
+    assert "Ungültiger Cursor" in response.json()["detail"]
+    assert client.get("/users/users", params={"limit": 0}).status_code == 422
+    assert client.get("/posts/users/1/posts", params={"after": "e30"}).status_code == 400 #"{}" ohne id
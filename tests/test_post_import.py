@@ -0,0 +1,52 @@
+import json
+
+
+def _upload(client, lines, chunk_size=2):
+    body = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines).encode()
+    response = client.post("/posts/posts/import", params={"chunk_size": chunk_size},
+                           files={"file": ("posts.ndjson", body, "application/x-ndjson")})
+    assert response.status_code == 202
+    return response.json()["id"]
+
+
+def test_import_mit_fehlerhaften_zeilen(make_client):
+    client = make_client()
+    user_id = client.post("/users/users", json={"name": "Anna", "email": "anna@example.com"}).json()["id"]
+    job_id = _upload(client, [
+        {"title": "Erster Post", "content": "a", "user_id": user_id},
+        "kein json",
+        {"title": "Zweiter Post", "content": "b", "user_id": 999},
+        {"title": "x", "content": "c", "user_id": user_id}, #titel zu kurz
+        {"title": "Dritter Post", "content": "d", "user_id": user_id},
+    ])
+    status = client.get(f"/posts/posts/import/{job_id}").json() #der background task ist im TestClient schon durch
+    assert status["status"] == "done"
+    assert (status["rows_read"], status["rows_imported"], status["rows_failed"]) == (5, 2, 3)
+    assert [error["line"] for error in status["errors"]] == [2, 3, 4]
+    titles = [post["title"] for post in client.get(f"/posts/users/{user_id}/posts").json()["items"]]
+    assert titles == ["Erster Post", "Dritter Post"]
+    assert client.get("/posts/posts/import/gibtsnicht").status_code == 404
+
+
+def test_endstand_wird_gespeichert_auch_wenn_aufraeumen_scheitert(app_env, tmp_path, monkeypatch):
+    app_env("main")
+    import post_import
+
+    path = tmp_path / "posts.ndjson"
+    path.write_text(json.dumps({"title": "Ohne User", "content": "x", "user_id": 5}) + "\n")
+
+    def remove_fails(path):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(post_import.os, "remove", remove_fails)
+    job = post_import.create_job("ndjson")
+    post_import.run_import(job, str(path))
+    saved = post_import.get_job(job.id)
+    assert saved.status == "done"
+    assert saved.rows_failed == 1
+
+    job = post_import.create_job("ndjson")
+    post_import.run_import(job, str(tmp_path / "fehlt.ndjson"))
+    saved = post_import.get_job(job.id)
+    assert saved.status == "failed"
+    assert "fehlt.ndjson" in saved.detail
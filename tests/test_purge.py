@@ -0,0 +1,50 @@
+import time
+
+
+def _user_with_posts(client, email, count):
+    user_id = client.post("/users/users", json={"name": "Anna", "email": email}).json()["id"]
+    for i in range(count):
+        assert client.post("/posts/posts", json={"title": f"Post {i}", "content": "x", "user_id": user_id}).status_code == 200
+    return user_id
+
+
+def _wait_until_done(client, user_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(f"/users/users/{user_id}/purge").json()
+        if status["status"] == "done" or time.monotonic() > deadline:
+            return status
+        time.sleep(0.02)
+
+
+def test_grosser_user_wird_stueckweise_geloescht(make_client):
+    client = make_client(PURGE_BATCH_SIZE="3", PURGE_PAUSE_MS="200") #pause: lange genug um dazwischen zu fragen
+    user_id = _user_with_posts(client, "anna@example.com", 10)
+    other = _user_with_posts(client, "bernd@example.com", 2)
+
+    response = client.delete(f"/users/users/{user_id}")
+    assert response.status_code == 202
+    assert response.headers["Location"] == f"/users/users/{user_id}/purge"
+    first = response.json()
+    assert first["status"] in ("queued", "running")
+    #ein zweites DELETE während es läuft fängt nicht von vorne an
+    again = client.delete(f"/users/users/{user_id}")
+    assert again.status_code == 202
+    assert again.json()["requested_at"] == first["requested_at"]
+
+    status = _wait_until_done(client, user_id)
+    assert (status["status"], status["posts_deleted"], status["posts_remaining"]) == ("done", 10, 0)
+    assert status["finished_at"] is not None
+    assert client.get(f"/users/users/{user_id}").status_code == 404
+    assert len(client.get(f"/users/users/{other}").json()["posts"]) == 2
+
+
+def test_kleiner_user_sofort_und_unbekannte(make_client):
+    client = make_client(PURGE_BATCH_SIZE="3", PURGE_PAUSE_MS="0")
+    user_id = _user_with_posts(client, "anna@example.com", 3)
+    response = client.delete(f"/users/users/{user_id}")
+    assert response.status_code == 200 #bis PURGE_BATCH_SIZE posts gleich im request, ohne auftrag
+    assert client.get(f"/users/users/{user_id}/purge").status_code == 404
+
+    assert client.delete("/users/users/999").status_code == 404
+    assert client.get("/users/users/999/purge").status_code == 404
@@ -0,0 +1,41 @@
+from sqlalchemy import create_engine
+
+
+def _migrated_engine(app_env, tmp_path):
+    migrations = app_env("migrations")
+    from storage import apply_profile
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    apply_profile(engine, "legacy")
+    migrations.upgrade(engine)
+    migrations.startup(engine)
+    return engine
+
+
+def test_hot_queries_ohne_full_scan(app_env, tmp_path):
+    query_plans = app_env("query_plans")
+    from indexes import missing_indexes
+
+    engine = _migrated_engine(app_env, tmp_path)
+    try:
+        assert missing_indexes(engine) == []
+        results = query_plans.collect_plans(engine)
+        assert len(results) >= len(query_plans.HOT_QUERIES)
+        assert query_plans.find_full_scans(results) == []
+    finally:
+        engine.dispose()
+
+
+def test_fehlender_index_faellt_auf(app_env, tmp_path):
+    query_plans = app_env("query_plans")
+    from indexes import missing_indexes
+
+    engine = _migrated_engine(app_env, tmp_path)
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("DROP INDEX ix_posts_user_id_id_title")
+        assert [index.name for index in missing_indexes(engine)] == ["ix_posts_user_id_id_title"]
+        failures = query_plans.find_full_scans(query_plans.collect_plans(engine))
+        assert any(name.startswith("posts: liste eines users") for name, _, _ in failures)
+    finally:
+        engine.dispose()
@@ -0,0 +1,52 @@
+import base64
+import json
+
+
+def _seed(client):
+    user_id = client.post("/users/users", json={"name": "Anna Müller", "email": "anna@example.com"}).json()["id"]
+    for i in range(7): #gleicher text: gleicher bm25, die reihenfolge entscheidet die id
+        client.post("/posts/posts", json={"title": f"Notiz {i}", "content": "datenbank übung", "user_id": user_id})
+    client.post("/posts/posts", json={"title": "Datenbank Datenbank", "content": "datenbank", "user_id": user_id})
+    return user_id
+
+
+def _all_pages(client, params, limit):
+    hits, cursor = [], None
+    while True:
+        page = client.get("/search", params={**params, "limit": limit, **({"after": cursor} if cursor else {})})
+        assert page.status_code == 200
+        body = page.json()
+        hits.extend(body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return hits
+
+
+def test_seiten_ohne_doppelte_und_luecken(make_client):
+    client = make_client()
+    _seed(client)
+    everything = client.get("/search", params={"q": "datenbank", "limit": 100}).json()["items"]
+    paged = _all_pages(client, {"q": "datenbank"}, 3)
+    assert [hit["id"] for hit in paged] == [hit["id"] for hit in everything]
+    assert len(paged) == 8
+    assert paged[0]["title"] == "Datenbank Datenbank" #bester treffer zuerst
+    ranks = [(hit["rank"], hit["id"]) for hit in paged]
+    assert ranks == sorted(ranks)
+
+
+def test_cursor_traegt_den_gerundeten_rank(make_client):
+    client = make_client()
+    _seed(client)
+    cursor = client.get("/search", params={"q": "datenbank", "limit": 2}).json()["next_cursor"]
+    data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    assert set(data) == {"rank", "id"}
+    assert data["rank"] == round(data["rank"], 6)
+
+
+def test_fehlerfaelle(make_client):
+    client = make_client()
+    _seed(client)
+    assert client.get("/search", params={"q": "datenbank", "after": "quatsch"}).status_code == 400
+    assert client.get("/search", params={"q": "an", "type": "users"}).status_code == 400 #unter 3 zeichen
+    users = client.get("/search", params={"q": "nna", "type": "users"}).json()["items"]
+    assert [hit["title"] for hit in users] == ["Anna Müller"]
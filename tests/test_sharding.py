@@ -0,0 +1,68 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _shard_env(tmp_path):
+    return {"SHARDS": 2, "SHARD_DIR": tmp_path / "shards"}
+
+
+def test_scatter_gather_ueber_zwei_shards(make_client, tmp_path):
+    client = make_client(**_shard_env(tmp_path))
+    import sharding
+
+    created = client.post("/users/users/bulk", json=[
+        {"name": f"Nutzer {i}", "email": f"nutzer{i}@example.com"} for i in range(20)
+    ]).json()["created"]
+    ids = [row["id"] for row in created]
+    assert {sharding.shard_map.shard_for_user(user_id) for user_id in ids} == {0, 1}
+    #die email ist über alle shards eindeutig, nicht nur in der datei des users
+    assert client.post("/users/users", json={"name": "Doppelt", "email": "nutzer3@example.com"}).status_code == 409
+
+    posts = {}
+    for user_id in ids:
+        response = client.post("/posts/posts", json={"title": f"Titel {user_id}", "content": "datenbank übung",
+                                                     "user_id": user_id})
+        assert response.status_code == 200
+        posts[user_id] = response.json()["id"]
+
+    #liste: seiten aus beiden shards gemischt, sortiert nach id, ohne doppelte oder lücken
+    listed, cursor = [], None
+    while True:
+        page = client.get("/users/users", params={"limit": 6, **({"after": cursor} if cursor else {})}).json()
+        listed.extend(user["id"] for user in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert listed == sorted(ids)
+
+    #get: der user mit seinen posts aus seinem shard, der post nur über seine id
+    for user_id, post_id in posts.items():
+        assert [post["id"] for post in client.get(f"/users/users/{user_id}").json()["posts"]] == [post_id]
+        assert client.get(f"/posts/posts/{post_id}").json()["user_id"] == user_id
+
+    #suche: treffer aus allen shards, nach rank und id zusammengeführt
+    hits = client.get("/search", params={"q": "datenbank", "type": "posts", "limit": 100}).json()["items"]
+    assert sorted(hit["id"] for hit in hits) == sorted(posts.values())
+    assert [(hit["rank"], hit["id"]) for hit in hits] == sorted((hit["rank"], hit["id"]) for hit in hits)
+
+    assert client.get("/users/users/999999").status_code == 404
+    response = client.post("/posts/posts", json={"title": "Titel", "content": "x", "user_id": 999999})
+    assert response.status_code == 404
+
+
+def test_alte_daten_erst_verteilen(app_env, tmp_path):
+    main = app_env("main")
+    with main.engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, name, email) VALUES (1, 'Anna', 'anna@example.com')")
+        conn.exec_driver_sql("INSERT INTO posts (id, title, content, user_id) VALUES (1, 'Alter Post', 'inhalt', 1)")
+    main.engine.dispose()
+
+    #mit SHARDS wären die users aus userdaten.db einfach weg, also startet die app gar nicht erst
+    with pytest.raises(RuntimeError, match="rebalance --to 2 --from userdaten.db"):
+        app_env("main", **_shard_env(tmp_path))
+
+    sharding = app_env("sharding")
+    sharding.rebalance(str(tmp_path / "shards"), 2, legacy_path="userdaten.db", verbose=False)
+    with TestClient(app_env("main", **_shard_env(tmp_path)).app) as client:
+        user = client.get("/users/users/1").json()
+        assert (user["name"], [post["title"] for post in user["posts"]]) == ("Anna", ["Alter Post"])
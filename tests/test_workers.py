@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="ohne fork startet uvicorn die worker selber")
+
+
+def _in_child(fn):
+    #fn() in einem geforkten prozess, wie ein worker von serve.py. gibt zurück was fn als json liefert
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            os.close(read_end)
+            with os.fdopen(write_end, "w") as out:
+                json.dump(fn(), out)
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+    os.close(write_end)
+    with os.fdopen(read_end) as result:
+        data = result.read()
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    return json.loads(data)
+
+
+def test_import_status_von_einem_anderen_worker(app_env, tmp_path):
+    app_env("main")
+    import datenbase
+    import post_import
+
+    with datenbase.engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, name, email) VALUES (1, 'Anna', 'anna@example.com')")
+    path = tmp_path / "posts.ndjson"
+    path.write_text("\n".join(json.dumps({"title": f"Post {i}", "content": "x", "user_id": 1 + i % 2}) for i in range(6)))
+    job = post_import.create_job("ndjson", chunk_size=2)
+
+    def worker():
+        #nach dem fork darf der pool keine verbindung des elternprozesses mehr haben (register_at_fork)
+        idle = datenbase.engine.pool.checkedin()
+        seen = post_import.get_job(job.id).status
+        post_import.run_import(post_import.get_job(job.id), str(path))
+        return {"idle": idle, "seen": seen}
+
+    #der elternprozess hat vorher schon verbindungen im pool, die er danach weiter benutzt
+    assert datenbase.engine.pool.checkedin() > 0
+    assert _in_child(worker) == {"idle": 0, "seen": "pending"}
+    #den status hat der andere prozess geschrieben, dieser hier liest ihn aus der db
+    saved = post_import.get_job(job.id)
+    assert (saved.status, saved.rows_read, saved.rows_imported, saved.rows_failed) == ("done", 6, 3, 3)
+    assert [error["line"] for error in saved.errors] == [2, 4, 6]
+    assert post_import.get_job("gibtsnicht") is None
+
+
+def test_api_nach_fork(make_client):
+    client = make_client()
+    user_id = client.post("/users/users", json={"name": "Anna", "email": "anna@example.com"}).json()["id"]
+    assert client.get(f"/users/users/{user_id}").status_code == 200 #landet im cache
+    import cache
+    assert cache.entity_cache.stats()["entries"] > 0
+
+    def worker():
+        from datenbase import SessionLocal
+        from repositories import UserRepository
+
+        #eigene verbindungen und ein leerer cache, der elternprozess hat beides schon benutzt
+        session = SessionLocal()
+        try:
+            name = UserRepository(session).get_user_by_id(user_id).name
+        finally:
+            session.close()
+        return {"name": name, "cache": cache.entity_cache.stats()["entries"]}
+
+    assert _in_child(worker) == {"name": "Anna", "cache": 0}
+    assert client.get(f"/users/users/{user_id}").json()["name"] == "Anna"
+
+
+def test_serve_braucht_mindestens_einen_worker(app_env, capsys):
+    serve = app_env("serve")
+    with pytest.raises(SystemExit) as exc:
+        serve.main(["--workers", "0"])
+    assert exc.value.code == 2
+    assert "--workers muss mindestens 1 sein" in capsys.readouterr().err
@@ -0,0 +1,52 @@
+# ----------------------------------------------------
+# ZEILEN-VERSIONEN UND ETAGS
+# ----------------------------------------------------
+#users und posts haben eine spalte "version" die bei jedem update um 1 steigt (siehe _update_user/_update_post)
+#daraus wird ein starker ETag gebaut. clients schicken ihn als If-None-Match zurück und bekommen 304 ohne body,
+#dafür reicht eine abfrage nur nach der version. bei PUT schicken sie ihn als If-Match: das UPDATE läuft dann mit
+#"WHERE version = ?" und schlägt fehl (412) wenn jemand anders die zeile inzwischen geändert hat
+#
+#UserResponse enthält auch die posts, also muss sich die user-version auch ändern wenn einer seiner posts sich ändert.
+#das machen triggers auf posts (migrations.py, migration 2), damit es auch bei bulk insert / import stimmt
+#
+#eindeutig ist der tag nur weil ids nie wieder vergeben werden (AUTOINCREMENT, migration 11). vorher bekam ein neuer
+#user die id des zuletzt gelöschten und fing wieder bei version 1 an, also mit einem ETag den es schon einmal gab
+
+
+def make_etag(kind: str, entity_id: int, version: int, variant: str = None) -> str:
+    #stark (ohne W/), weil sich bei gleicher version nichts am inhalt ändert. variant: mit ?fields= ist es eine andere
+    #darstellung (FieldSelection.etag_variant), sonst bekäme GET ohne fields mit dem tag der teil-antwort ein 304
+    if variant:
+        return f'"{kind}-{entity_id}-{version}-{variant}"'
+    return f'"{kind}-{entity_id}-{version}"'
+
+
+def _split_etags(header: str):
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    #für If-None-Match: "*" oder einer der tags passt (ein W/ davor wird ignoriert, schwacher vergleich reicht hier)
+    tags = _split_etags(header)
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+def expected_versions(header: str, kind: str, entity_id: int):
+    #für If-Match: gibt die erlaubten versionen zurück, None heißt "*" (jede version ist ok)
+    #ein tag für eine andere entity oder ein kaputter tag kann nie passen -> leere liste -> 412
+    tags = _split_etags(header)
+    if "*" in tags:
+        return None
+    prefix = f'"{kind}-{entity_id}-'
+    versions = []
+    for tag in tags:
+        if tag.startswith(prefix) and tag.endswith('"'):
+            number = tag[len(prefix):-1].split("-", 1)[0] #der tag einer ?fields= antwort hat die gleiche version
+            if number.isdigit():
+                versions.append(int(number))
+    return versions
+
+
+class VersionMismatch(Exception):
+    #die zeile existiert, hat aber nicht die version aus If-Match
+    pass
@@ -0,0 +1,171 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import config
+from datenbase import DATABASE_URL
+from storage import apply_profile
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------
+# GROUP COMMIT (EIN SCHREIBER FÜR ALLE)
+# ----------------------------------------------------
+#sqlite hat genau eine schreibsperre. wenn jeder request selbst committet, kämpfen alle um diese sperre
+#("database is locked") und jeder commit kostet einen eigenen sync auf die platte.
+#hier landen alle schreib-operationen in einer queue, ein einziger thread sammelt sie ein paar ms lang (oder bis N stück)
+#und führt sie in EINER transaktion aus, jede op in einem eigenen SAVEPOINT. ein IntegrityError betrifft also nur
+#die eine op, der rest wird trotzdem committed. jeder aufrufer bekommt erst nach dem commit sein eigenes ergebnis.
+#
+#eine op ist eine funktion op(session, *args) die NICHT selbst committet (siehe repositories.py, _insert_user usw.)
+
+_STOP = object()
+
+
+def _create_writer_engine(url: str):
+    #eigene engine mit genau einer verbindung nur für den schreib-thread
+    writer_engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=1, max_overflow=0)
+    apply_profile(writer_engine, config.DB_PROFILE)
+
+    #pysqlite startet transaktionen selbst und verträgt sich schlecht mit SAVEPOINTs, also schalten wir das ab
+    #und holen uns mit BEGIN IMMEDIATE die schreibsperre gleich am anfang der gruppe
+    @event.listens_for(writer_engine, "connect")
+    def _no_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer_engine, "begin")
+    def _begin_immediate(conn):
+        start = time.perf_counter()
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        metrics.observe_write(time.perf_counter() - start) #hier wartet der writer auf die schreibsperre
+
+    return writer_engine
+
+
+class GroupCommitWriter:
+    def __init__(self, url: str = DATABASE_URL, max_batch: int = 64, max_delay: float = 0.005):
+        self.url = url
+        self.max_batch = max_batch
+        self.max_delay = max_delay #sekunden die nach der ersten op noch auf weitere gewartet wird
+        self.batches = 0
+        self.ops = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._session_factory = None
+
+    # --- für die aufrufer ---
+
+    def submit(self, op, *args) -> Future:
+        self.start() #startet beim ersten schreiben von selbst, z.b. auch in background jobs ohne lifespan
+        future = Future()
+        self._queue.put((future, op, args))
+        return future
+
+    def run(self, op, *args):
+        #für sync code (threadpool): blockiert bis die gruppe committed ist und gibt das eigene ergebnis zurück
+        #async code nimmt stattdessen: await asyncio.wrap_future(writer.submit(op, *args))
+        return self.submit(op, *args).result()
+
+    # --- start / stop ---
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._session_factory = sessionmaker(bind=_create_writer_engine(self.url))
+            self._thread = threading.Thread(target=self._loop, name="group-commit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(_STOP) #alles was vorher in der queue ist wird noch geschrieben
+            self._thread.join()
+            self._thread = None
+            self._session_factory.kw["bind"].dispose()
+
+    def after_fork(self):
+        #im neuen worker (fork) gibt es den schreib-thread nicht mehr und die engine gehört dem elternprozess.
+        #alles neu anlegen, die eigene engine entsteht dann beim ersten submit wie sonst auch
+        if self._session_factory is not None:
+            self._session_factory.kw["bind"].dispose(close=False)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._session_factory = None
+
+    # --- der schreib-thread ---
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stopping = self._collect(first)
+            self._run_batch(batch)
+            if stopping:
+                return
+
+    def _run_batch(self, batch):
+        session = self._session_factory()
+        outcomes = []
+        try:
+            for future, op, args in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested(): #SAVEPOINT: ein fehler rollt nur diese op zurück
+                        result = op(session, *args)
+                    outcomes.append((future, result, None))
+                except Exception as exc:
+                    outcomes.append((future, None, exc))
+            session.commit()
+        except Exception as exc: #commit selbst ist gescheitert, dann ist keine op der gruppe geschrieben
+            logger.exception("Group commit fehlgeschlagen")
+            session.rollback()
+            outcomes = [(future, None, exc) for future, _, _ in outcomes]
+        finally:
+            session.close()
+
+        self.batches += 1
+        self.ops += len(outcomes)
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+
+writer = GroupCommitWriter(max_batch=config.GROUP_COMMIT_MAX_BATCH, max_delay=config.GROUP_COMMIT_MAX_DELAY_MS / 1000)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=writer.after_fork)
+
+
+def get_writer():
+    #für die repositories: None heißt jede op committet wie früher selbst
+    return writer if config.GROUP_COMMIT else None